@@ -37,6 +37,7 @@ class DyEventType:
     stockSelectStrategySelectAck = 'eStockSelectStrategySelectAck'
     stockSelectStrategyRegressionReq = 'eStockSelectStrategyRegressionReq' # 执行一个选股策略的回归
     stockSelectStrategyRegressionAck = 'eStockSelectStrategyRegressionAck'
+    stopStockSelectStrategyRegressionReq = 'eStopStockSelectStrategyRegressionReq'
 
     stockSelectTestedCodes = 'eStockSelectTestedCodes' # 调试股票事件
 
@@ -148,11 +149,14 @@ class DyEventType:
 
     # 股票历史tick数据更新相关事件
     stockHistTicksReq = 'eStockHistTicksReq_'
+    stockHistTicksAsyncReq = 'eStockHistTicksAsyncReq' # 异步获取历史分笔数据的请求
     stockHistTicksAck = 'eStockHistTicksAck'
     updateStockHistTicks = 'eUpdateStockHistTicks'
     stopUpdateStockHistTicksReq = 'eStopUpdateStockHistTicksReq'
     verifyStockHistTicks = 'eVerifyStockHistTicks'
     stopVerifyStockHistTicksReq = 'eStopVerifyStockHistTicksReq'
+    migrateStockHistTicks = 'eMigrateStockHistTicks' # 迁移MongoDB里的历史分笔数据到本地文件
+    stopMigrateStockHistTicksReq = 'eStopMigrateStockHistTicksReq'
 
     updateHistTicksDataSource = 'eUpdateHistTicksDataSource' # 更新历史分笔数据源
 
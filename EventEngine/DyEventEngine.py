@@ -4,6 +4,79 @@ import queue
 from .DyEvent import *
 
 
+class DyEventQueue(queue.Queue):
+    """
+        可以批量存取的事件队列，一批事件只获取一次锁
+        !!!事件队列是无界的，并且不使用task_done和join
+    """
+    def getMany(self, maxNbr):
+        """ 阻塞直到队列非空，然后取出最多@maxNbr个事件 """
+        with self.not_empty:
+            while not self._qsize():
+                self.not_empty.wait()
+
+            events = [self._get() for _ in range(min(maxNbr, self._qsize()))]
+
+            self.not_full.notify()
+
+            return events
+
+    def putMany(self, events):
+        if not events:
+            return
+
+        with self.not_full:
+            for event in events:
+                self._put(event)
+
+            self.unfinished_tasks += len(events)
+            self.not_empty.notify()
+
+
+def coalesceLatestByKey(events):
+    """
+        合并同类型的事件，@event.data是dict，相同key保留最新的值
+        比如股票池行情的Tick事件，每只股票只保留最新的Tick
+    """
+    data = {}
+    for event in events:
+        data.update(event.data)
+
+    event = DyEvent(events[-1].type)
+    event.data = data
+
+    return event
+
+
+def coalesceEvents(events, coalescers):
+    """
+        合并一批事件里注册了合并函数的同类型事件，合并后的事件放在该类型最后一个事件的位置，其他事件的次序不变
+        @coalescers: {event type: func([event]) -> event}
+    """
+    sameTypeEvents = {} # {event type: [event]}
+    for event in events:
+        if event.type in coalescers:
+            sameTypeEvents.setdefault(event.type, []).append(event)
+
+    if not sameTypeEvents or all(len(x) == 1 for x in sameTypeEvents.values()):
+        return events
+
+    lastEvents = {type: x[-1] for type, x in sameTypeEvents.items()}
+
+    newEvents = []
+    for event in events:
+        if event.type in sameTypeEvents:
+            if event is not lastEvents[event.type]:
+                continue
+
+            if len(sameTypeEvents[event.type]) > 1:
+                event = coalescers[event.type](sameTypeEvents[event.type])
+
+        newEvents.append(event)
+
+    return newEvents
+
+
 class DyTimerHand(threading.Thread):
     def __init__(self, queue, eventEngine):
         super().__init__()
@@ -46,22 +119,39 @@ class DyTimerHand(threading.Thread):
 
 
 class DyEventHand(threading.Thread):
-    def __init__(self, queue):
+    def __init__(self, queue, batchSize=1, coalescers=None):
+        """
+            @batchSize: 每次从队列里最多取出的事件数
+            @coalescers: 事件引擎的合并函数, {event type: func}
+        """
         super().__init__()
 
         self._handlers = {} # {event type:[handlers]}
         self._queue = queue
 
+        self._batchSize = batchSize
+        self._coalescers = {} if coalescers is None else coalescers
+
     def run(self):
         while True:
-            event = self._queue.get()
+            if self._batchSize > 1:
+                events = self._queue.getMany(self._batchSize)
 
-            if event.type == DyEventType.register:
-                self._processRegisterEvent(event.data['type'], event.data['handler'])
-            elif event.type == DyEventType.unregister:
-                self._processUnregisterEvent(event.data['type'], event.data['handler'])
+                if self._coalescers:
+                    events = coalesceEvents(events, self._coalescers)
             else:
-                self._processOtherEvent(event)
+                events = [self._queue.get()]
+
+            for event in events:
+                self._processEvent(event)
+
+    def _processEvent(self, event):
+        if event.type == DyEventType.register:
+            self._processRegisterEvent(event.data['type'], event.data['handler'])
+        elif event.type == DyEventType.unregister:
+            self._processUnregisterEvent(event.data['type'], event.data['handler'])
+        else:
+            self._processOtherEvent(event)
 
     def _processRegisterEvent(self, type, handler):
         if type not in self._handlers:
@@ -98,14 +188,26 @@ class DyEventEngine(threading.Thread):
             重复注册相同的timer监听（handler，hand，timer interval都相同），只有第一次注册生效。
             也就是说，不同的timer interval，相同的handler和hand，是可以注册成功的。
             支持注销不存在的timer监听。
+
+        批量模式(@batchSize > 1)：
+            事件引擎和hand每次从队列里批量取出事件，并且批量分发到hand队列，减少锁的次数。
+            可以为高频事件类型注册合并函数(@registerCoalescer)，同一批里同类型的事件合并成一个，比如每只股票只保留最新的Tick。
     """
     enableTimerLog = False
 
+    _systemEventTypes = {DyEventType.register, DyEventType.registerTimer, DyEventType.unregister, DyEventType.unregisterTimer}
+
 
-    def __init__(self, handNbr, timer=True):
+    def __init__(self, handNbr, timer=True, batchSize=1):
+        """
+            @batchSize: 1 - 逐个分发事件，> 1 - 批量模式
+        """
         super().__init__()
 
         self._handNbr = handNbr
+        self._batchSize = batchSize
+
+        self._coalescers = {} # {event type: func([event]) -> event}, 只在批量模式下生效
 
         # timer
         if timer:
@@ -122,17 +224,17 @@ class DyEventEngine(threading.Thread):
         self._handQueues = [] # each hand maps to one element in list, [Queue()]
 
         # main data of event engine
-        self._engineQueue = queue.Queue()
+        self._engineQueue = DyEventQueue()
         self._eventMap = {} # which hand handles which event, {event type:{hand:[handlers]}}
 
         self._initHands()
 
     def _initHands(self):
         for i in range(self._handNbr):
-            queue_ = queue.Queue()
+            queue_ = DyEventQueue()
             self._handQueues.append(queue_)
 
-            self._hands.append(DyEventHand(queue_))
+            self._hands.append(DyEventHand(queue_, self._batchSize, self._coalescers))
 
     def _processUnregister(self, data):
         """ @data: {'type':,'handler':, 'hand':}
@@ -240,28 +342,73 @@ class DyEventEngine(threading.Thread):
 
                     self._timerHandQueue.put(event)
 
-    def run(self):
+    def _processSystemEvent(self, event):
+        """ @return: True - system event, False - event for applications """
+        if event.type == DyEventType.registerTimer:
+            self._processRegisterTimer(event.data)
+
+        elif event.type == DyEventType.register:
+            self._processRegister(event.data)
+
+        elif event.type == DyEventType.unregisterTimer:
+            self._processUnregisterTimer(event.data)
+
+        elif event.type == DyEventType.unregister:
+            self._processUnregister(event.data)
+
+        else:
+            return False
+
+        return True
+
+    def _runBatch(self):
         while True:
-            event = self._engineQueue.get()
+            events = self._engineQueue.getMany(self._batchSize)
+
+            if self._coalescers:
+                events = coalesceEvents(events, self._coalescers)
+
+            handEvents = {} # {hand: [event]}, 还没有分发到hand队列的应用事件
+            for event in events:
+                if event.type in self._systemEventTypes:
+                    # 系统事件会直接放入hand队列，所以先分发之前的应用事件，保持次序
+                    for hand, events_ in handEvents.items():
+                        self._handQueues[hand].putMany(events_)
+
+                    handEvents = {}
 
-            if event.type == DyEventType.registerTimer:
-                self._processRegisterTimer(event.data)
+                    self._processSystemEvent(event)
 
-            elif event.type == DyEventType.register:
-                self._processRegister(event.data)
+                else: # event for applications
+                    hands = self._eventMap.get(event.type)
+                    if hands is not None:
+                        for hand in hands: # hand which is listening this event
+                            handEvents.setdefault(hand, []).append(event)
 
-            elif event.type == DyEventType.unregisterTimer:
-                self._processUnregisterTimer(event.data)
+            for hand, events_ in handEvents.items():
+                self._handQueues[hand].putMany(events_)
 
-            elif event.type == DyEventType.unregister:
-                self._processUnregister(event.data)
+    def run(self):
+        if self._batchSize > 1:
+            self._runBatch()
+            return
+
+        while True:
+            event = self._engineQueue.get()
 
-            else: # event for applications
+            if not self._processSystemEvent(event): # event for applications
                 hands = self._eventMap.get(event.type)
                 if hands is not None:
                     for hand in hands: # hand which is listening this event
                         self._handQueues[hand].put(event)
 
+    def registerCoalescer(self, type, func=coalesceLatestByKey):
+        """
+            注册同类型事件的合并函数，只在批量模式下生效
+            @func: func([event]) -> event
+        """
+        self._coalescers[type] = func
+
     def registerTimer(self, handler, hand=None, interval=1):
         if hand is None:
             hand = self._handNbr - 1
@@ -0,0 +1,112 @@
+import time
+import threading
+
+import numpy as np
+
+from .DyEventEngine import *
+
+
+class DyEventEngineBenchmark(object):
+    """
+        事件引擎的性能测试：模拟行情引擎的Tick风暴
+        每个Tick事件带一只股票的Tick，结果打印每秒分发的事件数和分发延时的p99
+    """
+    tickType = 'eBenchmarkTicks'
+    endType = 'eBenchmarkEnd'
+
+    def _print(name, result):
+        print('{0}: 发送{1}个事件, 处理{2}个事件, {3}个Tick, 耗时{4}ms, {5}事件/秒, 延时p50 {6}ms, p99 {7}ms'.format(
+            name, result['put'], result['handled'], result['ticks'], round(result['seconds']*1000, 3), int(result['rate']),
+            round(result['p50']*1000, 3), round(result['p99']*1000, 3)))
+
+    def tickStorm(codeNbr=5000, rounds=10, handNbr=3, batchSize=1, coalesce=False, handlerCost=0):
+        """
+            @codeNbr: 股票数目，每轮每只股票发送一个Tick事件
+            @rounds: 轮数
+            @handNbr: 监听Tick事件的hand数目
+            @batchSize: 事件引擎的@batchSize
+            @coalesce: 是否合并Tick事件，每只股票只保留最新的Tick
+            @handlerCost: 每个事件处理函数模拟的耗时(秒)
+            @return: {'put':, 'handled':, 'ticks':, 'seconds':, 'rate':, 'p50':, 'p99':}
+        """
+        eventEngine = DyEventEngine(handNbr, timer=False, batchSize=batchSize)
+        if coalesce:
+            eventEngine.registerCoalescer(DyEventEngineBenchmark.tickType)
+
+        # 测试结束后线程随进程退出
+        eventEngine.daemon = True
+        for hand in eventEngine._hands:
+            hand.daemon = True
+
+        latencies = [[] for _ in range(handNbr)]
+        handledCounts = [0]*handNbr
+        endEvents = [threading.Event() for _ in range(handNbr)]
+
+        def createHandlers(hand):
+            def tickHandler(event):
+                now = time.perf_counter()
+
+                handledCounts[hand] += 1
+                latencies[hand].extend([now - putTime for putTime in event.data.values()])
+
+                if handlerCost > 0:
+                    time.sleep(handlerCost)
+
+            def endHandler(event):
+                endEvents[hand].set()
+
+            return tickHandler, endHandler
+
+        for hand in range(handNbr):
+            tickHandler, endHandler = createHandlers(hand)
+
+            eventEngine.register(DyEventEngineBenchmark.tickType, tickHandler, hand)
+            eventEngine.register(DyEventEngineBenchmark.endType, endHandler, hand)
+
+        eventEngine.start()
+
+        codes = ['{0:06d}'.format(i) for i in range(codeNbr)]
+
+        # storm
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for code in codes:
+                event = DyEvent(DyEventEngineBenchmark.tickType)
+                event.data = {code: time.perf_counter()}
+
+                eventEngine.put(event)
+
+        eventEngine.put(DyEvent(DyEventEngineBenchmark.endType))
+
+        for endEvent in endEvents:
+            endEvent.wait()
+
+        seconds = time.perf_counter() - start
+
+        latencies = np.array([x for hand in latencies for x in hand])
+        put = codeNbr*rounds
+
+        return {'put': put,
+                'handled': sum(handledCounts),
+                'ticks': latencies.shape[0],
+                'seconds': seconds,
+                'rate': put/seconds if seconds > 0 else float('inf'),
+                'p50': np.percentile(latencies, 50) if latencies.shape[0] > 0 else 0,
+                'p99': np.percentile(latencies, 99) if latencies.shape[0] > 0 else 0
+                }
+
+    def run(codeNbr=5000, rounds=10, handNbr=3, handlerCost=0):
+        """ 比较逐个分发，批量分发和批量分发+合并 """
+        modes = [('逐个分发', 1, False),
+                 ('批量分发', 256, False),
+                 ('批量分发+合并', 256, True)
+                 ]
+
+        results = {}
+        for name, batchSize, coalesce in modes:
+            result = DyEventEngineBenchmark.tickStorm(codeNbr, rounds, handNbr, batchSize, coalesce, handlerCost)
+            DyEventEngineBenchmark._print(name, result)
+
+            results[name] = result
+
+        return results
@@ -7,13 +7,14 @@ class DyStockBackTestingEventHandType:
 
 
 class DyStockBackTestingStrategyReqData:
-    def __init__(self, strategyCls, tDays, settings, param, codes=None, paramGroupNo=None):
+    def __init__(self, strategyCls, tDays, settings, param, codes=None, paramGroupNo=None, daysShared=None):
         self.strategyCls = strategyCls
         self.tDays = tDays # 来自UI的req，@tDays是[start date, end date]。分发给子进程的req，@tDays是[tDay]
         self.settings = settings # {}, 回测参数设置, 不包含日期(也就是说忽略日期相关参数)
         self.codes = codes # 测试用的股票代码集
         self.param = param # 策略参数
         self.paramGroupNo = paramGroupNo # 策略参数组合号
+        self.daysShared = daysShared # 父进程共享日线数据的路径，只对进程模式有效
 
 
 class DyStockBackTestingStrategyAckData:
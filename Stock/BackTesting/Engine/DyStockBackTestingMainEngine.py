@@ -25,7 +25,7 @@ class DyStockBackTestingMainEngine(object):
         return self._info
 
     def exit(self):
-        pass
+        self._strategyEngine.exit()
 
     def setThreadMode(self):
         self._strategyEngine.setThreadMode(threadMode)
@@ -6,6 +6,7 @@ from ...DyStockBackTestingCommon import *
 from .DyStockBackTestingStrategyEngineProxy import *
 from ....Data.Engine.Common.DyStockDataCommonEngine import *
 from ....Data.Engine.DyStockMongoDbEngine import *
+from ....Data.Engine.DyStockDataDaysShared import DyStockDataDaysShared
 from DyCommon.DyCommon import *
 from ....Common.DyStockCommon import *
 
@@ -16,6 +17,9 @@ class DyStockBackTestingStrategyEngine(object):
     # 二者互斥
     paramGroupNbr = 6 # 并行回测多少个参数组合，只对进程模式有效
     periodNbr = 6 # 回测分成多少个周期，只对进程模式有效
+
+    sharedDays = True # 父进程载入一次日线数据，所有回测子进程共享，只对进程模式有效
+    sharedDaysLookback = 250 # 共享日线数据在回测开始日期之前的交易日数，主要是为了策略开盘前的准备数据
     
     def __init__(self, eventEngine, info):
         self._eventEngine = eventEngine
@@ -29,6 +33,7 @@ class DyStockBackTestingStrategyEngine(object):
         self.setThreadMode()
 
         self._testedStocks = None
+        self._daysShared = None # 共享日线数据的路径
 
         self._registerEvent()
 
@@ -185,6 +190,8 @@ class DyStockBackTestingStrategyEngine(object):
             类似于窗口推进方式回测参数组合
         """
         if not (self._paramGroups or self._runningBackTestingParamGroups):
+            self._removeSharedDays()
+
             self._eventEngine.put(DyEvent(DyEventType.finish))
             return True
 
@@ -233,11 +240,35 @@ class DyStockBackTestingStrategyEngine(object):
                 self._runningBackTestingParamGroups[self._paramGroupCount].append(event.data['period'])
 
                 # create subprocess for processing each period
-                reqData = DyStockBackTestingStrategyReqData(self._strategyCls, tradeDays_, self._settings, param, self._testedStocks, self._paramGroupCount)
+                reqData = DyStockBackTestingStrategyReqData(self._strategyCls, tradeDays_, self._settings, param, self._testedStocks, self._paramGroupCount, self._daysShared)
                 self._proxy.startBackTesting(reqData)
 
         return True
 
+    def _removeSharedDays(self):
+        if not DyStockDataDaysShared.remove(self._daysShared):
+            self._info.print('删除共享日线数据失败, 请手动删除: {0}'.format(self._daysShared), DyLogData.warning)
+
+        self._daysShared = None
+
+    def _createSharedDays(self, startDate, endDate):
+        """
+            载入整个回测周期的日线数据，所有回测子进程共享
+            @return: 共享日线数据的路径, None - 子进程各自载入
+        """
+        mongoDbEngine = DyStockMongoDbEngine(self._info)
+        commonEngine = DyStockDataCommonEngine(mongoDbEngine, None, self._info)
+
+        if not commonEngine.load([startDate, -self.sharedDaysLookback], self._testedStocks):
+            return None
+
+        startDay = commonEngine.tOldestDay()
+
+        if not commonEngine.load([startDate, endDate], self._testedStocks):
+            return None
+
+        return DyStockDataDaysShared.create(mongoDbEngine, commonEngine.stockAllCodesFunds, startDay, commonEngine.tLatestDay(), self._info)
+
     def _backTesting(self, reqData):
         # unpack
         strategyCls = reqData.strategyCls
@@ -260,6 +291,11 @@ class DyStockBackTestingStrategyEngine(object):
         # 获取回测周期内的所有交易日
         self._tradeDays = commonEngine.getTradeDays(startDate, endDate)
 
+        # 进程模式下，子进程共享父进程载入的日线数据
+        self._removeSharedDays()
+        if self.sharedDays and self._proxy is self._proxyProcess:
+            self._daysShared = self._createSharedDays(startDate, endDate)
+
         # 创建策略参数组合
         self._createParamGroups(param)
 
@@ -272,6 +308,8 @@ class DyStockBackTestingStrategyEngine(object):
     def _stockStrategyBackTestingReqHandler(self, event):
         # back testing
         if not self._backTesting(event.data):
+            self._removeSharedDays()
+
             self._eventEngine.put(DyEvent(DyEventType.fail))
     
     def _stockStrategyBackTestingAckHandler(self, event):
@@ -292,6 +330,10 @@ class DyStockBackTestingStrategyEngine(object):
                 # 向前推进回测参数组合
                 self._backTestingParamGroups()
 
+    def exit(self):
+        """ 程序退出时删除共享日线数据 """
+        self._removeSharedDays()
+
     def _registerEvent(self):
         self._eventEngine.register(DyEventType.stockStrategyBackTestingReq, self._stockStrategyBackTestingReqHandler, DyStockBackTestingEventHandType.engine)
         self._eventEngine.register(DyEventType.stockStrategyBackTestingAck, self._stockStrategyBackTestingAckHandler, DyStockBackTestingEventHandType.engine)
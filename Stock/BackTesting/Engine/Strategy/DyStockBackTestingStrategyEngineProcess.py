@@ -6,6 +6,8 @@ from EventEngine.DyEventEngine import *
 from ...DyStockBackTestingCommon import *
 from .DyStockBackTestingCtaEngine import *
 from ....Data.Engine.DyStockDataEngine import *
+from ....Data.Engine.DyStockMongoDbEngine import DyStockMongoDbEngine
+from ....Data.Engine.DyStockDataDaysShared import DyStockDataDaysShared
 
 
 def dyStockBackTestingStrategyEngineProcess(outQueue, inQueue, reqData):
@@ -16,6 +18,10 @@ def dyStockBackTestingStrategyEngineProcess(outQueue, inQueue, reqData):
     paramGroupNo = reqData.paramGroupNo
     period = [reqData.tDays[0], reqData.tDays[-1]]
 
+    # 父进程载入的共享日线数据
+    if reqData.daysShared is not None:
+        DyStockMongoDbEngine.daysShared = DyStockDataDaysShared.attach(reqData.daysShared)
+
     eventEngine = DyDummyEventEngine()
     info = DySubInfo(paramGroupNo, period, outQueue)
     dataEngine = DyStockDataEngine(eventEngine, info, False)
@@ -28,7 +28,8 @@ class DyStockConfig(object):
                               'stockDaysDb': 'stockDaysDbTuShare'
                               }
                           },
-                      "Ticks": {"db": 'stockTicksDb'}
+                      "Ticks": {"db": 'stockTicksDb', "Archive": False},
+                      "Cache": {"Days": False}
                       }
 
     defaultWxScKey = {"WxScKey": ""}
@@ -104,6 +105,10 @@ class DyStockConfig(object):
 
         # ticks
         DyStockMongoDbEngine.stockTicksDb = data["Ticks"]["db"]
+        DyStockMongoDbEngine.ticksArchiveEnabled = data["Ticks"].get("Archive", False) # not existing in old config file
+
+        # local cache, not existing in old config file
+        DyStockMongoDbEngine.daysCacheEnabled = data.get("Cache", {}).get("Days", False)
 
     def getStockMongoDbFileName():
         path = DyCommon.createPath('Stock/User/Config/Common')
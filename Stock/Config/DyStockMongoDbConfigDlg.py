@@ -1,6 +1,6 @@
 import json
 
-from PyQt5.QtWidgets import QDialog, QLabel, QTabWidget, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QWidget
+from PyQt5.QtWidgets import QDialog, QLabel, QTabWidget, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QGridLayout, QWidget, QCheckBox
 
 from DyCommon.DyCommon import DyCommon
 from Stock.Common.DyStockCommon import DyStockCommon
@@ -122,15 +122,35 @@ class DyStockMongoDbConfigDlg(QDialog):
         labelStockTicksDb = QLabel('股票分笔数据库')
         self._lineEditStockTicksDb = QLineEdit(self._data["Ticks"]['db'])
 
+        self._checkBoxTicksArchive = QCheckBox('使用本地文件存储分笔数据(代替MongoDB)')
+        self._checkBoxTicksArchive.setChecked(self._data["Ticks"]['Archive'])
+
+        # 布局
+        grid = QGridLayout()
+        grid.setSpacing(10)
+ 
+        grid.addWidget(labelStockTicksDb, 0, 0)
+        grid.addWidget(self._lineEditStockTicksDb, 0, 1)
+        grid.addWidget(self._checkBoxTicksArchive, 1, 0, 1, 2)
+ 
+        widget.setLayout(grid)
+
+        tabWidget.addTab(widget, "分笔数据")
+
+    def _createCacheTab(self, tabWidget):
+        widget = QWidget()
+
+        self._checkBoxDaysCache = QCheckBox('日线数据本地缓存')
+        self._checkBoxDaysCache.setChecked(self._data["Cache"]['Days'])
+
         # 布局
         hbox = QHBoxLayout()
  
-        hbox.addWidget(labelStockTicksDb)
-        hbox.addWidget(self._lineEditStockTicksDb)
+        hbox.addWidget(self._checkBoxDaysCache)
  
         widget.setLayout(hbox)
 
-        tabWidget.addTab(widget, "分笔数据")
+        tabWidget.addTab(widget, "本地缓存")
 
     def _initUi(self):
         self.setWindowTitle('配置-MongoDB')
@@ -139,6 +159,7 @@ class DyStockMongoDbConfigDlg(QDialog):
         self._createConnectionTab(tabWidget)
         self._createCommonDaysTab(tabWidget)
         self._createTicksTab(tabWidget)
+        self._createCacheTab(tabWidget)
         
 
         cancelPushButton = QPushButton('Cancel')
@@ -167,9 +188,15 @@ class DyStockMongoDbConfigDlg(QDialog):
         except:
             self._data = DyStockConfig.defaultMongoDb
 
+        # not existing in old config file
+        if "Cache" not in self._data:
+            self._data["Cache"] = DyStockConfig.defaultMongoDb["Cache"]
+
+        self._data["Ticks"].setdefault('Archive', DyStockConfig.defaultMongoDb["Ticks"]['Archive'])
+
     def _ok(self):
         # get data from UI
-        data = {"Connection": {}, "CommonDays": {"Wind": {}, "TuShare": {}}, "Ticks": {}}
+        data = {"Connection": {}, "CommonDays": {"Wind": {}, "TuShare": {}}, "Ticks": {}, "Cache": {}}
 
         # host & port
         data["Connection"]["Host"] = self._lineEditHost.text()
@@ -189,6 +216,10 @@ class DyStockMongoDbConfigDlg(QDialog):
 
         # ticks
         data["Ticks"]['db'] = self._lineEditStockTicksDb.text()
+        data["Ticks"]['Archive'] = self._checkBoxTicksArchive.isChecked()
+
+        # local cache
+        data["Cache"]['Days'] = self._checkBoxDaysCache.isChecked()
 
         # config to variables
         DyStockConfig.configStockMongoDb(data)
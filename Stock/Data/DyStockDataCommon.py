@@ -12,17 +12,20 @@ class DyStockDataEventHandType:
 
 
 class DyStockHistTicksReqData:
-    def __init__(self, code, date):
+    def __init__(self, code, date, source=None):
         self.code = code
         self.date = date
+        self.source = source # 先从哪个数据源获取, None - 按数据源设置的次序
 
 class DyStockHistTicksAckData:
     noData = 'noData'
 
-    def __init__(self, code, date, data):
+    def __init__(self, code, date, data, source=None, errorSources=None):
         self.code = code
         self.date = date
         self.data = data
+        self.source = source # 数据源名字, None - 不是来自Gateway
+        self.errorSources = errorSources # 获取失败或者超时的数据源, [source]
 
 """
                 ["股本指标",
@@ -50,3 +53,11 @@ class DyStockDataCommon:
     logDetailsEnabled = False
 
     defaultHistTicksDataSource = '智能' # '新浪', '腾讯' , '网易', '智能'
+    histTicksAsyncFetch = False # 历史分笔数据是否通过asyncio并发获取，需要安装aiohttp。否则每个hand阻塞获取。
+
+    def getHistTicksDataSources(dataSource):
+        """ @return: 历史分笔数据源设置对应的数据源名字，按优先级 """
+        if dataSource in ['新浪', '腾讯']:
+            return [dataSource]
+
+        return ['腾讯', '新浪'] # '智能'
@@ -0,0 +1,164 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from DyCommon.DyCommon import *
+
+
+class DyStockDataDaysCache(object):
+    """
+        位于MongoDB之前的个股日线数据本地列式缓存
+        每只股票一个目录，每个指标一个.npy文件，读取时内存映射
+        manifest.json记录缓存覆盖的日期范围和复权因子版本
+        同一进程里缓存在DyStockMongoDbEngine.updateDays时失效
+        其他进程或者机器改写了数据库，比如重写复权因子或者恢复数据库，则通过复权因子版本在读取时发现
+    """
+    version = 1
+    manifestFileName = 'manifest.json'
+
+
+    def __init__(self, dbName):
+        self._path = DyCommon.createPath('Stock/User/Cache/Days/' + dbName)
+
+    def _getCodePath(self, code):
+        return os.path.join(self._path, code)
+
+    def _readManifest(self, code):
+        try:
+            with open(os.path.join(self._getCodePath(code), self.manifestFileName)) as f:
+                manifest = json.load(f)
+        except Exception as ex:
+            return None
+
+        if manifest.get('version') != self.version:
+            return None
+
+        return manifest
+
+    def _load(self, path, name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+    def _save(self, path, name, values):
+        np.save(os.path.join(path, name + '.npy'), values)
+
+    def isCovered(self, code, startDate, endDate):
+        manifest = self._readManifest(code)
+        if manifest is None:
+            return False
+
+        return manifest['startDate'] <= startDate and endDate <= manifest['endDate']
+
+    def getUnionDates(self, code, startDate, endDate):
+        """ 缓存覆盖的日期范围和[@startDate, @endDate]的并集 """
+        manifest = self._readManifest(code)
+        if manifest is None:
+            return startDate, endDate
+
+        return min(startDate, manifest['startDate']), max(endDate, manifest['endDate'])
+
+    def get(self, code, startDate, endDate, indicators, getAdjFactor=None):
+        """
+            @getAdjFactor: function(date)，返回数据库里@date的复权因子。跟缓存的复权因子版本不一致，则缓存已经过期。
+            @return: DF，跟DyStockMongoDbEngine.getOneCodeDays格式一致，区间内没有数据则是空DF
+                     None - 缓存没有覆盖[@startDate, @endDate]或者已经过期
+        """
+        manifest = self._readManifest(code)
+        if manifest is None:
+            return None
+
+        if not (manifest['startDate'] <= startDate and endDate <= manifest['endDate']):
+            return None
+
+        # 复权因子版本
+        if getAdjFactor is not None and manifest['adjfactor'] is not None:
+            date, adjFactor = manifest['adjfactor']
+            if getAdjFactor(date) != adjFactor:
+                return None
+
+        path = self._getCodePath(code)
+
+        columns = list(indicators)
+        if 'adjfactor' not in columns:
+            columns.append('adjfactor')
+
+        try:
+            dates = self._load(path, 'datetime')
+
+            start = np.searchsorted(dates, np.datetime64(startDate, 'D'), side='left')
+            end = np.searchsorted(dates, np.datetime64(endDate, 'D') + 1, side='left')
+
+            data = {}
+            for column in columns:
+                if column in manifest['columns']:
+                    data[column] = self._load(path, column)[start:end]
+
+            df = pd.DataFrame(data, index=pd.DatetimeIndex(dates[start:end], name='datetime'), columns=[x for x in columns if x in data])
+            df = df.dropna(axis=1, how='all') # 去除全为NaN的列，比如指数数据，没有'mf_vol'
+
+        except Exception as ex:
+            return None
+
+        return df
+
+    def put(self, code, startDate, endDate, df):
+        """
+            用MongoDB里[@startDate, @endDate]的全部日线数据替换个股的缓存
+            @df: index是datetime，columns是全部指标
+        """
+        path = self._getCodePath(code)
+        tempPath = '{0}.{1}.tmp'.format(path, os.getpid())
+
+        try:
+            shutil.rmtree(tempPath, ignore_errors=True)
+            os.mkdir(tempPath)
+
+            columns = []
+            if df is not None:
+                df = df.sort_index()
+
+                for column in df.columns:
+                    try:
+                        values = df[column].values.astype(np.float64)
+                    except Exception as ex: # 非数值指标不缓存
+                        continue
+
+                    self._save(tempPath, column, values)
+                    columns.append(column)
+
+                dates = df.index.values.astype('datetime64[ns]')
+            else:
+                dates = np.array([], dtype='datetime64[ns]')
+
+            self._save(tempPath, 'datetime', dates)
+
+            # 复权因子版本, 也就是缓存里最新的复权因子
+            adjFactor = None
+            if 'adjfactor' in columns and df.shape[0] > 0:
+                adjFactor = [df.index[-1].strftime("%Y-%m-%d"), float(df['adjfactor'].iloc[-1])]
+
+            # manifest最后写入
+            manifest = {'version': self.version,
+                        'startDate': startDate,
+                        'endDate': endDate,
+                        'columns': columns,
+                        'adjfactor': adjFactor
+                        }
+
+            with open(os.path.join(tempPath, self.manifestFileName), 'w') as f:
+                f.write(json.dumps(manifest, indent=4))
+
+            # replace
+            self.invalidate(code)
+            os.rename(tempPath, path)
+
+        except Exception as ex:
+            shutil.rmtree(tempPath, ignore_errors=True)
+            return False
+
+        return True
+
+    def invalidate(self, code):
+        shutil.rmtree(self._getCodePath(code), ignore_errors=True)
@@ -1,12 +1,27 @@
+import threading
+import queue
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
 from DyCommon.DyCommon import *
 from EventEngine.DyEvent import *
 from ..DyStockDataCommon import *
 from .Common.DyStockDataCommonEngine import *
+from .DyStockDataDaysPanel import DyStockDataDaysPanel
 
 
 class DyStockDataDaysEngine(object):
     """ 股票（指数）历史日线数据，包含股票代码表和交易日数据 """
 
+    updateThreadNbr = 4 # 更新日线数据时，并发从数据源获取数据的线程数。Wind接口不是线程安全的，使用Wind时只用一个线程。
+    updateQueueSize = 16 # 已经从数据源获取但还没有写入数据库的股票数目上限
+    loadThreadNbr = 8 # 并发载入日线数据和复权因子的线程数
+
+    adjPriceIndicators = ['open', 'high', 'low', 'close'] # 前复权时乘以复权因子的指标，成交量则除以复权因子
+
+
     def __init__(self, eventEngie, mongoDbEngine, gateway, info, registerEvent=True):
         self._eventEngine = eventEngie
         self._mongoDbEngine = mongoDbEngine
@@ -17,8 +32,16 @@ class DyStockDataDaysEngine(object):
         self._progress = DyProgress(self._info)
 
         self._updatedCodeCount = 0 # 更新日线数据的计数器
+        self._incrementalDateRange = None # 增量更新的日期范围(startDate, endDate)，None - 不是增量更新
         self._codeDaysDf = {} # 股票的日线DataFrame
         self._codeAdjFactors = {} # 股票的复权因子
+        self._panel = None # 载入的日线数据的面板表示，调用@getPanel时生成
+
+        self._unadjustedCodes = set() # 延迟前复权模式下还没有前复权的股票
+        self._adjLock = threading.Lock()
+
+        self._preloaded = None # @preload载入的数据, {'startDay':, 'endDay':, 'indicators':, 'codes':}
+        self._window = None # 预载入模式下@load设置的窗口(startDay, endDay)，None - 返回所有载入的数据
         
         if registerEvent:
             self._registerEvent()
@@ -32,15 +55,19 @@ class DyStockDataDaysEngine(object):
         # 启用进度条显示
         self._progress.init(len(self.stockAllCodesFunds), 100, 5)
 
-        for code, name in self.stockAllCodesFunds.items():
-            df = self._mongoDbEngine.getOneCodeDays(code, startDate, endDate, indicators, name)
+        start = datetime.now()
 
-            if df is not None:
-                self._codeDaysDf[code] = df
+        # 并发载入
+        codesDf = self._mongoDbEngine.getDays(self.stockAllCodesFunds, startDate, endDate, indicators, threadNbr=self.loadThreadNbr, progress=self._progress)
+        if codesDf is not None:
+            self._codeDaysDf = codesDf
 
-            self._progress.update()
+        # 载入吞吐量
+        seconds = (datetime.now() - start).total_seconds()
+        rows = sum([df.shape[0] for df in self._codeDaysDf.values()])
 
-        self._info.print('股票(指数,基金)的日线数据载入完成')
+        self._info.print('股票(指数,基金)的日线数据载入完成: {0}只, {1}行, 耗时{2}秒, {3}行/秒'.format(len(self._codeDaysDf), rows, round(seconds, 2),
+                                                                                    int(rows/seconds) if seconds > 0 else rows))
         return True
 
     def _getDaysNotInDb(self, tradeDays, codes, indicators):
@@ -53,16 +80,41 @@ class DyStockDataDaysEngine(object):
 
         self._progress.init(len(codes), 100)
 
+        return self._mongoDbEngine.getCodesNotExistingDates(codes, tradeDays, indicators, progress=self._progress)
+
+    def _getDaysNotInDbByMeta(self, tradeDays, codes, indicators):
+        """
+            增量更新: 根据日线元数据里每只股票每个指标的最新日期，计算需要更新的交易日，所有股票只需要一次查询
+            元数据里没有的股票，先根据数据库里最新的一条日线数据生成元数据
+            @return: {code: {indicator: [trade day]}}
+        """
+        meta = self._mongoDbEngine.getDaysMeta(codes)
+        if meta is None: # 数据库异常，逐只股票从数据库获取
+            return self._getDaysNotInDb(tradeDays, codes, indicators)
+
+        unknownCodes = [code for code in codes if code not in meta]
+        if unknownCodes:
+            self._info.print('{0}只股票(指数,基金)没有日线元数据, 开始生成...'.format(len(unknownCodes)))
+
+            self._progress.init(len(unknownCodes), 100)
+            self._mongoDbEngine.rebuildDaysMeta(unknownCodes, progress=self._progress)
+
+            meta.update(self._mongoDbEngine.getDaysMeta(unknownCodes) or {})
+
         data = {}
         for code in codes:
-            temp = self._mongoDbEngine.getNotExistingDates(code, tradeDays, indicators)
+            codeMeta = meta.get(code, {})
 
-            if temp:
-                data[code] = temp
+            for indicator in indicators:
+                latestDate = codeMeta.get(indicator)
+                dates = tradeDays if latestDate is None else tradeDays[bisect.bisect_right(tradeDays, latestDate):]
 
-            self._progress.update()
-        
-        return data if data else None
+                if dates:
+                    data.setdefault(code, {})[indicator] = dates
+
+        self._info.print('根据日线元数据, {0}只股票(指数,基金)需要更新'.format(len(data)))
+
+        return data
 
     def _updateHistDaysBasic(self, startDate, endDate):
         """
@@ -70,8 +122,9 @@ class DyStockDataDaysEngine(object):
         """
         return self._commonEngine.updateCodes() and self._commonEngine.updateTradeDays(startDate, endDate)# and self._commonEngine.updateAllSectorCodes(startDate, endDate)
 
-    def _getUpdatedCodes(self, startDate, endDate, indicators, isForced, codes=None):
+    def _getUpdatedCodes(self, startDate, endDate, indicators, isForced, codes=None, incremental=False):
         """
+            @incremental: 是否根据日线元数据增量计算
             @return: {code: {indicator: [trade day]}}
         """
         # get trade days
@@ -82,7 +135,11 @@ class DyStockDataDaysEngine(object):
 
         # get not existing from DB
         if not isForced:
-            codes = self._getDaysNotInDb(tradeDays, codes, indicators)
+            if incremental:
+                codes = self._getDaysNotInDbByMeta(tradeDays, codes, indicators)
+            else:
+                codes = self._getDaysNotInDb(tradeDays, codes, indicators)
+
             if not codes:
                 self._info.print("历史日线数据已经在数据库")
                 self._progress.init(0)
@@ -104,15 +161,24 @@ class DyStockDataDaysEngine(object):
 
         return codes
 
-    def _updateHistDays(self, startDate, endDate, indicators, isForced=False, codes=None):
+    def _updateHistDays(self, startDate, endDate, indicators, isForced=False, codes=None, incremental=False):
 
         # get updated codes data info
-        codes = self._getUpdatedCodes(startDate, endDate, indicators, isForced, codes)
-        if codes is None: return
+        codes = self._getUpdatedCodes(startDate, endDate, indicators, isForced, codes, incremental)
+        if codes is None:
+            if incremental:
+                self._mongoDbEngine.setDaysUpdateState(startDate, endDate, True)
+            return
+
+        # 增量更新中断的话，下次从本次的开始日期继续
+        self._incrementalDateRange = (startDate, endDate) if incremental else None
+        if incremental:
+            self._mongoDbEngine.setDaysUpdateState(startDate, endDate)
 
         # init
         self._isStopped = False
         self._updatedCodeCount = 0
+        self._mongoDbEngine.clearUpdateCounts()
         self._progress.init(len(codes), 10)
 
         self._info.print("开始更新{0}只股票(指数,基金)的历史日线数据...".format(len(codes)))
@@ -123,7 +189,7 @@ class DyStockDataDaysEngine(object):
 
         self._eventEngine.put(event)
 
-    def _update(self, startDate, endDate, indicators, isForced=False, codes=None):
+    def _update(self, startDate, endDate, indicators, isForced=False, codes=None, incremental=False):
         # update all stock A code table, trade day table and sector code table firstly
         if not self._updateHistDaysBasic(startDate, endDate):
             self._printCount()
@@ -138,7 +204,7 @@ class DyStockDataDaysEngine(object):
         self._eventEngine.put(event)
 
         # 更新日线数据
-        self._updateHistDays(startDate, endDate, indicators, isForced, codes)
+        self._updateHistDays(startDate, endDate, indicators, isForced, codes, incremental)
 
     def _autoUpdate(self):
         # get latest date from DB
@@ -166,6 +232,14 @@ class DyStockDataDaysEngine(object):
 
         startDate = DyTime.getDateStr(latestDate, 1) # next date after latest date in DB
 
+        # 上次增量更新被中断，交易日数据已经更新但部分股票的日线数据没有，所以从上次的开始日期继续
+        # 已经更新完的股票，由日线元数据跳过
+        state = self._mongoDbEngine.getDaysUpdateState()
+        if state is not None and not state['finished'] and state['startDate'] < startDate:
+            startDate = state['startDate']
+
+            self._info.print("继续上次中断的日线数据更新, 开始日期{0}".format(startDate), DyLogData.ind)
+
         # compare dates
         if endDate < startDate:
             # update progress UI
@@ -175,7 +249,7 @@ class DyStockDataDaysEngine(object):
             self._eventEngine.put(DyEvent(DyEventType.finish))
             return
 
-        self._update(startDate, endDate, DyStockDataCommon.dayIndicators)
+        self._update(startDate, endDate, DyStockDataCommon.dayIndicators, incremental=True)
 
     def _updateStockHistDaysHandler(self, event):
 
@@ -212,9 +286,10 @@ class DyStockDataDaysEngine(object):
                 
         self._eventEngine.put(DyEvent(DyEventType.finish))
 
-    def _updateOneCode(self, code, data):
-
-        # get max date range
+    def _getUpdateDateRange(self, data):
+        """ @data: {indicator: [trade day]}
+            @return: 所有指标需要更新的最大日期范围
+        """
         startDate, endDate = None, None
         for _, dates in data.items():
             if startDate is None:
@@ -227,19 +302,65 @@ class DyStockDataDaysEngine(object):
                 if operator.gt(dates[-1], endDate):
                     endDate = dates[-1]
 
-        # get from Gateway
-        data = self._gateway.getDays(code, startDate, endDate, sorted(data), self.stockAllCodesFunds[code])
-        if not data: # None(errors) or no data
-            return
+        return startDate, endDate
+
+    def _fetchOneCode(self, code, data, writeQueue):
+        """ 数据源获取线程: 从Gateway获取一只股票的日线数据，然后放入写数据库队列 """
+        days = None
+
+        if not self._isStopped:
+            startDate, endDate = self._getUpdateDateRange(data)
+
+            try:
+                days = self._gateway.getDays(code, startDate, endDate, sorted(data), self.stockAllCodesFunds[code])
+            except Exception as ex:
+                self._info.print("从数据源获取{0}:{1}日线数据[{2}, {3}]异常: {4}".format(code, self.stockAllCodesFunds[code], startDate, endDate, str(ex)), DyLogData.error)
+
+        # 队列满时阻塞，也就是数据库写入跟不上时，数据源获取线程等待
+        writeQueue.put((code, days))
+
+    def _writeUpdatedDays(self, codeNbr, writeQueue, executor):
+        """ 数据库写入线程: 逐个写入获取到的日线数据，所有股票处理完后发送结束事件 """
+        failed = False
+        for _ in range(codeNbr):
+            code, data = writeQueue.get()
+
+            # None(errors) or no data
+            if data and not self._isStopped:
+                if self._mongoDbEngine.updateDays(code, data):
+                    self._updatedCodeCount += 1 # 需要更新的股票（也就是在数据库里的数据不全），并且数据成功写入数据库
+                else:
+                    failed = True
 
-        # updat to DB
-        if self._mongoDbEngine.updateDays(code, data):
-            self._updatedCodeCount += 1 # 需要更新的股票（也就是在数据库里的数据不全），并且数据成功写入数据库
+            elif data is None:
+                failed = True
+
+            if not self._isStopped:
+                self._progress.update()
+
+        executor.shutdown()
+
+        # 有股票失败的话，下次增量更新继续
+        if self._incrementalDateRange is not None and not self._isStopped and not failed:
+            self._mongoDbEngine.setDaysUpdateState(*self._incrementalDateRange, finished=True)
+
+        self._printCount()
+        self._eventEngine.put(DyEvent(DyEventType.stopAck if self._isStopped else DyEventType.finish))
 
     def _printCount(self):
         self._info.print('由于股票停牌或者没有上市, 更新了{0}只股票(指数,基金)日线数据'.format(self._updatedCodeCount), DyLogData.ind)
 
+        # 批量写入数据库的行数统计
+        counts = [v for k, v in self._mongoDbEngine.getUpdateCounts().items() if k in self.stockAllCodesFunds]
+        if counts:
+            inserted, modified, failed = [sum(x) for x in zip(*counts)]
+            self._info.print('日线数据写入数据库: 插入{0}行, 修改{1}行, 失败{2}行'.format(inserted, modified, failed), DyLogData.ind)
+
     def _updateStockHistDays_Handler(self, event):
+        """
+            流水线更新日线数据：多个线程并发从数据源获取，一个线程批量写入数据库
+            处理函数马上返回，所以停止事件可以及时被处理
+        """
         # unpack
         codes = event.data
 
@@ -249,26 +370,18 @@ class DyStockDataDaysEngine(object):
             self._eventEngine.put(DyEvent(DyEventType.stopAck))
             return
 
-        # update one code each time
-        code = sorted(codes)[0]
-        self._updateOneCode(code, codes[code])
+        threadNbr = 1 if 'Wind' in DyStockCommon.defaultHistDaysDataSource else self.updateThreadNbr
 
-        # update progress
-        self._progress.update()
+        writeQueue = queue.Queue(max(self.updateQueueSize, threadNbr))
+        executor = ThreadPoolExecutor(max_workers=threadNbr)
 
-        # delete updated code
-        del codes[code]
+        # start DB writer firstly
+        writer = threading.Thread(target=self._writeUpdatedDays, args=(len(codes), writeQueue, executor))
+        writer.daemon = True
+        writer.start()
 
-        if not codes: # all codes are are updated
-            self._printCount()
-            self._eventEngine.put(DyEvent(DyEventType.finish))
-            return
-
-        # send for next updating
-        event = DyEvent(DyEventType.updateStockHistDays_)
-        event.data = codes
-
-        self._eventEngine.put(event)
+        for code in sorted(codes):
+            executor.submit(self._fetchOneCode, code, codes[code], writeQueue)
 
     def _loadCommon(self, dates, codes):
         if not self._commonEngine.load(dates, codes):
@@ -283,6 +396,8 @@ class DyStockDataDaysEngine(object):
         # init
         self._codeAdjFactors = {}
 
+        endDay = date # 载入的日线数据的结束日期
+
         if latestAdjFactorInDb: # 获取数据库里日线数据的最新复权因子
             date = self._commonEngine.getLatestTradeDayInDb()
             if date is None: return False
@@ -290,41 +405,85 @@ class DyStockDataDaysEngine(object):
         # init progress
         self._progress.init(len(self._codeDaysDf), 100, 10)
 
-        # 载入复权因子, 基于载入的日线数据
-        for code, _ in self._codeDaysDf.items():
-            adjFactor = self._mongoDbEngine.getAdjFactor(code, date, self.stockAllCodesFunds[code])
+        # 载入的日线数据覆盖了@date，则@date的复权因子就是载入的日线数据里@date之前(含)最新的复权因子，不需要再查询数据库
+        queryCodes = []
+        for code, df in self._codeDaysDf.items():
+            adjFactor = self._getAdjFactorByDf(df, date) if endDay >= date else None
 
             if adjFactor is not None:
                 self._codeAdjFactors[code] = adjFactor
+                self._progress.update()
             else:
-                self._info.print('{0}:{1}复权因子缺失[{2}]'.format(code, self.stockAllCodesFunds[code], date), DyLogData.warning)
+                queryCodes.append(code)
 
-            self._progress.update()
+        # 其他的并发从数据库载入
+        with ThreadPoolExecutor(max_workers=self.loadThreadNbr) as executor:
+            adjFactors = executor.map(lambda code: self._mongoDbEngine.getAdjFactor(code, date, self.stockAllCodesFunds[code]), queryCodes)
+
+            for code, adjFactor in zip(queryCodes, adjFactors):
+                if adjFactor is not None:
+                    self._codeAdjFactors[code] = adjFactor
+                else:
+                    self._info.print('{0}:{1}复权因子缺失[{2}]'.format(code, self.stockAllCodesFunds[code], date), DyLogData.warning)
+
+                self._progress.update()
 
         self._info.print('复权因子载入完成')
         return True
 
-    def _processAdj(self):
-        """ 前复权 """
-        self._info.print("开始前复权...")
+    def _getAdjFactorByDf(self, df, date):
+        """ 从载入的日线数据获取@date之前(含)最新的复权因子 """
+        if 'adjfactor' not in df:
+            return None
 
-        self._progress.init(len(self._codeDaysDf), 100, 20)
+        adjFactor = df['adjfactor'][:date].dropna()
 
-        for code, df in self._codeDaysDf.items():
-            # 复权因子变换
-            adjFactor = df['adjfactor']/self._codeAdjFactors[code]
-            adjFactor = adjFactor.values.reshape((adjFactor.shape[0], 1))
+        return None if adjFactor.empty else adjFactor.iloc[-1]
+
+    def _processAdj(self, codes=None):
+        """
+            前复权
+            所有股票的日线数据堆叠成一个数组，一次向量化计算后再写回各自的DF
+            @codes: [code], None - 所有载入的股票
+        """
+        isAll = codes is None
+        if isAll:
+            self._info.print("开始前复权...")
+
+            codes = list(self._codeDaysDf)
+
+        dfs = [self._codeDaysDf[code] for code in codes]
+        sizes = [df.shape[0] for df in dfs]
+
+        if sum(sizes) > 0:
+            # 复权因子变换, 每只股票的最新复权因子扩散到该股票的每一行
+            adjFactors = np.concatenate([df['adjfactor'].values for df in dfs])
+            adjFactors = adjFactors / np.repeat([self._codeAdjFactors[code] for code in codes], sizes)
+            adjFactors = adjFactors.reshape((adjFactors.shape[0], 1))
 
             # 价格相关
-            prices = df[['open', 'high', 'low', 'close']].values
-            df[['open', 'high', 'low', 'close']] = prices * adjFactor
+            prices = np.concatenate([df[self.adjPriceIndicators].values for df in dfs]) * adjFactors
 
             # 成交量
-            df[['volume']] = df[['volume']].values / adjFactor
+            volumes = np.concatenate([df[['volume']].values for df in dfs]) / adjFactors
 
-            self._progress.update()
+            # 写回
+            offsets = np.cumsum(sizes)[:-1]
+            for df, prices_, volumes_ in zip(dfs, np.split(prices, offsets), np.split(volumes, offsets)):
+                df[self.adjPriceIndicators] = prices_
+                df[['volume']] = volumes_
 
-        self._info.print("前复权完成")
+        self._unadjustedCodes.difference_update(codes)
+
+        if isAll:
+            self._info.print("前复权完成")
+
+    def _processLazyAdj(self, codes):
+        """ 延迟前复权模式下，第一次访问时前复权 """
+        with self._adjLock:
+            codes = [code for code in codes if code in self._unadjustedCodes]
+            if codes:
+                self._processAdj(codes)
 
     def _unionDates(self, startDate, endDate, dates):
         for date in dates:
@@ -533,6 +692,11 @@ class DyStockDataDaysEngine(object):
             @latestAdjFactorInDb: True - 基于数据库最新复权因子前复权，一般用于选股分析和回归
                                   False - 基于end day的复权因子前复权，一般用于实盘回测
         """
+        self._panel = None
+        self._unadjustedCodes = set()
+        self._preloaded = None
+        self._window = None
+
         # 载入股票代码表
         if not self.loadCodeTable([code]):
             self._info.print('载入[{0}]股票代码表失败'.format(code), DyLogData.error)
@@ -559,7 +723,7 @@ class DyStockDataDaysEngine(object):
 
         return True
 
-    def load(self, dates, indicators=DyStockDataCommon.dayIndicators, latestAdjFactorInDb=True, codes=None):
+    def load(self, dates, indicators=DyStockDataCommon.dayIndicators, latestAdjFactorInDb=True, codes=None, lazyAdj=False):
         """ 
             基于交易日数据，载入股票（基金）日线数据。总是载入指数日线数据。
             @dates: 类型是list，有如下几种模式：
@@ -571,13 +735,25 @@ class DyStockDataDaysEngine(object):
             @latestAdjFactorInDb: True - 基于数据库最新复权因子前复权，一般用于选股分析和回归
                              False - 基于end day的复权因子前复权，一般用于实盘回测
             @codes: [code], 股票代码，指数数据默认载入。None-载入所有股票（基金）日线数据，[]-只载入指数数据。
+            @lazyAdj: True - 延迟前复权，股票的日线数据在第一次通过@getDataFrame或者@getPanel访问时才前复权
         """
+        self._panel = None
+        self._window = None
+
         # 载入公共数据
         startDay, endDay = self._loadCommon(dates, codes)
         if startDay is None:
             self._info.print('DyStockDataEngine._loadCommon: 载入数据失败', DyLogData.error)
             return False
 
+        # 预载入的数据已经包含，则只设置窗口
+        if self._isPreloaded(startDay, endDay, indicators, latestAdjFactorInDb, codes):
+            self._window = (startDay, endDay)
+            return True
+
+        self._preloaded = None
+        self._unadjustedCodes = set()
+
         # 载入日线数据
         if not self._loadDays(startDay, endDay, indicators):
             self._info.print('DyStockDataEngine._loadDays: 载入数据失败', DyLogData.error)
@@ -589,7 +765,59 @@ class DyStockDataDaysEngine(object):
             return False
 
         # 前复权
-        self._processAdj()
+        if lazyAdj:
+            self._unadjustedCodes = set(self._codeDaysDf)
+        else:
+            self._processAdj()
+
+        return True
+
+    def _isPreloaded(self, startDay, endDay, indicators, latestAdjFactorInDb, codes):
+        preloaded = self._preloaded
+        if preloaded is None or not latestAdjFactorInDb:
+            return False
+
+        return preloaded['startDay'] <= startDay and endDay <= preloaded['endDay'] \
+               and set(indicators) == preloaded['indicators'] \
+               and (None if codes is None else set(codes)) == preloaded['codes']
+
+    def _sliceWindow(self, df):
+        """ 预载入模式下，只返回窗口内的数据 """
+        if self._window is None or df is None:
+            return df
+
+        df = df[self._window[0]:self._window[1]]
+
+        return None if df.empty else df
+
+    def preload(self, datesList, indicators=DyStockDataCommon.dayIndicators, codes=None):
+        """
+            预载入多个日期范围的并集，基于数据库最新复权因子前复权
+            之后调用@load时，如果日期范围在其之内，并且指标和股票一样，则不再从数据库载入，只是设置窗口。
+            @getDataFrame, @getPanel等只返回窗口内的数据。主要用于选股回归，相邻交易日载入的日期范围大部分重叠。
+            @datesList: [dates]，dates跟@load一样
+            @codes: 跟@load一样
+        """
+        startDays, endDays = [], []
+        for dates in datesList:
+            startDay, endDay = self._loadCommon(dates, codes)
+            if startDay is None:
+                self._info.print('DyStockDataEngine._loadCommon: 载入数据失败', DyLogData.error)
+                return False
+
+            startDays.append(startDay)
+            endDays.append(endDay)
+
+        self._preloaded = None
+
+        if not self.load([min(startDays), max(endDays)], indicators, True, codes, lazyAdj=True):
+            return False
+
+        self._preloaded = {'startDay': min(startDays),
+                           'endDay': max(endDays),
+                           'indicators': set(indicators),
+                           'codes': None if codes is None else set(codes)
+                           }
 
         return True
 
@@ -598,6 +826,13 @@ class DyStockDataDaysEngine(object):
         if df is None:
             return None
 
+        if code in self._unadjustedCodes:
+            self._processLazyAdj([code])
+
+        df = self._sliceWindow(df)
+        if df is None:
+            return None
+
         if date is None:
             return df
 
@@ -622,13 +857,52 @@ class DyStockDataDaysEngine(object):
 
         return retDf
 
+    def getPanel(self):
+        """
+            获取载入的日线数据的面板表示，每个指标一个二维数组(交易日 × 股票)，停牌日为NaN
+            跟@getDataFrame一样，基于前复权后的日线数据
+            @return: DyStockDataDaysPanel, None - 没有载入日线数据
+        """
+        if self._panel is None:
+            if not self._codeDaysDf:
+                return None
+
+            if self._unadjustedCodes:
+                self._processLazyAdj(list(self._unadjustedCodes))
+
+            codeDaysDf = {code: self._sliceWindow(df) for code, df in self._codeDaysDf.items()}
+            codeDaysDf = {code: df for code, df in codeDaysDf.items() if df is not None and not df.empty}
+            if not codeDaysDf:
+                return None
+
+            dfs = list(codeDaysDf.values())
+
+            startDay = min([df.index[0] for df in dfs]).strftime("%Y-%m-%d")
+            endDay = max([df.index[-1] for df in dfs]).strftime("%Y-%m-%d")
+
+            self._panel = DyStockDataDaysPanel(codeDaysDf, self.tDays(startDay, endDay))
+
+        return self._panel
+
     def isExisting(self, code, date):
-        if code not in self._codeDaysDf:
+        df = self._sliceWindow(self._codeDaysDf.get(code))
+        if df is None:
             return False
 
         try:
-            self._codeDaysDf[code].ix[date]
+            df.loc[date]
         except Exception as ex:
             return False
 
         return True
+
+    def getExistingDates(self, code):
+        """
+            载入的日线数据里股票存在的日期，用于批量代替@isExisting
+            @return: set([date])
+        """
+        df = self._sliceWindow(self._codeDaysDf.get(code))
+        if df is None:
+            return set()
+
+        return set(df.index.strftime('%Y-%m-%d'))
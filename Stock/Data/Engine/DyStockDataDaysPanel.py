@@ -0,0 +1,104 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+
+class DyStockDataDaysPanel(object):
+    """
+        载入的日线数据的面板表示，用于横截面的向量化计算
+        每个指标一个二维数组(交易日 × 股票)，按交易日对齐，停牌或者还没有上市的交易日是NaN
+        指标的数组在第一次使用时生成
+        !!!返回的数组是内部数组的视图，不要修改
+    """
+
+    def __init__(self, codeDaysDf, tDays):
+        """
+            @codeDaysDf: {code: DF}, 已经前复权的日线数据
+            @tDays: [trade day], 升序
+        """
+        self._codeDaysDf = codeDaysDf
+
+        self._days = list(tDays)
+        self._codes = list(codeDaysDf)
+
+        self._dayIndex = {day: i for i, day in enumerate(self._days)}
+        self._codeIndex = {code: i for i, code in enumerate(self._codes)}
+
+        self._arrays = {} # {indicator: 2-D array}
+        self._positions = None # {code: (day positions, valid mask)}
+
+    def _getPositions(self):
+        """ 每只股票的日线数据在交易日数组里的位置 """
+        if self._positions is None:
+            dates = np.array(self._days, dtype='datetime64[D]')
+
+            self._positions = {}
+            for code, df in self._codeDaysDf.items():
+                pos = np.searchsorted(dates, df.index.values.astype('datetime64[D]'))
+
+                valid = pos < dates.shape[0]
+                valid[valid] = dates[pos[valid]] == df.index.values[valid].astype('datetime64[D]')
+
+                self._positions[code] = (pos[valid], valid)
+
+        return self._positions
+
+    def _getArray(self, indicator):
+        array = self._arrays.get(indicator)
+        if array is None:
+            array = np.full((len(self._days), len(self._codes)), np.nan)
+
+            for code, (pos, valid) in self._getPositions().items():
+                df = self._codeDaysDf[code]
+                if indicator in df:
+                    array[pos, self._codeIndex[code]] = df[indicator].values[valid]
+
+            self._arrays[indicator] = array
+
+        return array
+
+    def _getDaySlice(self, startDay=None, endDay=None):
+        start = 0 if startDay is None else bisect.bisect_left(self._days, startDay)
+        end = len(self._days) if endDay is None else bisect.bisect_right(self._days, endDay)
+
+        return slice(start, end)
+
+    @property
+    def days(self):
+        return self._days
+
+    @property
+    def codes(self):
+        return self._codes
+
+    def dayPos(self, day):
+        """ @return: 交易日在面板里的行位置，不存在返回None """
+        return self._dayIndex.get(day)
+
+    def codePos(self, code):
+        """ @return: 股票在面板里的列位置，不存在返回None """
+        return self._codeIndex.get(code)
+
+    def get(self, indicator, startDay=None, endDay=None, codes=None):
+        """
+            @startDay, @endDay: None - 不限制
+            @codes: [code], None - 所有股票，次序跟@codes属性一致
+            @return: 2-D array(交易日 × 股票)
+        """
+        array = self._getArray(indicator)[self._getDaySlice(startDay, endDay)]
+
+        if codes is not None:
+            array = array[:, [self._codeIndex[code] for code in codes]]
+
+        return array
+
+    def getDataFrame(self, indicator, startDay=None, endDay=None, codes=None):
+        """
+            @return: DF，index是交易日，columns是股票代码
+        """
+        daySlice = self._getDaySlice(startDay, endDay)
+
+        return pd.DataFrame(self.get(indicator, startDay, endDay, codes),
+                            index=pd.DatetimeIndex(self._days[daySlice], name='datetime'),
+                            columns=self._codes if codes is None else codes)
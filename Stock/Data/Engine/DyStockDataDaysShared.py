@@ -0,0 +1,242 @@
+import os
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from DyCommon.DyCommon import *
+from ..DyStockDataCommon import *
+
+
+class DyStockDataDaysShared(object):
+    """
+        父进程载入一次，子进程共享的只读日线数据
+        父进程从MongoDB载入一个日期范围内所有股票的原始(未复权)日线数据，按列连续写入临时目录，每个指标一个.npy文件
+        子进程内存映射这些文件，所以多个子进程共享操作系统的页缓存，不会增加内存和数据库的负担
+        子进程设置@DyStockMongoDbEngine.daysShared后，覆盖的日线数据和复权因子查询不再访问MongoDB
+        子进程获取的DF只有前复权改写的指标(@adjIndicators)是私有拷贝，其他指标是共享数据的只读视图
+        !!!只在回测和回归期间使用，期间数据库里的日线数据不应该被更新
+    """
+    version = 1
+    manifestFileName = 'manifest.json'
+
+    adjIndicators = ['open', 'high', 'low', 'close', 'volume'] # 前复权会改写的指标，也就是@DyStockDataDaysEngine.adjPriceIndicators和成交量
+
+
+    def __init__(self, path):
+        """ 子进程通过@attach创建 """
+        self._path = path
+
+        with open(os.path.join(path, self.manifestFileName)) as f:
+            manifest = json.load(f)
+
+        if manifest.get('version') != self.version:
+            raise ValueError('日线共享数据版本不一致')
+
+        self._dbName = manifest['dbName']
+        self._startDate = manifest['startDate']
+        self._endDate = manifest['endDate']
+        self._columns = manifest['columns']
+        self._codes = manifest['codes'] # {code: [start row, end row]}
+        self._latestAdjFactorDate = manifest['latestAdjFactorDate']
+        self._latestAdjFactors = manifest['latestAdjFactors'] # {code: 数据库里最新的复权因子}
+
+        self._dates = DyStockDataDaysShared._load(path, 'datetime')
+        self._values = {column: DyStockDataDaysShared._load(path, column) for column in self._columns}
+
+    def _load(path, name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+    def _save(path, name, values):
+        np.save(os.path.join(path, name + '.npy'), values)
+
+    def _getLatestAdjFactors(mongoDbEngine, codes, codesDf, endDate):
+        """
+            获取数据库里最新交易日的复权因子，子进程基于数据库最新复权因子前复权时不用再逐个查询
+            @return: latest trade day, {code: adjfactor}
+        """
+        latestTradeDay = mongoDbEngine.getDaysLatestTradeDay()
+        if latestTradeDay is None:
+            return None, {}
+
+        date = latestTradeDay['datetime'].strftime("%Y-%m-%d")
+
+        adjFactors = {}
+        queryCodes = []
+        for code in codes:
+            df = codesDf.get(code)
+
+            # 载入的日线数据覆盖了最新交易日
+            if endDate >= date and df is not None and 'adjfactor' in df:
+                adjFactors[code] = float(df['adjfactor'].values[-1])
+            else:
+                queryCodes.append(code)
+
+        with ThreadPoolExecutor(max_workers=mongoDbEngine.loadThreadNbr) as executor:
+            for code, adjFactor in zip(queryCodes, executor.map(lambda code: mongoDbEngine.getAdjFactor(code, date, codes[code]), queryCodes)):
+                if adjFactor is not None:
+                    adjFactors[code] = adjFactor
+
+        return date, adjFactors
+
+    def create(mongoDbEngine, codes, startDate, endDate, info):
+        """
+            父进程载入[@startDate, @endDate]的原始日线数据并写入临时目录
+            @codes: {code: name}
+            @return: 共享数据的路径，传给子进程@attach。None - 失败
+        """
+        info.print('开始载入{0}只股票(指数,基金)的共享日线数据[{1}, {2}]...'.format(len(codes), startDate, endDate))
+
+        codesDf = mongoDbEngine.getDays(codes, startDate, endDate, DyStockDataCommon.dayIndicators) or {}
+
+        latestAdjFactorDate, latestAdjFactors = DyStockDataDaysShared._getLatestAdjFactors(mongoDbEngine, codes, codesDf, endDate)
+
+        path = tempfile.mkdtemp(prefix='DyStockDaysShared.')
+        try:
+            columns = [x for x in DyStockDataCommon.dayIndicators if any([x in df for df in codesDf.values()])]
+
+            # 所有股票的日线数据按行连续存放，没有数据的股票也要记录，子进程就不会再查询数据库
+            rows = {}
+            dfs = []
+            count = 0
+            for code in codes:
+                df = codesDf.get(code)
+                if df is not None:
+                    df = df.sort_index().reindex(columns=columns)
+                    dfs.append(df)
+
+                size = 0 if df is None else df.shape[0]
+                rows[code] = [count, count + size]
+                count += size
+
+            if dfs:
+                df = pd.concat(dfs)
+                DyStockDataDaysShared._save(path, 'datetime', df.index.values.astype('datetime64[ns]'))
+
+                for column in columns:
+                    DyStockDataDaysShared._save(path, column, df[column].values.astype(np.float64))
+            else:
+                DyStockDataDaysShared._save(path, 'datetime', np.array([], dtype='datetime64[ns]'))
+
+            # manifest最后写入
+            manifest = {'version': DyStockDataDaysShared.version,
+                        'dbName': mongoDbEngine.getStockDaysDbName(),
+                        'startDate': startDate,
+                        'endDate': endDate,
+                        'columns': columns,
+                        'codes': rows,
+                        'latestAdjFactorDate': latestAdjFactorDate,
+                        'latestAdjFactors': latestAdjFactors
+                        }
+
+            with open(os.path.join(path, DyStockDataDaysShared.manifestFileName), 'w') as f:
+                f.write(json.dumps(manifest))
+
+        except Exception as ex:
+            info.print('写入共享日线数据异常: {0}'.format(ex), DyLogData.error)
+            DyStockDataDaysShared.remove(path)
+            return None
+
+        info.print('共享日线数据载入完成: {0}只, {1}行'.format(len(codesDf), count))
+
+        return path
+
+    def attach(path):
+        """
+            子进程打开父进程写入的共享数据
+            @return: DyStockDataDaysShared, None - 失败
+        """
+        if path is None:
+            return None
+
+        try:
+            return DyStockDataDaysShared(path)
+        except Exception as ex:
+            return None
+
+    def remove(path):
+        """
+            父进程删除共享数据
+            @return: bool, False - 删除失败，比如Windows下子进程还在映射，则保留在临时目录
+        """
+        if path is None or not os.path.exists(path):
+            return True
+
+        try:
+            shutil.rmtree(path)
+        except Exception as ex:
+            return False
+
+        return True
+
+    def _getRows(self, dbName, code, startDate, endDate):
+        """ @return: start row, end row, None - 没有覆盖 """
+        if dbName != self._dbName or code not in self._codes:
+            return None
+
+        if not (self._startDate <= startDate and endDate <= self._endDate):
+            return None
+
+        start, end = self._codes[code]
+        dates = self._dates[start:end]
+
+        return start + np.searchsorted(dates, np.datetime64(startDate, 'D'), side='left'), \
+               start + np.searchsorted(dates, np.datetime64(endDate, 'D') + 1, side='left')
+
+    def get(self, dbName, code, startDate, endDate, indicators):
+        """
+            @return: DF，跟DyStockMongoDbEngine.getOneCodeDays格式一致，区间内没有数据则是空DF
+                     None - 没有覆盖
+        """
+        columns = list(indicators)
+        if 'adjfactor' not in columns:
+            columns.append('adjfactor')
+
+        if not set(columns).issubset(self._columns):
+            return None
+
+        rows = self._getRows(dbName, code, startDate, endDate)
+        if rows is None:
+            return None
+
+        start, end = rows
+
+        # 只复制前复权会改写的指标，其他指标直接使用内存映射的只读视图
+        data = {}
+        for column in columns:
+            values = self._values[column][start:end]
+            if np.isnan(values).all(): # 去除全为NaN的列，比如指数数据，没有'mf_vol'
+                continue
+
+            data[column] = np.array(values) if column in self.adjIndicators else values
+
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self._dates[start:end], name='datetime'), columns=list(data), copy=False)
+
+    def getAdjFactor(self, dbName, code, date):
+        """
+            @date: 不晚于@date的最新复权因子
+            @return: None - 没有覆盖
+        """
+        if dbName != self._dbName:
+            return None
+
+        if date == self._latestAdjFactorDate:
+            return self._latestAdjFactors.get(code)
+
+        rows = self._getRows(dbName, code, self._startDate, date) if date >= self._startDate else None
+        if rows is None:
+            return None
+
+        start, end = rows
+        if start == end: # 共享数据的开始日期之前可能有数据
+            return None
+
+        if 'adjfactor' not in self._values:
+            return None
+
+        adjFactor = self._values['adjfactor'][end - 1]
+
+        return None if np.isnan(adjFactor) else float(adjFactor)
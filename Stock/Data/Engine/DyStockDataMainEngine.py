@@ -8,7 +8,7 @@ class DyStockDataMainEngine(object):
     """description of class"""
 
     def __init__(self):
-        self._eventEngine = DyEventEngine(DyStockDataEventHandType.nbr, False)
+        self._eventEngine = DyEventEngine(DyStockDataEventHandType.nbr) # timer用于历史分笔数据请求的重试
         self._info = DyInfo(self._eventEngine)
 
         self._dataEngine = DyStockDataEngine(self._eventEngine, self._info)
@@ -0,0 +1,164 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from DyCommon.DyCommon import *
+
+
+class DyStockDataTicksArchive(object):
+    """
+        个股分笔数据的本地列式存储，用于替代MongoDB的stockTicksDb
+        每只股票一个目录，每个交易日一个文件，文件由定长头和依次排列的列数据块组成:
+            头: magic(4字节), 版本(uint32), Tick数目n(uint64)
+            列: datetime int64[n](ns), price float64[n], volume float64[n], amount float64[n], type int8[n]
+        列数据块定长而不压缩，这样读取时可以直接内存映射
+    """
+    magic = b'DYTK'
+    version = 1
+    headerDtype = np.dtype([('magic', 'S4'), ('version', '<u4'), ('size', '<u8')])
+
+    columns = [('datetime', '<i8'), ('price', '<f8'), ('volume', '<f8'), ('amount', '<f8'), ('type', 'i1')]
+
+    types = ['中性盘', '买盘', '卖盘'] # 买卖类型的编码就是在该列表里的位置，未知类型编码为-1
+    fileSuffix = '.dyt'
+
+
+    def __init__(self, dbName):
+        self._path = DyCommon.createPath('Stock/User/Ticks/' + dbName)
+
+        self._typeCodes = {x: i for i, x in enumerate(self.types)}
+        self._typeNames = np.array(self.types + [None], dtype=object) # -1对应None
+
+    def _getCodePath(self, code):
+        return os.path.join(self._path, code)
+
+    def _getFileName(self, code, date):
+        return os.path.join(self._getCodePath(code), date + self.fileSuffix)
+
+    def getDates(self, code, startDate, endDate):
+        """ 个股在[@startDate, @endDate]之间存在Tick文件的日期，升序 """
+        try:
+            fileNames = os.listdir(self._getCodePath(code))
+        except Exception as ex:
+            return []
+
+        dates = [x[:-len(self.fileSuffix)] for x in fileNames if x.endswith(self.fileSuffix)]
+
+        return sorted([x for x in dates if startDate <= x <= endDate])
+
+    def _read(self, fileName):
+        """
+            内存映射读取一个Tick文件
+            @return: {column: array}
+        """
+        header = np.fromfile(fileName, dtype=self.headerDtype, count=1)
+        if header.shape[0] != 1 or header['magic'][0] != self.magic or header['version'][0] != self.version:
+            raise Exception('{0}: 不是有效的Tick文件'.format(fileName))
+
+        size = int(header['size'][0])
+
+        data = {}
+        offset = self.headerDtype.itemsize
+        for column, dtype in self.columns:
+            dtype = np.dtype(dtype)
+
+            data[column] = np.memmap(fileName, dtype=dtype, mode='r', offset=offset, shape=(size,)) if size > 0 else np.empty(0, dtype=dtype)
+            offset += dtype.itemsize*size
+
+        return data
+
+    def _encode(self, data):
+        """
+            @data: [{indicator: value}], i.e. MongoDB BSON format
+                   或者列式数据{column: array}
+            @return: {column: array}
+        """
+        if isinstance(data, dict):
+            return {'datetime': np.asarray(data['datetime'], dtype='datetime64[ns]').view('<i8'),
+                    'price': np.asarray(data['price'], dtype='<f8'),
+                    'volume': np.asarray(data['volume'], dtype='<f8'),
+                    'amount': np.asarray(data['amount'], dtype='<f8'),
+                    'type': pd.Series(data['type']).map(self._typeCodes).fillna(-1).values.astype('i1')
+                    }
+
+        datetimes = pd.DatetimeIndex([x['datetime'] for x in data])
+
+        return {'datetime': datetimes.values.astype('datetime64[ns]').view('<i8'),
+                'price': np.array([x['price'] for x in data], dtype='<f8'),
+                'volume': np.array([x['volume'] for x in data], dtype='<f8'),
+                'amount': np.array([x['amount'] for x in data], dtype='<f8'),
+                'type': np.array([self._typeCodes.get(x.get('type'), -1) for x in data], dtype='i1')
+                }
+
+    def write(self, code, date, columns):
+        """
+            写入个股一个交易日的Tick数据，已经存在则替换
+            @columns: {column: array}，按datetime升序
+        """
+        fileName = self._getFileName(code, date)
+        tempFileName = '{0}.{1}.tmp'.format(fileName, os.getpid())
+
+        size = columns['datetime'].shape[0]
+
+        header = np.zeros(1, dtype=self.headerDtype)
+        header['magic'] = self.magic
+        header['version'] = self.version
+        header['size'] = size
+
+        os.makedirs(self._getCodePath(code), exist_ok=True)
+
+        try:
+            with open(tempFileName, 'wb') as f:
+                f.write(header.tobytes())
+
+                for column, dtype in self.columns:
+                    f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+
+            os.replace(tempFileName, fileName)
+
+        except Exception as ex:
+            if os.path.exists(tempFileName):
+                os.remove(tempFileName)
+            raise
+
+    def insert(self, code, date, data):
+        """
+            @data: [{indicator: value}], i.e. MongoDB BSON format
+                   或者列式数据{column: array}
+        """
+        columns = self._encode(data)
+
+        # 按时间排序并去重，跟MongoDB的datetime唯一索引保持一致
+        datetimes, index = np.unique(columns['datetime'], return_index=True)
+        if index.shape[0] != datetimes.shape[0] or not np.array_equal(index, np.arange(index.shape[0])):
+            columns = {k: v[index] for k, v in columns.items()}
+
+        self.write(code, date, columns)
+
+    def get(self, code, startDate, endDate):
+        """
+            @return: DF，跟DyStockMongoDbEngine.getTicks格式一致，没有数据则返回None
+        """
+        dates = self.getDates(code, startDate, endDate)
+        if not dates:
+            return None
+
+        blocks = [self._read(self._getFileName(code, date)) for date in dates]
+
+        data = {column: np.concatenate([x[column] for x in blocks]) for column, _ in self.columns}
+        if data['datetime'].shape[0] == 0:
+            return None
+
+        index = pd.DatetimeIndex(data.pop('datetime').view('datetime64[ns]'), name='datetime')
+        data['type'] = self._typeNames[data['type']]
+
+        return pd.DataFrame(data, index=index, columns=[x for x, _ in self.columns[1:]])
+
+    def isExisting(self, code, date):
+        return os.path.exists(self._getFileName(code, date))
+
+    def delete(self, code, date):
+        fileName = self._getFileName(code, date)
+        if os.path.exists(fileName):
+            os.remove(fileName)
@@ -0,0 +1,62 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class DyStockDataTicksDays(Mapping):
+    """
+        按交易日分区的Ticks，用于替代{day: ticks DF}
+        所有交易日的Ticks保存在一个连续的DF里，每个交易日记录开始和结束的位置，所以取某个交易日的Ticks是O(1)的切片，不复制数据
+        跟字典一样使用，比如sorted(ticksDays), ticksDays[day], ticksDays.items()
+        !!!返回的DF是内部DF的视图，不要修改
+    """
+
+    def __init__(self, df):
+        """
+            @df: Ticks DF，index是datetime。不是升序的话，先排序。
+        """
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='mergesort')
+
+        self._df = df
+
+        tickDays = df.index.values.astype('datetime64[D]')
+
+        # 每个交易日在@df里的开始位置，最后一个是总的Tick数目
+        starts = np.flatnonzero(tickDays[1:] != tickDays[:-1]) + 1
+        self._offsets = np.concatenate([[0], starts, [tickDays.shape[0]]]) if tickDays.shape[0] > 0 else np.zeros(1, dtype=int)
+
+        self._days = [str(x) for x in tickDays[self._offsets[:-1]]]
+        self._dayIndex = {day: i for i, day in enumerate(self._days)}
+
+    def __getitem__(self, day):
+        i = self._dayIndex[day]
+
+        return self._df.iloc[self._offsets[i]:self._offsets[i + 1]]
+
+    def __iter__(self):
+        return iter(self._days)
+
+    def __len__(self):
+        return len(self._days)
+
+    def __contains__(self, day):
+        return day in self._dayIndex
+
+    @property
+    def days(self):
+        """ 有Ticks的交易日，升序 """
+        return self._days
+
+    @property
+    def df(self):
+        """ 所有交易日的连续Ticks DF """
+        return self._df
+
+    def getSize(self, day):
+        """ @return: 交易日的Tick数目，不存在返回0 """
+        i = self._dayIndex.get(day)
+        if i is None:
+            return 0
+
+        return int(self._offsets[i + 1] - self._offsets[i])
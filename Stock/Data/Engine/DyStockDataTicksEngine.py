@@ -1,10 +1,15 @@
+from time import monotonic
+
 import numpy as np
 
 from EventEngine.DyEvent import *
 from ..DyStockDataCommon import *
 from .DyStockMongoDbEngine import *
+from .DyStockDataTicksScheduler import DyStockDataTicksScheduler
+from .DyStockDataTicksDays import DyStockDataTicksDays
 from ..Gateway.DyStockDataGateway import *
 from .Common.DyStockDataCommonEngine import *
+from ..Utility.DyStockDataTicksMigration import DyStockDataTicksMigration
 from DyCommon.DyCommon import *
 
 
@@ -15,9 +20,12 @@ class DyStockDataTicksEngine(object):
         !!!由于新浪会有无效历史分笔数据，所以分笔数据的更新依赖日线数据更新。也就是说要先更新日线数据，然后再更新分笔数据。
     """
 
-    batchSize = 10
-    #shiftWindowSize = DyStockDataEventHandType.stockHistTicksHandNbr
-    shiftWindowSize = 1
+    statsInterval = 10 # 秒, 打印下载统计的间隔
+    asyncMaxWindow = 512 # 异步获取时每个数据源窗口的最大值
+
+    retryTimerInterval = 1 # 秒, 检查等待重试请求的时间间隔
+
+    iterDaysChunkSize = 20 # @iterDays每次从数据库载入的交易日数
 
     def __init__(self, eventEngine, daysEngine, mongoDbEngine, gateway, info, registerEvent=True):
         self._eventEngine = eventEngine
@@ -43,6 +51,16 @@ class DyStockDataTicksEngine(object):
         self._totalWindowData = [] # [(code,date)]
         self._windowCursor = 0
 
+        # 自适应的窗口大小，重试退避和下载统计
+        self._scheduler = DyStockDataTicksScheduler()
+        self._lastStatsTime = 0
+
+        # 等待重试的请求，由ticksEngine hand上的timer事件发送，这样调度器只在ticksEngine hand里访问
+        self._retryReqs = [] # [(retry time, code, date)]
+
+        self._asyncFetch = False # 本次更新是否通过DyStockDataTicksAsyncGateway获取
+        self._ticksDataSource = DyStockDataCommon.defaultHistTicksDataSource # 历史分笔数据源设置，每个数据源一个窗口
+
         if registerEvent:
             self._registerEvent()
 
@@ -53,7 +71,7 @@ class DyStockDataTicksEngine(object):
         # init
         self._totalWindowData = codes
 
-        self._increaseWindowSize(self.batchSize)
+        self._increaseWindowSize(self._scheduler.window)
 
     def _increaseWindowSize(self, size=1):
         windowData = self._totalWindowData[self._windowCursor : self._windowCursor + size]
@@ -80,9 +98,53 @@ class DyStockDataTicksEngine(object):
 
             return
 
-        # Note: To get good Gateway throughput, size can be more than 1. factor * @stockHistTicksHandNbr is a good choice.
-        # Note: Don't forget intial number of requests already sent to Gateway.
-        self._increaseWindowSize(self.shiftWindowSize)
+        # 窗口大小由@self._scheduler根据延时和失败率调整，窗口变小时不发送新的请求
+        self._increaseWindowSize(max(self._scheduler.window - self._windowSize, 0))
+
+    def _retryTicksReq(self, code, date):
+        """ 按指数退避重新发送失败的请求，请求仍然占用窗口 """
+        delay = self._scheduler.getRetryDelay(code, date)
+
+        if not self._retryReqs:
+            self._eventEngine.registerTimer(self._retryTimerHandler, DyStockDataEventHandType.ticksEngine, self.retryTimerInterval)
+
+        self._retryReqs.append((monotonic() + delay, code, date))
+
+    def _clearRetryReqs(self):
+        """
+            清除等待重试的请求
+            @return: 清除的请求数
+        """
+        count = len(self._retryReqs)
+        if count > 0:
+            self._retryReqs = []
+            self._eventEngine.unregisterTimer(self._retryTimerHandler, DyStockDataEventHandType.ticksEngine, self.retryTimerInterval)
+
+        return count
+
+    def _retryTimerHandler(self, event):
+        if self._isStopped or not self._retryReqs:
+            return
+
+        now = monotonic()
+
+        dueReqs = [(code, date) for time, code, date in self._retryReqs if time <= now]
+        self._retryReqs = [req for req in self._retryReqs if req[0] > now]
+
+        if not self._retryReqs:
+            self._eventEngine.unregisterTimer(self._retryTimerHandler, DyStockDataEventHandType.ticksEngine, self.retryTimerInterval)
+
+        for code, date in dueReqs:
+            self._sendTicksReq(code, date, self._progress.totalReqCount) # just use @self._progress.totalReqCount as request count
+
+    def _printStats(self, force=False):
+        now = monotonic()
+        if not force and now - self._lastStatsTime < self.statsInterval:
+            return
+
+        self._lastStatsTime = now
+
+        self._info.print('Ticks下载: {0}'.format(self._scheduler.formatStats(self._windowSize)))
 
     def autoUpdateTickData(self):
         pass
@@ -103,6 +165,8 @@ class DyStockDataTicksEngine(object):
         self._info.print('{0}笔Ticks插入到数据库'.format(self._inserted2DbCount))
         self._info.print('由于股票停牌或者没有上市, {0}笔Ticks没有数据'.format(self._noDataCount))
 
+        self._printStats(force=True)
+
     def _updateProgress(self):
         
         self._progress.update()
@@ -151,13 +215,14 @@ class DyStockDataTicksEngine(object):
 
         self._progress.init(len(stockCodes), 100)
 
+        # 所有股票一次批量查询
+        notExistingDates = self._mongoDbEngine.getTicksNotExistingDates(stockCodes, tdays, progress=self._progress)
+        if notExistingDates is None:
+            return None
+
         codes = []
         for code in stockCodes: # Note: Sina doesn't provide indexes history ticks
-            for date in tdays:
-                if not self._mongoDbEngine.isTicksExisting(code, date):
-                    codes.append((code, date))
-
-            self._progress.update()
+            codes.extend([(code, date) for date in notExistingDates[code]])
 
         return codes
 
@@ -178,23 +243,38 @@ class DyStockDataTicksEngine(object):
         stockCodes, tdays = self._loadCommon(startDate, endDate)
         if tdays is None: return None
 
-        # 载入日线数据
+        # 载入日线数据, 只需要日期，所以不需要前复权
         if tdays:
-            if not self._daysEngine.load([startDate, endDate], codes=codes):
+            if not self._daysEngine.load([startDate, endDate], codes=codes, lazyAdj=True):
                 return None
+        else:
+            return []
         
         # get dates of code in days database but not in DB
         self._info.print('开始根据日线数据获取[{0}, {1}]没有Ticks数据的信息...'.format(startDate, endDate))
 
-        self._progress.init(len(stockCodes), 100)
+        # 只查询载入了日线数据的股票，比如指定了@codes，或者停牌的股票
+        codesDaysDates = {}
+        for code in stockCodes: # Note: Sina doesn't provide indexes history ticks
+            dates = self._daysEngine.getExistingDates(code)
+            if dates:
+                codesDaysDates[code] = dates
+
+        self._progress.init(len(codesDaysDates), 100)
 
+        # 每只股票一次聚合查询获取数据库里已有Tick数据的日期
+        codesTicksDates = self._mongoDbEngine.getCodesTicksExistingDates(list(codesDaysDates), tdays[0], tdays[-1], progress=self._progress)
+        if codesTicksDates is None:
+            return None
+
+        # 日线数据里存在，但数据库里没有Tick数据的日期
         codes = []
-        for code in stockCodes: # Note: Sina doesn't provide indexes history ticks
-            for date in tdays:
-                if self._daysEngine.isExisting(code, date) and (not self._mongoDbEngine.isTicksExisting(code, date)):
-                    codes.append((code, date))
+        for code, dates in codesDaysDates.items():
+            dates = dates - codesTicksDates[code]
 
-            self._progress.update()
+            codes.extend([(code, date) for date in sorted(dates)])
+
+        self._info.print('{0}只股票, 共{1}个(股票, 交易日)的Ticks数据需要更新'.format(len(set([code for code, _ in codes])), len(codes)))
 
         return codes
 
@@ -206,27 +286,33 @@ class DyStockDataTicksEngine(object):
         stockCodes, tdays = self._loadCommon(startDate, endDate)
         if tdays is None: return False
 
-        # 载入日线数据
+        # 载入日线数据, 只需要日期，所以不需要前复权
         if tdays:
-            if not self._daysEngine.load([startDate, endDate]):
+            if not self._daysEngine.load([startDate, endDate], lazyAdj=True):
                 return False
 
-        # 获取所有日期
-        dates = DyTime.getDates(startDate, endDate, strFormat=True)
-        
         self._info.print('开始根据日线数据删除[{0}, {1}]不应该存在的Ticks数据...'.format(startDate, endDate))
 
         self._progress.init(len(stockCodes), 100)
 
-        codes = []
-        deleteCount = 0
+        # 每只股票一次聚合查询获取数据库里已有Tick数据的日期
+        codesTicksDates = self._mongoDbEngine.getCodesTicksExistingDates(stockCodes, startDate, endDate, progress=self._progress)
+        if codesTicksDates is None:
+            return False
+
+        # 数据库里有Tick数据，但日线数据里不存在的日期
+        invalidTicks = []
         for code in stockCodes: # Note: Sina doesn't provide indexes history ticks
-            for date in dates:
-                if (not self._daysEngine.isExisting(code, date)) and self._mongoDbEngine.isTicksExisting(code, date):
-                    self._mongoDbEngine._deleteTicks(code, date)
-                    deleteCount += 1
+            dates = codesTicksDates[code] - self._daysEngine.getExistingDates(code)
 
-            self._progress.update()
+            invalidTicks.extend([(code, date) for date in sorted(dates)])
+
+        self._info.print('{0}个(股票, 日期)的Ticks数据不应该存在'.format(len(invalidTicks)))
+
+        deleteCount = 0
+        for code, date in invalidTicks:
+            if self._mongoDbEngine._deleteTicks(code, date):
+                deleteCount += 1
 
         self._info.print('总共删除{0}个无效Ticks数据'.format(deleteCount), DyLogData.ind)
 
@@ -239,10 +325,22 @@ class DyStockDataTicksEngine(object):
         # reset stop flag firstly
         self._isStopped = False
 
+        # 上次更新剩下的重试请求不能计入本次更新
+        self._clearRetryReqs()
+
         # reset counts frislty
         self._inserted2DbCount = 0
         self._noDataCount = 0
 
+        # 更新过程中不切换获取方式
+        self._asyncFetch = DyStockDataCommon.histTicksAsyncFetch and DyStockDataTicksAsyncGateway.aiohttpInstalled
+        if DyStockDataCommon.histTicksAsyncFetch and not self._asyncFetch:
+            self._info.print('没有安装aiohttp, 历史分笔数据不能异步获取', DyLogData.warning)
+
+        self._scheduler = DyStockDataTicksScheduler(self.asyncMaxWindow if self._asyncFetch else None,
+                                                    DyStockDataCommon.getHistTicksDataSources(self._ticksDataSource))
+        self._lastStatsTime = monotonic()
+
         # init progress
         self._initProgress(len(codes))
 
@@ -290,10 +388,19 @@ class DyStockDataTicksEngine(object):
             self._eventEngine.put(DyEvent(DyEventType.finish))
 
     def _sendTicksReq(self, code, date, reqCount):
-        reqHand = reqCount % DyStockDataEventHandType.stockHistTicksHandNbr
+        if self._asyncFetch:
+            event = DyEvent(DyEventType.stockHistTicksAsyncReq)
+        else:
+            reqHand = reqCount % DyStockDataEventHandType.stockHistTicksHandNbr
 
-        event = DyEvent(DyEventType.stockHistTicksReq + str(reqHand))
-        event.data = DyStockHistTicksReqData(code, date)
+            event = DyEvent(DyEventType.stockHistTicksReq + str(reqHand))
+
+        # 发给空闲窗口最大的数据源
+        source = self._scheduler.route()
+
+        event.data = DyStockHistTicksReqData(code, date, source)
+
+        self._scheduler.onSend(code, date, source)
 
         self._eventEngine.put(event)
 
@@ -313,8 +420,11 @@ class DyStockDataTicksEngine(object):
             self._updateWindow() # drain out already sent @stockHistTicksReq events
             return
 
+        self._scheduler.onAck(code, date, event.data.source, data is not None, event.data.errorSources)
+        self._printStats()
+
         if data is None: # set failed to Gateway again
-            self._sendTicksReq(code, date, self._progress.totalReqCount) # just use @self._progress.totalReqCount as request count
+            self._retryTicksReq(code, date)
 
         elif data == DyStockHistTicksAckData.noData: # 股票当日没有数据, think it as success
             if DyStockDataCommon.logDetailsEnabled:
@@ -337,15 +447,85 @@ class DyStockDataTicksEngine(object):
     def _verifyStockHistTicksHandler(self, event):
         self._verifyTicks(event.data['startDate'], event.data['endDate'], event.data['verifyMissing'], event.data['verifyInvalid'])
 
+    def _migrateStockHistTicksHandler(self, event):
+        """
+            迁移MongoDB里的历史分笔数据到本地文件
+            每个事件迁移一只股票，剩下的股票再推送事件，这样迁移过程中可以响应停止请求
+        """
+        data = event.data
+
+        if 'counts' not in data: # new start
+            self._isStopped = False
+
+            codes = self._mongoDbEngine.getTicksDbCodes() if data['codes'] is None else data['codes']
+            if codes is None:
+                self._eventEngine.put(DyEvent(DyEventType.fail))
+                return
+
+            self._info.print('开始迁移{0}只股票(基金)的历史分笔数据到本地文件...'.format(len(codes)), DyLogData.ind)
+
+            self._progress.init(len(codes), 100)
+
+            data['codes'] = codes
+            data['counts'] = {}
+            data['archive'] = DyStockDataTicksArchive(self._mongoDbEngine.getTicksDbName())
+
+        elif self._isStopped:
+            self._eventEngine.put(DyEvent(DyEventType.stopAck))
+            return
+
+        codes, counts = data['codes'], data['counts']
+
+        if not codes: # finish
+            self._info.print('迁移历史分笔数据完成: {0}只股票(基金), {1}个交易日'.format(len(counts), sum(counts.values())), DyLogData.ind)
+            self._eventEngine.put(DyEvent(DyEventType.finish))
+            return
+
+        code = codes[0]
+        try:
+            count = DyStockDataTicksMigration.migrateCode(self._mongoDbEngine, data['archive'], code, data['startDate'], data['endDate'])
+            if count is not None:
+                counts[code] = count
+        except Exception as ex:
+            self._info.print('迁移{0}的历史分笔数据异常: {1}'.format(code, str(ex)), DyLogData.error)
+
+        self._progress.update()
+
+        # send left
+        data['codes'] = codes[1:]
+
+        event = DyEvent(DyEventType.migrateStockHistTicks)
+        event.data = data
+
+        self._eventEngine.put(event)
+
     def _stopReqHandler(self, event):
         self._isStopped = True
 
+        # 等待重试的请求不再发送，同时释放其占用的窗口
+        count = self._clearRetryReqs()
+        if count > 0:
+            self._windowSize -= count
+
+            if self._windowSize == 0: # no any request in flight, send stopAck event
+                self._printCounts()
+
+                self._eventEngine.put(DyEvent(DyEventType.stopAck))
+
+    def _updateHistTicksDataSourceHandler(self, event):
+        self._ticksDataSource = event.data
+
+        self._scheduler.setSources(DyStockDataCommon.getHistTicksDataSources(self._ticksDataSource))
+
     def _registerEvent(self):
         self._eventEngine.register(DyEventType.updateStockHistTicks, self._updateStockHistTicksHandler, DyStockDataEventHandType.ticksEngine)
         self._eventEngine.register(DyEventType.stockHistTicksAck, self._stockHistTicksAckHandler, DyStockDataEventHandType.ticksEngine)
         self._eventEngine.register(DyEventType.stopUpdateStockHistTicksReq, self._stopReqHandler, DyStockDataEventHandType.ticksEngine)
         self._eventEngine.register(DyEventType.verifyStockHistTicks, self._verifyStockHistTicksHandler, DyStockDataEventHandType.ticksEngine)
         self._eventEngine.register(DyEventType.stopVerifyStockHistTicksReq, self._stopReqHandler, DyStockDataEventHandType.ticksEngine)
+        self._eventEngine.register(DyEventType.migrateStockHistTicks, self._migrateStockHistTicksHandler, DyStockDataEventHandType.ticksEngine)
+        self._eventEngine.register(DyEventType.updateHistTicksDataSource, self._updateHistTicksDataSourceHandler, DyStockDataEventHandType.ticksEngine)
+        self._eventEngine.register(DyEventType.stopMigrateStockHistTicksReq, self._stopReqHandler, DyStockDataEventHandType.ticksEngine)
 
     # -------------------- 公共接口 --------------------
     def loadCode(self, code, date):
@@ -381,22 +561,7 @@ class DyStockDataTicksEngine(object):
             latestAdjFactor = self._mongoDbEngine.getAdjFactor(code, datetime.now().strftime("%Y-%m-%d"))
 
             if code in self._codeDaysDf: # 历史复权因子已经载入, 也就是通过@loadCodeN载入Tick数据
-                adjFactor = self._codeDaysDf[code]['adjfactor']
-
-                adjFactorIndex = [date.strftime("%Y-%m-%d") for date in adjFactor.index]
-                adjFactors = adjFactor.values.tolist()
-                
-                # 复权因子扩散到对应的每个Tick
-                adjFactor = []
-                for date, factor in zip(adjFactorIndex, adjFactors):
-                    size = df[date:date].shape[0]
-                    adjFactor.extend(size * [factor])
-
-                    if size == 0:
-                        self._info.print('{0}Tick数据[{1}]缺失'.format(self._daysEngine.stockAllCodesFunds[code], date), DyLogData.warning)
-
-                adjFactor = np.array(adjFactor)
-                adjFactor = adjFactor.reshape((adjFactor.shape[0], 1))
+                adjFactor = self._getTicksAdjFactor(code, df, self._codeDaysDf[code]['adjfactor'])
 
             else: # get this day adjFactor
                 adjFactor = self._mongoDbEngine.getAdjFactor(code, df.index[0].strftime("%Y-%m-%d"))
@@ -406,19 +571,64 @@ class DyStockDataTicksEngine(object):
 
         # process return format
         if not continuous:
-            dfDict = {}
-            if code in self._codeDaysDf: # 历史复权因子已经载入, 也就是通过@loadCodeN载入Tick数据
-                for date in [date.strftime("%Y-%m-%d") for date in self._codeDaysDf[code].index]:
-                    df_ = df[date:date]
-                    if df_.shape[0] > 0:
-                        dfDict[date] = df_
-            else:
-                dfDict[df.index[0].strftime("%Y-%m-%d")] = df
-
-            df = dfDict
+            df = DyStockDataTicksDays(df) # 按交易日分区，跟{day: ticksDF}一样使用
 
         return df
 
+    def _getTicksAdjFactor(self, code, df, adjFactor):
+        """
+            复权因子扩散到对应的每个Tick: 每个Tick映射到它所在交易日在日线数据里的位置
+            @adjFactor: 日线数据的复权因子Series
+            @return: 2-D array(Tick数目 × 1)
+        """
+        days = adjFactor.index.values.astype('datetime64[D]')
+        tickDays = df.index.values.astype('datetime64[D]')
+
+        pos = np.searchsorted(days, tickDays, side='right') - 1
+        pos[pos < 0] = 0
+
+        # 缺失Tick数据的交易日
+        sizes = np.bincount(pos, minlength=days.shape[0]) if pos.shape[0] > 0 else np.zeros(days.shape[0], dtype=int)
+        for i in np.flatnonzero(sizes == 0):
+            self._info.print('{0}Tick数据[{1}]缺失'.format(self._daysEngine.stockAllCodesFunds[code], adjFactor.index[i].strftime("%Y-%m-%d")), DyLogData.warning)
+
+        adjFactor = adjFactor.values[pos]
+
+        return adjFactor.reshape((adjFactor.shape[0], 1))
+
+    def iterDays(self, code, dates, adj=True, chunkSize=None):
+        """
+            按交易日流式获取股票一段日期的Ticks，每次只从数据库载入@chunkSize个交易日，内存占用跟日期的长度无关
+            不改变@loadCodeN载入的Ticks，但会改变日线引擎载入的数据
+            @dates: 跟@loadCodeN一致
+            @adj：是否基于最新的复权因子前复权
+            @chunkSize: None - @iterDaysChunkSize
+            @return: generator of (day, ticks DF)，缺失Tick数据的交易日跳过
+        """
+        if not self._daysEngine.loadCode(code, dates):
+            return
+
+        daysDf = self._daysEngine.getDataFrame(code)
+        chunkSize = chunkSize or self.iterDaysChunkSize
+
+        if adj:
+            latestAdjFactor = self._mongoDbEngine.getAdjFactor(code, datetime.now().strftime("%Y-%m-%d"))
+
+        for i in range(0, daysDf.shape[0], chunkSize):
+            chunkDaysDf = daysDf.iloc[i:i + chunkSize]
+
+            df = self._mongoDbEngine.getTicks(code, chunkDaysDf.index[0].strftime("%Y-%m-%d"), chunkDaysDf.index[-1].strftime("%Y-%m-%d"))
+            if df is None:
+                continue
+
+            if adj:
+                adjFactor = self._getTicksAdjFactor(code, df, chunkDaysDf['adjfactor'])
+
+                df[['price']] = df[['price']]*(adjFactor / latestAdjFactor)
+                df[['volume']] = df[['volume']]*(latestAdjFactor / adjFactor)
+
+            yield from DyStockDataTicksDays(df).items()
+
     def loadCodeN(self, code, dates):
         """
             载入指定股票的一段连续日期的Ticks
@@ -0,0 +1,175 @@
+from time import monotonic
+
+
+class DyStockDataTicksScheduler(object):
+    """
+        历史分笔数据下载的自适应并发窗口(AIMD)，每个数据源一个窗口
+        请求成功并且延时低于目标值，窗口加性增加(每个窗口的请求加1)；请求失败或者延时过高，窗口乘性减小
+        第一次减小之前是慢启动，每个成功的请求窗口加1，这样异步获取时窗口可以很快增加到几百
+        新的请求发给空闲窗口最大的数据源，所以一个数据源的失败或者高延时不会减小其他数据源的窗口
+        失败的请求按指数退避重试
+        同时统计每个数据源的请求数，失败率和平均延时
+    """
+    initWindow = 10
+    minWindow = 1
+    maxWindow = 64
+
+    latencyTarget = 10 # 秒, 从发送请求到收到Ack，包含在Gateway hand队列里的等待时间
+    decreaseFactor = 0.5 # 乘性减小的因子
+
+    retryBaseDelay = 1 # 秒, 第一次重试的延时
+    retryMaxDelay = 60 # 秒
+
+    latencyAlpha = 0.2 # 延时指数移动平均的系数
+
+
+    def __init__(self, maxWindow=None, sources=None):
+        """
+            @maxWindow: 每个数据源窗口的最大值，None - 使用类的@maxWindow
+            @sources: [数据源名字]，按优先级。None - 不区分数据源
+        """
+        self._maxWindow = maxWindow or self.maxWindow
+
+        # 每个数据源的窗口，跟@_sourceStats一样以数据源名字为键
+        self._windows = {} # {source: window}
+        self._slowStarts = {} # {source: bool}
+        self._inFlights = {} # {source: 在途请求数}
+        self._sources = [] # 当前路由的数据源
+        self.setSources(sources)
+
+        self._sendTimes = {} # {(code, date): (send time, routed source)}
+        self._retries = {} # {(code, date): retry count}
+
+        self._startTime = monotonic()
+        self._ackCount = 0
+        self._sourceStats = {} # {source: {'count':, 'errors':, 'latency':}}
+
+    def _getSourceStats(self, source):
+        stats = self._sourceStats.get(source)
+        if stats is None:
+            stats = {'count': 0, 'errors': 0, 'latency': None}
+            self._sourceStats[source] = stats
+
+        return stats
+
+    def setSources(self, sources):
+        """ 历史分笔数据源改变时调用，已有数据源的窗口保持不变 """
+        self._sources = list(sources or [None])
+
+        for source in self._sources:
+            if source not in self._windows:
+                self._windows[source] = float(self.initWindow)
+                self._slowStarts[source] = True
+                self._inFlights[source] = 0
+
+    def _getWindow(self, source):
+        return max(self.minWindow, int(self._windows[source]))
+
+    @property
+    def window(self):
+        """ 当前允许的在途请求数，也就是所有数据源的窗口之和 """
+        return sum([self._getWindow(source) for source in self._sources])
+
+    def route(self):
+        """
+            新的请求应该发给的数据源，也就是空闲窗口最大的数据源，相等时按优先级
+            @return: 数据源名字
+        """
+        return max(self._sources, key=lambda source: self._getWindow(source) - self._inFlights[source])
+
+    def onSend(self, code, date, source=None):
+        """ @source: @route返回的数据源 """
+        if source not in self._windows:
+            source = self._sources[0]
+
+        self._sendTimes[(code, date)] = (monotonic(), source)
+        self._inFlights[source] += 1
+
+    def onAck(self, code, date, source, ok, errorSources=None):
+        """
+            @source: 最后一个获取的数据源名字
+            @ok: False - 数据源获取失败，需要重试
+            @errorSources: 获取失败的数据源，None - 只知道@ok
+        """
+        sendTime = self._sendTimes.pop((code, date), None)
+        if sendTime is None: # 不是对应请求的Ack，比如插入数据库失败后模拟的Ack
+            return
+
+        sendTime, routedSource = sendTime
+        self._inFlights[routedSource] -= 1
+
+        latency = monotonic() - sendTime
+
+        self._ackCount += 1
+
+        # stats
+        stats = self._getSourceStats(source)
+        stats['count'] += 1
+        if not ok:
+            stats['errors'] += 1
+
+        stats['latency'] = latency if stats['latency'] is None else (1 - self.latencyAlpha)*stats['latency'] + self.latencyAlpha*latency
+
+        # 换数据源之前失败的数据源
+        for errorSource in (errorSources or []):
+            if errorSource != source:
+                stats = self._getSourceStats(errorSource)
+                stats['count'] += 1
+                stats['errors'] += 1
+
+        # AIMD, 只调整请求发给的数据源的窗口
+        if errorSources is None:
+            routedOk = ok
+        else:
+            routedOk = routedSource not in errorSources
+
+        window = self._windows[routedSource]
+        if routedOk and latency <= self.latencyTarget:
+            self._windows[routedSource] = min(self._maxWindow, window + (1 if self._slowStarts[routedSource] else 1/window))
+        else:
+            self._windows[routedSource] = max(self.minWindow, window*self.decreaseFactor)
+            self._slowStarts[routedSource] = False
+
+        if ok:
+            self._retries.pop((code, date), None)
+
+    def getRetryDelay(self, code, date):
+        """ 失败请求的重试延时，按指数退避 """
+        retries = self._retries.get((code, date), 0) + 1
+        self._retries[(code, date)] = retries
+
+        return min(self.retryMaxDelay, self.retryBaseDelay*2**(retries - 1))
+
+    def getStats(self, inFlight):
+        """
+            @inFlight: 当前在途请求数
+            @return: {'inFlight':, 'window':, 'reqPerSec':, 'errorRate':, 'sources': {source: {'count':, 'errorRate':, 'latency':, 'window':}}}
+        """
+        seconds = monotonic() - self._startTime
+
+        count = sum([x['count'] for x in self._sourceStats.values()])
+        errors = sum([x['errors'] for x in self._sourceStats.values()])
+
+        sources = {}
+        for source, stats in self._sourceStats.items():
+            sources[source] = {'count': stats['count'],
+                               'errorRate': stats['errors']/stats['count'] if stats['count'] > 0 else 0,
+                               'latency': stats['latency'],
+                               'window': self._getWindow(source) if source in self._windows else None
+                               }
+
+        return {'inFlight': inFlight,
+                'window': self.window,
+                'reqPerSec': self._ackCount/seconds if seconds > 0 else 0,
+                'errorRate': errors/count if count > 0 else 0,
+                'sources': sources
+                }
+
+    def formatStats(self, inFlight):
+        stats = self.getStats(inFlight)
+
+        sources = ', '.join(['{0}: 窗口{1}, {2}笔, 失败率{3:.1%}, 延时{4}s'.format(source, '-' if x['window'] is None else x['window'], x['count'], x['errorRate'],
+                                                                             '-' if x['latency'] is None else round(x['latency'], 2))
+                             for source, x in stats['sources'].items()])
+
+        return '在途请求{0}, 窗口{1}, {2:.2f}请求/秒, 失败率{3:.1%}; {4}'.format(stats['inFlight'], stats['window'], stats['reqPerSec'], stats['errorRate'], sources)
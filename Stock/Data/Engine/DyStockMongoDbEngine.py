@@ -1,9 +1,16 @@
+import threading
+from collections import OrderedDict
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+
 import pymongo
+import numpy as np
 import pandas as pd
-from time import sleep
 
 from DyCommon.DyCommon import *
 from ...Common.DyStockCommon import *
+from .DyStockDataDaysCache import DyStockDataDaysCache
+from .DyStockDataTicksArchive import DyStockDataTicksArchive
 
 
 class DyStockMongoDbEngine(object):
@@ -11,11 +18,14 @@ class DyStockMongoDbEngine(object):
     port = 27017
 
     stockTicksDb = 'stockTicksDb' # 股票分笔数据
+    ticksArchiveEnabled = False # 分笔数据是否存储在本地列式文件(@DyStockDataTicksArchive)而不是MongoDB
 
     # default DB for Wind Data Source
     stockCommonDb = 'stockCommonDb'
     tradeDayTableName = "tradeDayTable"
     codeTableName = "codeTable"
+    daysMetaTableName = "daysMetaTable" # 每只股票日线数据每个指标的最新日期(high-water mark)，用于增量更新
+    daysUpdateStateKey = '__update__' # 日线元数据表里保存最近一次增量更新状态的键值
 
     stockDaysDb = 'stockDaysDb' # 股票日线行情数据
 
@@ -23,6 +33,7 @@ class DyStockMongoDbEngine(object):
     stockCommonDbTuShare = 'stockCommonDbTuShare'
     tradeDayTableNameTuShare = "tradeDayTableTuShare"
     codeTableNameTuShare = "codeTableTuShare"
+    daysMetaTableNameTuShare = "daysMetaTableTuShare"
 
     stockDaysDbTuShare = 'stockDaysDbTuShare' # 股票日线行情数据
     
@@ -33,12 +44,31 @@ class DyStockMongoDbEngine(object):
                        DyStockCommon.zz500Index: 'zz500CodeTableDb'
                        }
 
+    bulkWriteBatchSize = 1000 # 批量写入MongoDB时，每批UpdateOne请求的最大数目
+    loadThreadNbr = 8 # 并发载入多只股票日线数据的线程数，共享同一个MongoClient
+    cursorBatchSize = 5000 # 日线和Tick游标每次从MongoDB取回的文档数
+
+    ticksColumns = ['datetime', 'price', 'volume', 'amount', 'type'] # !!!实盘回测引擎将会使用列的次序，所以不要更改
+
+    _tradeDayCalendars = {} # 内存交易日表, {collection full name: calendar}
+
+    daysCacheEnabled = False # 是否使用日线数据的本地列式缓存
+    _daysCaches = {} # {db name: DyStockDataDaysCache}
+    daysShared = None # 父进程载入的共享日线数据(DyStockDataDaysShared)，由回测和回归的子进程设置
+    _ticksArchives = {} # {db name: DyStockDataTicksArchive}
+
+    codeDaysIndexSize = 1000 # 内存里最多缓存多少只股票的日线日期索引(LRU)，0则不使用缓存，每次从MongoDB查询
+    _codeDaysIndexes = OrderedDict() # {(db name, code): datetime64[D] array}
+    _codeDaysIndexesLock = threading.Lock()
+
     
     def __init__(self, info):
         self._info = info
 
         self._client = pymongo.MongoClient(self.host, self.port)
 
+        self._updateCounts = {} # 最近一次批量写入的计数, {code: [inserted, modified, failed]}
+
     def _getTradeDayTableCollection(self):
         if 'Wind' in DyStockCommon.defaultHistDaysDataSource:
             collection = self._client[self.stockCommonDb][self.tradeDayTableName]
@@ -55,6 +85,14 @@ class DyStockMongoDbEngine(object):
 
         return collection
 
+    def _getDaysMetaCollection(self):
+        if 'Wind' in DyStockCommon.defaultHistDaysDataSource:
+            collection = self._client[self.stockCommonDb][self.daysMetaTableName]
+        else:
+            collection = self._client[self.stockCommonDbTuShare][self.daysMetaTableNameTuShare]
+
+        return collection
+
     def _getStockDaysDb(self):
         if 'Wind' in DyStockCommon.defaultHistDaysDataSource:
             db = self._client[self.stockDaysDb]
@@ -63,7 +101,27 @@ class DyStockMongoDbEngine(object):
 
         return db
 
+    def getStockDaysDbName(self):
+        return self._getStockDaysDb().name
+
+    def _getTicksArchive(self):
+        archive = self._ticksArchives.get(self.stockTicksDb)
+        if archive is None:
+            archive = DyStockDataTicksArchive(self.stockTicksDb)
+            self._ticksArchives[self.stockTicksDb] = archive
+
+        return archive
+
     def _deleteTicks(self, code, date):
+        if self.ticksArchiveEnabled:
+            try:
+                self._getTicksArchive().delete(code, date)
+            except Exception as ex:
+                self._info.print("删除本地Tick数据[{0},{1}]异常:{2}".format(code, date, str(ex)), DyLogData.error)
+                return False
+
+            return True
+
         collection = self._client[self.stockTicksDb][code]
 
         dateStart = datetime.strptime(date, '%Y-%m-%d')
@@ -81,7 +139,48 @@ class DyStockMongoDbEngine(object):
 
         return True
 
-    def _findTicks(self, code, startDate, endDate):
+    def getTicksDbName(self):
+        return self.stockTicksDb
+
+    def getTicksDbCodes(self):
+        """
+            MongoDB分笔数据库里所有股票的代码，不管分笔数据是否存储在本地文件
+            @return: sorted [code], None - 数据库异常
+        """
+        try:
+            return sorted(self._client[self.stockTicksDb].collection_names(include_system_collections=False))
+        except Exception as ex:
+            self._info.print("MongoDB 异常({0}): 获取分笔数据库的股票代码".format(str(ex) + ', ' + str(getattr(ex, 'details', None))),
+                             DyLogData.error)
+            return None
+
+    def findTicksDb(self, code, startDate=None, endDate=None):
+        """
+            MongoDB里个股的分笔数据，按时间升序，不管分笔数据是否存储在本地文件。主要用于迁移分笔数据。
+            @startDate, @endDate: None - 不限制
+            @return: cursor of {column: value}, 列是@ticksColumns. None - 数据库异常
+        """
+        collection = self._client[self.stockTicksDb][code]
+
+        flt = {}
+        if startDate is not None:
+            flt.setdefault('datetime', {})['$gt'] = datetime.strptime(startDate, '%Y-%m-%d')
+        if endDate is not None:
+            flt.setdefault('datetime', {})['$lt'] = datetime.strptime(endDate + ' 23:00:00', '%Y-%m-%d %H:%M:%S')
+
+        projection = {x: True for x in self.ticksColumns}
+        projection['_id'] = False
+
+        try:
+            cursor = collection.find(flt, projection).sort('datetime', pymongo.ASCENDING).batch_size(self.cursorBatchSize)
+        except Exception as ex:
+            self._info.print("MongoDB 异常({0}): 获取{1}的分笔数据".format(str(ex) + ', ' + str(getattr(ex, 'details', None)), code),
+                             DyLogData.error)
+            return None
+
+        return cursor
+
+    def _findTicks(self, code, startDate, endDate, projection=None):
         collection = self._client[self.stockTicksDb][code]
 
         dateStart = datetime.strptime(startDate, '%Y-%m-%d')
@@ -91,7 +190,7 @@ class DyStockMongoDbEngine(object):
                         '$lt':dateEnd}}
 
         try:
-            cursor = collection.find(flt)
+            cursor = collection.find(flt, projection).batch_size(self.cursorBatchSize)
         except Exception as ex:
             self._info.print("MongoDB Exception({0}): find ticks for {1} at {2}".format(str(ex) + ', ' + str(ex.details), code, date),
                              DyLogData.error)
@@ -120,92 +219,101 @@ class DyStockMongoDbEngine(object):
 
         return cursor
         
-    def _getTradeDaysByRelativeNegative(self, baseDate, n):
-        
-        baseDateSave = baseDate
-        nSave = n
+    def _loadTradeDayCalendar(self, collection):
+        """ 从数据库载入整张交易日表，数据库异常会抛出 """
+        cursor = collection.find(None, {'_id': False, 'datetime': True, 'tradeDay': True}).sort('datetime', pymongo.ASCENDING)
 
-        # always get 0 offset trade day
-        baseDate = self._getTradeDaysByRelativeZero(baseDate)
-        if baseDate is None: return None
-
-        # find forward n trade days
+        datetimes, tradeDayMask = [], []
+        for d in cursor:
+            datetimes.append(d['datetime'])
+            tradeDayMask.append(d['tradeDay'])
+
+        dates = np.array(datetimes, dtype='datetime64[D]')
+        tradeDayMask = np.array(tradeDayMask, dtype=bool)
+
+        return {'datetimes': datetimes, # [datetime], 升序
+                'dates': dates, # 所有日期, datetime64[D]
+                'tradeDayIndexes': np.flatnonzero(tradeDayMask), # 交易日在@dates里的位置
+                'tradeDays': dates[tradeDayMask] # 所有交易日, datetime64[D]
+                }
+
+    def _getTradeDayCalendar(self, raiseException=False):
+        """ 获取内存里的交易日表，第一次使用时从数据库载入，@updateTradeDays时失效
+            交易日表在同一进程的所有实例间共享
+            @return: {'datetimes':, 'dates':, 'tradeDayIndexes':, 'tradeDays':}
+        """
         collection = self._getTradeDayTableCollection()
 
-        flt = {'datetime':{'$lt':baseDate[0]['datetime']}}
+        calendar = self._tradeDayCalendars.get(collection.full_name)
+        if calendar is None:
+            try:
+                calendar = self._loadTradeDayCalendar(collection)
+            except Exception as ex:
+                if raiseException:
+                    raise
 
-        try:
-            cursor = collection.find(flt).sort('datetime', pymongo.DESCENDING)
-        except Exception as ex:
-            self._info.print("MongoDB Exception({0}): @_getTradeDaysByRelativeNegative({1}, {2})".format(str(ex) + ', ' + str(ex.details), baseDateSave, nSave),
-                             DyLogData.error)
-            return None
+                self._info.print("MongoDB Exception({0}): 载入交易日表".format(str(ex) + ', ' + str(getattr(ex, 'details', None))),
+                                 DyLogData.error)
+                return None
 
-        dates = [baseDate[0]]
-        for d in cursor:
-            if d['tradeDay']:
-                dates.append(d)
+            self._tradeDayCalendars[collection.full_name] = calendar
 
-                n += 1
-                if n == 0:
-                    return dates
+        return calendar
 
-        self._info.print("数据库里没有{0}向前{1}个交易日的日期数据".format(baseDateSave, abs(nSave)),
-                             DyLogData.error)
-        return None
+    def _invalidateTradeDayCalendar(self):
+        self._tradeDayCalendars.pop(self._getTradeDayTableCollection().full_name, None)
 
-    def _getTradeDaysByRelativeZero(self, baseDate):
-        """ 基准日期向前找到第一个交易日 """
+    def _getTradeDayDoc(self, calendar, i):
+        """ @i: 交易日在@calendar['tradeDays']里的位置 """
+        return {'datetime': calendar['datetimes'][calendar['tradeDayIndexes'][i]], 'tradeDay': True}
 
-        baseDateSave = baseDate
+    def _getTradeDayPosition(self, calendar, baseDate):
+        """ 基准日期向前找到第一个交易日在交易日数组里的位置，没有则返回-1 """
+        return np.searchsorted(calendar['tradeDays'], np.datetime64(baseDate, 'D'), side='right') - 1
 
-        collection = self._getTradeDayTableCollection()
+    def _getTradeDaysByRelativeNegative(self, baseDate, n):
+        
+        calendar = self._getTradeDayCalendar()
+        if calendar is None: return None
 
-        baseDate = datetime.strptime(baseDate, '%Y-%m-%d')
-        flt = {'datetime':{'$lte':baseDate}}
+        # always get 0 offset trade day
+        pos = self._getTradeDayPosition(calendar, baseDate)
+        if pos < 0: return None
 
-        try:
-            cursor = collection.find(flt).sort('datetime', pymongo.DESCENDING)
-        except Exception as ex:
-            self._info.print("MongoDB Exception({0}): @_getTradeDaysByRelativeZero({1})".format(str(ex) + ', ' + str(ex.details), baseDateSave),
-                             DyLogData.error)
+        # find forward n trade days
+        if pos + n < 0:
+            self._info.print("数据库里没有{0}向前{1}个交易日的日期数据".format(baseDate, abs(n)),
+                                 DyLogData.error)
             return None
 
-        for d in cursor:
-            if d['tradeDay']:
-                return [d]
+        return [self._getTradeDayDoc(calendar, i) for i in range(pos, pos + n - 1, -1)]
 
-        return None
+    def _getTradeDaysByRelativeZero(self, baseDate):
+        """ 基准日期向前找到第一个交易日 """
 
-    def _getTradeDaysByRelativePositive(self, baseDate, n):
+        calendar = self._getTradeDayCalendar()
+        if calendar is None: return None
 
-        baseDateSave = baseDate
-        nSave = n
+        pos = self._getTradeDayPosition(calendar, baseDate)
+        if pos < 0: return None
 
-        # always get 0 offset trade day
-        baseDate = self._getTradeDaysByRelativeZero(baseDate)
-        if baseDate is None: return None
+        return [self._getTradeDayDoc(calendar, pos)]
 
-        # find backward n trade days
-        collection = self._getTradeDayTableCollection()
+    def _getTradeDaysByRelativePositive(self, baseDate, n):
 
-        flt = {'datetime': {'$gt': baseDate[0]['datetime']}}
+        calendar = self._getTradeDayCalendar()
+        if calendar is None: return None
 
-        try:
-            cursor = collection.find(flt).sort('datetime', pymongo.ASCENDING)
-        except Exception as ex:
-            self._info.print("MongoDB Exception({0}): @_getTradeDaysByRelativePositive({1}, {2})".format(str(ex) + ', ' + str(ex.details), baseDateSave, nSave),
-                             DyLogData.error)
-            return None
+        # always get 0 offset trade day
+        pos = self._getTradeDayPosition(calendar, baseDate)
+        if pos < 0: return None
 
-        dates = [baseDate[0]]
-        for d in cursor:
-            if d['tradeDay']:
-                dates.append(d)
+        # find backward n trade days
+        endPos = min(pos + n, len(calendar['tradeDays']) - 1)
 
-                n -= 1
-                if n == 0:
-                    return dates
+        dates = [self._getTradeDayDoc(calendar, i) for i in range(pos, endPos + 1)]
+        if endPos == pos + n:
+            return dates
 
         # 如果数据库里的最新日期不是今日，提醒更新数据, 并返回None
         date = self.getDaysLatestDate()
@@ -218,7 +326,15 @@ class DyStockMongoDbEngine(object):
 
         return dates
 
-    def _findOneCodeDays(self, code, startDate, endDate, name=None):
+    def _getDaysProjection(self, indicators):
+        """ 只从MongoDB取回需要的指标，'datetime'和'adjfactor'总是包含 """
+        projection = {'_id': False, 'datetime': True, 'adjfactor': True}
+        for indicator in indicators:
+            projection[indicator] = True
+
+        return projection
+
+    def _findOneCodeDays(self, code, startDate, endDate, name=None, projection=None):
         collection = self._getStockDaysDb()[code]
 
         dateStart = datetime.strptime(startDate, '%Y-%m-%d')
@@ -228,7 +344,7 @@ class DyStockMongoDbEngine(object):
                            '$lt':dateEnd}}
 
         try:
-            cursor = collection.find(flt)
+            cursor = collection.find(flt, projection).batch_size(self.cursorBatchSize)
         except Exception as ex:
             self._info.print("MongoDB Exception({0}): 查找{1}:{2}, [{3}, {4}]日线数据".format(str(ex) + ', ' + str(ex.details),
                                                                                         code, name,
@@ -261,7 +377,126 @@ class DyStockMongoDbEngine(object):
         
         return None 
 
-    def _findOneCodeDaysByRelative(self, code, baseDate, n=0, name=None):
+    def _getDaysCache(self):
+        dbName = self._getStockDaysDb().name
+
+        cache = self._daysCaches.get(dbName)
+        if cache is None:
+            cache = DyStockDataDaysCache(dbName)
+            self._daysCaches[dbName] = cache
+
+        return cache
+
+    def _getOneCodeDaysByCache(self, code, startDate, endDate, indicators, name=None):
+        """
+            先从本地缓存获取个股日线数据，缓存没有覆盖则从MongoDB载入并跟已有缓存的日期范围合并后写入缓存
+            @return: DF, None - 缓存失败
+        """
+        cache = self._getDaysCache()
+
+        df = cache.get(code, startDate, endDate, indicators, lambda date: self._getDaysCacheAdjFactor(code, date, name))
+        if df is not None:
+            return df
+
+        # 缓存没有命中，载入全部指标
+        startDateNew, endDateNew = cache.getUnionDates(code, startDate, endDate)
+
+        cursor = self._findOneCodeDays(code, startDateNew, endDateNew, name)
+        if cursor is None: return None
+
+        try:
+            fullDf = pd.DataFrame(list(cursor))
+            if not fullDf.empty:
+                del fullDf['_id']
+                fullDf = fullDf.set_index('datetime')
+            else:
+                fullDf = None
+        except Exception as ex:
+            return None
+
+        if not cache.put(code, startDateNew, endDateNew, fullDf):
+            self._info.print("写入{0}:{1}日线数据本地缓存失败".format(code, name), DyLogData.warning)
+            return None
+
+        return cache.get(code, startDate, endDate, indicators)
+
+    def _getDaysCacheAdjFactor(self, code, date, name=None):
+        """
+            获取数据库里个股@date的复权因子，用于校验本地缓存的复权因子版本
+            @return: adjfactor, None - 不存在或者数据库异常
+        """
+        collection = self._getStockDaysDb()[code]
+
+        try:
+            dateStart = datetime.strptime(date, '%Y-%m-%d')
+            doc = collection.find_one({'datetime': {'$gte': dateStart, '$lt': dateStart + timedelta(days=1)}}, {'_id': False, 'adjfactor': True})
+        except Exception as ex:
+            self._info.print("MongoDB 异常({0}): 获取{1}:{2}, {3}复权因子".format(str(ex) + ', ' + str(getattr(ex, 'details', None)),
+                                                                                code, name,
+                                                                                date),
+                             DyLogData.error)
+            return None
+
+        if doc is None:
+            return None
+
+        return doc.get('adjfactor')
+
+    def _getCodeDaysIndex(self, code, name=None):
+        """ 获取个股在数据库里所有日线数据的日期，升序
+            按股票数目LRU缓存，@updateDays时失效
+            @return: datetime64[D] array
+        """
+        key = (self._getStockDaysDb().name, code)
+
+        with self._codeDaysIndexesLock:
+            dates = self._codeDaysIndexes.get(key)
+            if dates is not None:
+                self._codeDaysIndexes.move_to_end(key)
+                return dates
+
+        collection = self._getStockDaysDb()[code]
+
+        try:
+            cursor = collection.find(None, {'_id': False, 'datetime': True}).sort('datetime', pymongo.ASCENDING)
+            dates = np.array([d['datetime'] for d in cursor], dtype='datetime64[D]')
+        except Exception as ex:
+            self._info.print("MongoDB Exception({0}): @_getCodeDaysIndex{1}:{2}".format(str(ex) + ', ' + str(getattr(ex, 'details', None)),
+                                                                                      code, name),
+                             DyLogData.error)
+            return None
+
+        with self._codeDaysIndexesLock:
+            self._codeDaysIndexes[key] = dates
+
+            while len(self._codeDaysIndexes) > self.codeDaysIndexSize:
+                self._codeDaysIndexes.popitem(last=False)
+
+        return dates
+
+    def _invalidateCodeDaysIndex(self, code):
+        with self._codeDaysIndexesLock:
+            self._codeDaysIndexes.pop((self._getStockDaysDb().name, code), None)
+
+    def _getCodeDaysPositionsByRelative(self, code, baseDate, n=0, name=None):
+        """
+            基于个股日线日期索引的相对偏移，包含当日
+            @return: dates, [start position, end position], 不考虑是否取到了@n个交易日
+                     None - 错误或者没有当日
+        """
+        dates = self._getCodeDaysIndex(code, name)
+        if dates is None: return None
+
+        # 获取当日位置, 向前贪婪
+        pos = np.searchsorted(dates, np.datetime64(baseDate, 'D'), side='right') - 1
+        if pos < 0: return None
+
+        if n <= 0:
+            return dates, [max(pos + n, 0), pos]
+
+        return dates, [pos, min(pos + n, dates.size - 1)]
+
+    def _findOneCodeDaysByRelative(self, code, baseDate, n=0, name=None, projection=None):
         """
             包含当日，也就是说offset 0总是被包含的
         """
@@ -286,7 +521,7 @@ class DyStockMongoDbEngine(object):
         n = abs(n) + 1
 
         try:
-            cursor = collection.find(flt).sort('datetime', sortMode).limit(n)
+            cursor = collection.find(flt, projection).sort('datetime', sortMode).limit(n)
         except Exception as ex:
             self._info.print("MongoDB Exception({0}): @_findOneCodeDaysByRelative{1}:{2}, [{3}, {4}]日线数据".format(str(ex) + ', ' + str(ex.details),
                                                                                                                     code, name,
@@ -299,15 +534,32 @@ class DyStockMongoDbEngine(object):
         
         return cursor 
 
+    def _getColumnsByCursor(self, cursor, columns):
+        """ 按列累积游标的文档，避免先生成[dict]再由pandas逐行解析
+            文档里缺失的指标用NaN填充
+            @return: {column: [value]}
+        """
+        data = {column: [] for column in columns}
+        appends = [(column, data[column].append) for column in columns]
+
+        nan = float('nan')
+        for doc in cursor:
+            for column, append in appends:
+                append(doc.get(column, nan))
+
+        return data
+
     def _getOneCodeDaysByCursor(self, cursor, indicators):
         try:
             columns = indicators + ['datetime']
             if 'adjfactor' not in columns:
                 columns.append('adjfactor')
 
-            df = pd.DataFrame(list(cursor), columns=columns)
+            data = self._getColumnsByCursor(cursor, columns)
+            index = pd.DatetimeIndex(data.pop('datetime'), name='datetime')
+
+            df = pd.DataFrame(data, index=index, columns=[x for x in columns if x != 'datetime'])
             df = df.dropna(axis=1, how='all') # 去除全为NaN的列，比如指数数据，没有'mf_vol'
-            df = df.set_index('datetime')
 
         except Exception as ex:
             return None
@@ -346,11 +598,80 @@ class DyStockMongoDbEngine(object):
 
     def _getOneCodeDaysByRelative(self, code, indicators, baseDate, n=0, name=None):
 
-        cursor = self._findOneCodeDaysByRelative(code, baseDate, n, name)
+        if self.codeDaysIndexSize > 0:
+            # 相对日期转成绝对日期
+            ret = self._getCodeDaysPositionsByRelative(code, baseDate, n, name)
+            if ret is None: return None
+
+            dates, (start, end) = ret
+
+            return self.getOneCodeDays(code, np.datetime_as_string(dates[start]), np.datetime_as_string(dates[end]), indicators, name)
+
+        cursor = self._findOneCodeDaysByRelative(code, baseDate, n, name, self._getDaysProjection(indicators))
         if cursor is None: return None
 
         return self._getOneCodeDaysByCursor(cursor, indicators)
 
+    def _bulkUpsert(self, collection, requests, key):
+        """ 以无序方式分批写入MongoDB，每批最多@bulkWriteBatchSize个请求
+            @requests: [pymongo.UpdateOne]
+            @key: 计数的键值，一般是股票代码
+            @return: [inserted, modified, failed]
+            数据库连接等非写入错误会抛出异常，由调用者处理
+        """
+        counts = [0, 0, 0]
+        self._updateCounts[key] = counts
+
+        batchSize = max(self.bulkWriteBatchSize, 1)
+        for i in range(0, len(requests), batchSize):
+            try:
+                result = collection.bulk_write(requests[i:i + batchSize], ordered=False)
+            except pymongo.errors.BulkWriteError as ex:
+                # 无序写入时，出错的文档不影响同批其他文档的写入
+                counts[0] += ex.details.get('nUpserted', 0)
+                counts[1] += ex.details.get('nModified', 0)
+                counts[2] += len(ex.details.get('writeErrors', []))
+            else:
+                counts[0] += result.upserted_count
+                counts[1] += result.modified_count
+
+        return counts
+
+    def _createIndex(self, collection, key):
+        try:
+            collection.index_information()
+        except Exception as ex: # collection or database not existing
+            collection.create_index([(key, pymongo.ASCENDING)], unique=True)
+
+    def _updateDaysMeta(self, code, data):
+        """
+            根据写入数据库的日线数据，更新股票每个指标的最新日期。最新日期只会往后推。
+            @data: [{row0}, {row1}]
+        """
+        latest = {}
+        for doc in data:
+            for indicator, value in doc.items():
+                if indicator in ['datetime', '_id'] or value is None or value != value: # NaN
+                    continue
+
+                key = 'latest.' + indicator
+                if key not in latest or doc['datetime'] > latest[key]:
+                    latest[key] = doc['datetime']
+
+        if not latest:
+            return
+
+        collection = self._getDaysMetaCollection()
+
+        # create index
+        self._createIndex(collection, 'code')
+
+        try:
+            collection.update_one({'code': code}, {'$max': latest}, upsert=True)
+        except Exception as ex:
+            # 元数据落后于日线数据只会导致下次增量更新时重复获取
+            self._info.print("更新{0}日线元数据到MongoDB异常:{1}".format(code, str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.warning)
+
 
     # -------------------- 公共接口 --------------------
     def updateDays(self, code, data):
@@ -358,39 +679,126 @@ class DyStockMongoDbEngine(object):
         collection = self._getStockDaysDb()[code]
 
         # create index
-        try:
-            collection.index_information()
-        except Exception as ex: # collection or database not existing
-            collection.create_index([('datetime', pymongo.ASCENDING)], unique=True)
+        self._createIndex(collection, 'datetime')
 
         # update to DB
+        requests = [pymongo.UpdateOne({'datetime': doc['datetime']}, {'$set':doc}, upsert=True) for doc in data]
+        try:
+            inserted, modified, failed = self._bulkUpsert(collection, requests, code)
+        except Exception as ex:
+            self._invalidateCodeDaysIndex(code)
+            self._getDaysCache().invalidate(code)
+
+            self._info.print("更新{0}日线数据到MongoDB异常:{1}".format(code, str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return False
+
+        # 个股日线日期索引和本地缓存失效
+        self._invalidateCodeDaysIndex(code)
+        self._getDaysCache().invalidate(code)
+
+        if failed > 0:
+            self._info.print("更新{0}日线数据到MongoDB: 插入{1}, 修改{2}, 失败{3}".format(code, inserted, modified, failed), DyLogData.error)
+            return False
+
+        self._updateDaysMeta(code, data)
+
+        return True
+
+    def getDaysMeta(self, codes):
+        """
+            一次查询获取股票日线数据每个指标的最新日期
+            @codes: [code] or {code:name}
+            @return: {code: {indicator: date}}，不包含没有元数据的股票。None - 数据库异常
+        """
+        collection = self._getDaysMetaCollection()
+
+        try:
+            cursor = collection.find({'code': {'$in': list(codes)}}, {'_id': False, 'code': True, 'latest': True})
+
+            meta = {}
+            for doc in cursor:
+                meta[doc['code']] = {indicator: date.strftime('%Y-%m-%d') for indicator, date in doc.get('latest', {}).items()}
+
+        except Exception as ex:
+            self._info.print("MongoDB Exception({0}): 获取日线元数据".format(str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return None
+
+        return meta
+
+    def getDaysUpdateState(self):
+        """
+            @return: 最近一次增量更新的状态{'startDate':, 'endDate':, 'finished':}，None - 没有或者数据库异常
+        """
+        collection = self._getDaysMetaCollection()
+
+        try:
+            doc = collection.find_one({'code': self.daysUpdateStateKey}, {'_id': False})
+        except Exception as ex:
+            self._info.print("MongoDB Exception({0}): 获取日线增量更新状态".format(str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return None
+
+        return None if doc is None else doc.get('state')
+
+    def setDaysUpdateState(self, startDate, endDate, finished=False):
+        collection = self._getDaysMetaCollection()
+
+        # create index
+        self._createIndex(collection, 'code')
+
         try:
-            for doc in data:
-                flt = {'datetime': doc['datetime']}
-                collection.update_one(flt, {'$set':doc}, upsert=True)
+            collection.update_one({'code': self.daysUpdateStateKey},
+                                  {'$set': {'state': {'startDate': startDate, 'endDate': endDate, 'finished': finished}}},
+                                  upsert=True)
         except Exception as ex:
-            self._info.print("更新{0}日线数据到MongoDB异常:{1}".format(code, str(ex) + ', ' + str(ex.details)), DyLogData.error)
+            self._info.print("MongoDB Exception({0}): 更新日线增量更新状态".format(str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.warning)
             return False
 
         return True
 
+    def rebuildDaysMeta(self, codes, threadNbr=None, progress=None):
+        """
+            根据数据库里每只股票最新的一条日线数据，并发生成日线元数据
+            用于元数据还不存在的股票，比如第一次使用增量更新
+            @codes: [code] or {code:name}
+            @progress: DyProgress，每完成一只股票更新一次
+        """
+        def rebuildOneCode(code):
+            try:
+                cursor = self._getStockDaysDb()[code].find({}, {'_id': False}).sort('datetime', pymongo.DESCENDING).limit(1)
+                docs = list(cursor)
+            except Exception as ex:
+                self._info.print("MongoDB Exception({0}): 获取{1}最新日线数据".format(str(ex) + ', ' + str(getattr(ex, 'details', None)), code), DyLogData.error)
+                return
+
+            if docs:
+                self._updateDaysMeta(code, docs)
+
+        with ThreadPoolExecutor(max_workers=threadNbr or self.loadThreadNbr) as executor:
+            for _ in executor.map(rebuildOneCode, codes):
+                if progress is not None:
+                    progress.update()
+
     def updateTradeDays(self, dates):
         collection = self._getTradeDayTableCollection()
 
         # create index
-        try:
-            collection.index_information()
-        except Exception as ex: # collection or database not existing
-            collection.create_index([('datetime', pymongo.ASCENDING)], unique=True)
+        self._createIndex(collection, 'datetime')
 
         # update into DB
+        requests = [pymongo.UpdateOne({'datetime': date['datetime']}, {'$set':{'tradeDay': date['tradeDay']}}, upsert=True) for date in dates]
         try:
-            for date in dates:
-                flt = {'datetime': date['datetime']}
-                collection.update_one(flt, {'$set':{'tradeDay': date['tradeDay']}}, upsert=True)
-
+            inserted, modified, failed = self._bulkUpsert(collection, requests, self.tradeDayTableName)
         except Exception as ex:
-            self._info.print("更新交易日数据到MongoDB异常:{0}".format(str(ex) + ', ' + str(ex.details)), DyLogData.error)
+            self._invalidateTradeDayCalendar()
+
+            self._info.print("更新交易日数据到MongoDB异常:{0}".format(str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return False
+
+        # 内存交易日表失效，下次使用时重新载入
+        self._invalidateTradeDayCalendar()
+
+        if failed > 0:
+            self._info.print("更新交易日数据到MongoDB: 插入{0}, 修改{1}, 失败{2}".format(inserted, modified, failed), DyLogData.error)
             return False
 
         return True
@@ -399,50 +807,92 @@ class DyStockMongoDbEngine(object):
         collection = self._getCodeTableCollection()
 
         # create index
-        try:
-            collection.index_information()
-        except Exception as ex: # collection or database not existing
-            collection.create_index([('code', pymongo.ASCENDING)], unique=True)
+        self._createIndex(collection, 'code')
 
         # update into DB
+        requests = [pymongo.UpdateOne({'code': code['code']}, {'$set':{'name': code['name']}}, upsert=True) for code in codes]
         try:
-            for code in codes:
-                flt = {'code': code['code']}
-                collection.update_one(flt, {'$set':{'name': code['name']}}, upsert=True)
-
+            inserted, modified, failed = self._bulkUpsert(collection, requests, self.codeTableName)
         except Exception as ex:
-            self._info.print("更新股票代码数据到MongoDB异常:{0}".format(str(ex) + ', ' + str(ex.details)), DyLogData.error)
+            self._info.print("更新股票代码数据到MongoDB异常:{0}".format(str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return False
+
+        if failed > 0:
+            self._info.print("更新股票代码数据到MongoDB: 插入{0}, 修改{1}, 失败{2}".format(inserted, modified, failed), DyLogData.error)
             return False
 
         return True
 
+    def getUpdateCounts(self, code=None):
+        """
+            获取最近一次批量写入的计数
+            @return: [inserted, modified, failed] or {code: [inserted, modified, failed]}
+        """
+        if code is None:
+            return self._updateCounts
+
+        return self._updateCounts.get(code)
+
+    def clearUpdateCounts(self):
+        self._updateCounts = {}
+
     def getOneCodeDays(self, code, startDate, endDate, indicators, name=None):
         """
             通过绝对日期获取个股日线数据
         """
-        cursor = self._findOneCodeDays(code, startDate, endDate, name)
+        if self.daysShared is not None:
+            df = self.daysShared.get(self._getStockDaysDb().name, code, startDate, endDate, indicators)
+            if df is not None:
+                return None if df.empty else df
+
+        if self.daysCacheEnabled:
+            df = self._getOneCodeDaysByCache(code, startDate, endDate, indicators, name)
+            if df is not None:
+                return None if df.empty else df
+
+        cursor = self._findOneCodeDays(code, startDate, endDate, name, self._getDaysProjection(indicators))
         if cursor is None: return None
 
         return self._getOneCodeDaysByCursor(cursor, indicators)
 
-    def getDays(self, codes, startDate, endDate, indicators):
-        """ @codes: [code] or {code:name}
-            @return: {code:DF}
+    def getDays(self, codes, startDate, endDate, indicators, stacked=False, threadNbr=None, progress=None):
+        """ 并发获取多只股票的日线数据，每个线程一个股票查询，共享同一个MongoClient
+            @codes: [code] or {code:name}
+            @stacked: True - 返回以(code, datetime)为MultiIndex的合并DF
+            @threadNbr: 并发线程数，None则使用@loadThreadNbr
+            @progress: DyProgress，每完成一只股票更新一次
+            @return: {code:DF} or DF
         """
         isDict = True if isinstance(codes, dict) else False
 
+        def getOneCode(code):
+            name = codes[code] if isDict else None
+
+            return self.getOneCodeDays(code, startDate, endDate, indicators, name)
+
         codesDf = {}
-        for code in codes:
+        with ThreadPoolExecutor(max_workers=threadNbr or self.loadThreadNbr) as executor:
+            for code, df in zip(codes, executor.map(getOneCode, codes)):
+                if df is not None:
+                    codesDf[code] = df
 
-            name = codes[code] if isDict else None
-            df = self.getOneCodeDays(code, startDate, endDate, indicators, name)
+                if progress is not None:
+                    progress.update()
+
+        if not codesDf:
+            return None
 
-            if df:
-                codesDf[code] = df
+        if stacked:
+            return pd.concat(codesDf, names=['code', 'datetime'])
 
-        return codesDf if codesDf else None
+        return codesDf
 
     def getAdjFactor(self, code, date, name=None):
+        if self.daysShared is not None:
+            adjFactor = self.daysShared.getAdjFactor(self._getStockDaysDb().name, code, date)
+            if adjFactor is not None:
+                return adjFactor
+
         collection = self._getStockDaysDb()[code]
 
         dateEnd = datetime.strptime(date + ' 23:00:00', '%Y-%m-%d %H:%M:%S')
@@ -469,18 +919,15 @@ class DyStockMongoDbEngine(object):
 
         while True:
             try:
-                cursor = self._findTradeDays()
-                if cursor is None: return None
+                calendar = self._getTradeDayCalendar(raiseException=True)
 
-                cursor = cursor.sort('datetime', pymongo.DESCENDING).limit(1)
+                if not calendar['datetimes']:
+                    return None
 
-                for d in cursor:
-                    return d
-
-                return None
+                return {'datetime': calendar['datetimes'][-1]}
 
             except Exception as ex:
-                self._info.print("MongoDB 异常({0}): 获取最新日期".format(str(ex) + ', ' + str(ex.details)),
+                self._info.print("MongoDB 异常({0}): 获取最新日期".format(str(ex) + ', ' + str(getattr(ex, 'details', None))),
                                  DyLogData.error)
 
                 if '无法连接' in str(ex):
@@ -493,16 +940,13 @@ class DyStockMongoDbEngine(object):
 
     def getDaysLatestTradeDay(self):
         """ 获取数据库里交易日数据的最新交易日 """
-        cursor = self._findTradeDays()
-        if cursor is None: return None
-
-        cursor = cursor.sort('datetime', pymongo.DESCENDING)
+        calendar = self._getTradeDayCalendar()
+        if calendar is None: return None
 
-        for d in cursor:
-            if d['tradeDay']:
-                return d
+        if calendar['tradeDays'].size == 0:
+            return None
 
-        return None
+        return self._getTradeDayDoc(calendar, -1)
 
     def getOneCodeDaysUnified(self, code, dates, indicators, name=None):
         """
@@ -522,7 +966,19 @@ class DyStockMongoDbEngine(object):
         """
             获取基于个股偏移的交易日
         """
-        cursor = self._findOneCodeDaysByRelative(code, baseDate, n)
+        if self.codeDaysIndexSize > 0:
+            ret = self._getCodeDaysPositionsByRelative(code, baseDate, n)
+            if ret is None: return None
+
+            dates, (start, end) = ret
+
+            if strict:
+                if end - start != abs(n):
+                    return None
+
+            return np.datetime_as_string(dates[start if n <= 0 else end])
+
+        cursor = self._findOneCodeDaysByRelative(code, baseDate, n, projection=self._getDaysProjection([]))
         if cursor is None: return None
 
         df = self._getOneCodeDaysByCursor(cursor, [])
@@ -537,20 +993,52 @@ class DyStockMongoDbEngine(object):
         return None if df.empty else df.index[-1].strftime("%Y-%m-%d")
 
     def getTicks(self, code, startDate, endDate):
-        cursor = self._findTicks(code, startDate, endDate)
+        if self.ticksArchiveEnabled:
+            try:
+                return self._getTicksArchive().get(code, startDate, endDate)
+            except Exception as ex:
+                self._info.print("读取本地Tick数据[{0}, {1}, {2}]异常:{3}".format(code, startDate, endDate, str(ex)), DyLogData.error)
+                return None
+
+        projection = {x: True for x in self.ticksColumns}
+        projection['_id'] = False
+
+        cursor = self._findTicks(code, startDate, endDate, projection)
         if cursor is None: return None
 
         try:
-            # !!!实盘回测引擎将会使用列的次序，所以不要更改
-            df = pd.DataFrame(list(cursor), columns=['datetime', 'price', 'volume', 'amount', 'type'])
-            df.set_index('datetime', inplace=True)
+            data = self._getColumnsByCursor(cursor, self.ticksColumns)
+            index = pd.DatetimeIndex(data.pop('datetime'), name='datetime')
+
+            df = pd.DataFrame(data, index=index, columns=self.ticksColumns[1:])
 
         except Exception as ex:
             return None
 
         return None if df.empty else df
 
+    def _ticksColumnsToDocs(self, columns):
+        """
+            列式的Tick数据转换成MongoDB的文档
+            @columns: {column: array}
+        """
+        values = [pd.DatetimeIndex(columns['datetime']).to_pydatetime()] + [columns[x].tolist() for x in self.ticksColumns[1:]]
+
+        return [dict(zip(self.ticksColumns, row)) for row in zip(*values)]
+
     def insertTicks(self, code, date, data):
+        """
+            @data: [{indicator: value}], i.e. MongoDB BSON format
+                   或者列式数据{column: array}
+        """
+        if self.ticksArchiveEnabled:
+            try:
+                self._getTicksArchive().insert(code, date, data)
+            except Exception as ex:
+                self._info.print("插入Tick数据[{0},{1}]到本地文件异常:{2}".format(code, date, str(ex)), DyLogData.error)
+                return False
+
+            return True
 
         collection = self._client[self.stockTicksDb][code]
 
@@ -560,6 +1048,9 @@ class DyStockMongoDbEngine(object):
         except Exception as ex: # collection or database not existing
             collection.create_index([('datetime', pymongo.ASCENDING)], unique=True)
 
+        if isinstance(data, dict):
+            data = self._ticksColumnsToDocs(data)
+
         # insert ticks into DB
         try:
             collection.insert_many(data)
@@ -578,13 +1069,118 @@ class DyStockMongoDbEngine(object):
         return True
 
     def isTicksExisting(self, code, date):
-        cursor = self._findTicks(code, date, date)
+        if self.ticksArchiveEnabled:
+            return self._getTicksArchive().isExisting(code, date)
+
+        # 只探测一个文档，不用cursor.count()统计当日所有Tick
+        cursor = self._findTicks(code, date, date, {'_id': False, 'datetime': True})
         if cursor is None: return False
 
-        if cursor.count() == 0:
-            return False
+        try:
+            for _ in cursor.limit(1):
+                return True
+        except Exception as ex:
+            self._info.print("MongoDB Exception({0}): 查找{1}:{2}的Tick数据".format(str(ex) + ', ' + str(getattr(ex, 'details', None)), code, date),
+                             DyLogData.error)
 
-        return True
+        return False
+
+    def getTicksExistingDates(self, code, startDate, endDate):
+        """
+            获取个股在[@startDate, @endDate]之间有Tick数据的日期，每只股票只做一次聚合查询
+            @return: set([date]), None - 数据库异常
+        """
+        if self.ticksArchiveEnabled:
+            return set(self._getTicksArchive().getDates(code, startDate, endDate))
+
+        collection = self._client[self.stockTicksDb][code]
+
+        dateStart = datetime.strptime(startDate, '%Y-%m-%d')
+        dateEnd = datetime.strptime(endDate + ' 23:00:00', '%Y-%m-%d %H:%M:%S')
+
+        pipeline = [{'$match': {'datetime': {'$gt': dateStart, '$lt': dateEnd}}},
+                    {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$datetime'}}}}
+                    ]
+
+        try:
+            dates = {d['_id'] for d in collection.aggregate(pipeline)}
+        except Exception as ex:
+            self._info.print("MongoDB Exception({0}): 查找{1}[{2}, {3}]已有Tick数据的日期".format(str(ex) + ', ' + str(getattr(ex, 'details', None)),
+                                                                                    code, startDate, endDate),
+                             DyLogData.error)
+            return None
+
+        return dates
+
+    def getCodesTicksExistingDates(self, codes, startDate, endDate, threadNbr=None, progress=None):
+        """
+            并发获取多只股票在[@startDate, @endDate]之间有Tick数据的日期
+            @progress: DyProgress，每完成一只股票更新一次
+            @return: {code: set([date])}, None - 数据库异常
+        """
+        data = {}
+        with ThreadPoolExecutor(max_workers=threadNbr or self.loadThreadNbr) as executor:
+            for code, dates in zip(codes, executor.map(lambda code: self.getTicksExistingDates(code, startDate, endDate), codes)):
+                if dates is None:
+                    return None
+
+                data[code] = dates
+
+                if progress is not None:
+                    progress.update()
+
+        return data
+
+    def getTicksNotExistingDates(self, codes, dates, progress=None):
+        """
+            批量获取股票在指定日期里没有Tick数据的日期
+            @codes: [code]
+            @dates: sorted [date]
+            @progress: DyProgress，每完成一只股票更新一次
+            @return: {code: [date]}, None - 数据库异常
+        """
+        if not dates:
+            return {code: [] for code in codes}
+
+        codesExistingDates = self.getCodesTicksExistingDates(codes, dates[0], dates[-1], progress=progress)
+        if codesExistingDates is None:
+            return None
+
+        return {code: [date for date in dates if date not in existingDates] for code, existingDates in codesExistingDates.items()}
+
+    def _getNotExistingDatesByCursor(self, cursor, dates, indicators):
+        """ 用日期数组和指标存在性矩阵计算每个指标不存在的日期
+            @return: {indicator:[date]}
+        """
+        docDatetimes, docPresence = [], []
+        for d in cursor:
+            docDatetimes.append(d['datetime'])
+            docPresence.append([indicator in d for indicator in indicators])
+
+        tradeDays = np.array(dates, dtype='datetime64[D]')
+
+        # 每个指标在每个日期是否存在，assume all not in DB
+        presence = np.zeros((len(indicators), tradeDays.shape[0]), dtype=bool)
+
+        if docDatetimes:
+            docDays = np.array(docDatetimes, dtype='datetime64[D]')
+            docPresence = np.array(docPresence, dtype=bool)
+
+            # 文档日期在@dates里的位置，不在@dates里的文档忽略
+            pos = np.searchsorted(tradeDays, docDays)
+            valid = pos < tradeDays.shape[0]
+            valid[valid] = tradeDays[pos[valid]] == docDays[valid]
+
+            for i in range(len(indicators)):
+                presence[i, pos[valid & docPresence[:, i]]] = True
+
+        data = {}
+        for i, indicator in enumerate(indicators):
+            notExisting = np.flatnonzero(~presence[i])
+            if notExisting.shape[0] > 0:
+                data[indicator] = [dates[j] for j in notExisting]
+
+        return data
 
     def getNotExistingDates(self, code, dates, indicators):
         """ @dates: sorted [date]
@@ -595,44 +1191,58 @@ class DyStockMongoDbEngine(object):
         if (not dates) or (not indicators):
             return None
 
-        collection = self._getStockDaysDb()[code]
-
-        dateStart = datetime.strptime(dates[0], '%Y-%m-%d')
-        dateEnd = datetime.strptime(dates[-1] + ' 23:00:00', '%Y-%m-%d %H:%M:%S')
+        # 只取回日期和需要检查的指标
+        projection = {'_id': False, 'datetime': True}
+        for indicator in indicators:
+            projection[indicator] = True
 
-        flt = {'datetime':{'$gte':dateStart,
-                           '$lt':dateEnd}}
+        cursor = self._findOneCodeDays(code, dates[0], dates[-1], projection=projection)
+        if cursor is None:
+            return None
 
         try:
-            cursor = collection.find(flt)
+            data = self._getNotExistingDatesByCursor(cursor, dates, indicators)
         except Exception as ex:
-            self._info.print("MongoDB Exception({0}): find existing dates[{1}, {2}] for {3}".format(str(ex) + ', ' + str(ex.details), dates[0], dates[-1], code),
+            self._info.print("MongoDB Exception({0}): find existing dates[{1}, {2}] for {3}".format(str(ex) + ', ' + str(getattr(ex, 'details', None)), dates[0], dates[-1], code),
                              DyLogData.error)
             return None
-
-        # assume all not in DB
-        data = {x : dates.copy() for x in indicators}
         
-        for d in cursor:
-            date = datetime.strftime(d['datetime'], '%Y-%m-%d')
+        return data if data else None
 
-            for indicator in d:
-                if indicator in data:
-                    if date in data[indicator]:
-                        # remove existing date
-                        data[indicator].remove(date)
+    def getCodesNotExistingDates(self, codes, dates, indicators, threadNbr=None, progress=None):
+        """ 并发获取多只股票数据库里不存在的日线数据
+            @codes: [code] or {code:name}
+            @dates: sorted [date]
+            @indicators: [indicator]
+            @progress: DyProgress，每完成一只股票更新一次
+
+            @return: {code: {indicator:[date]}}，只包含有数据不存在的股票
+        """
+        data = {}
+        with ThreadPoolExecutor(max_workers=threadNbr or self.loadThreadNbr) as executor:
+            for code, temp in zip(codes, executor.map(lambda code: self.getNotExistingDates(code, dates, indicators), codes)):
+                if temp:
+                    data[code] = temp
+
+                if progress is not None:
+                    progress.update()
 
-                        if not data[indicator]:
-                            del data[indicator]
-        
         return data if data else None
 
+    def _getTradeDayCalendarRange(self, calendar, startDate, endDate):
+        """ @return: [start, end) of @calendar['dates'] """
+        start = np.searchsorted(calendar['dates'], np.datetime64(startDate, 'D'), side='left')
+        end = np.searchsorted(calendar['dates'], np.datetime64(endDate, 'D'), side='right')
+
+        return start, end
+
     def isTradeDaysExisting(self, startDate, endDate):
-        cursor = self._findTradeDays(startDate, endDate)
-        if cursor is None: return False
+        calendar = self._getTradeDayCalendar()
+        if calendar is None: return False
 
         # all dates can be found in DB
-        if len(DyTime.getDates(startDate, endDate)) == cursor.count():
+        start, end = self._getTradeDayCalendarRange(calendar, startDate, endDate)
+        if len(DyTime.getDates(startDate, endDate)) == end - start:
             return True
 
         return False
@@ -655,22 +1265,23 @@ class DyStockMongoDbEngine(object):
 
     def getTradeDaysByAbsolute(self, startDate=None, endDate=None):
         """ 从数据库获取指定日期区间的交易日数据 """
-        cursor = self._findTradeDays(startDate, endDate)
-        if cursor is None:
+        calendar = self._getTradeDayCalendar()
+        if calendar is None:
             return None
 
-        if startDate is not None:
+        if startDate is None:
+            start, end = 0, len(calendar['tradeDays'])
+        else:
             # some of dates can not be found in DB
-            if len(DyTime.getDates(startDate, endDate)) != cursor.count():
+            start, end = self._getTradeDayCalendarRange(calendar, startDate, endDate)
+            if len(DyTime.getDates(startDate, endDate)) != end - start:
                 self._info.print("有些交易日[{0}, {1}]没有在数据库".format(startDate, endDate), DyLogData.error)
                 return None
 
-        tradeDays = []
-        for d in cursor:
-            if d['tradeDay']:
-                tradeDays.append(d)
+            # convert to positions of trade days
+            start, end = np.searchsorted(calendar['tradeDayIndexes'], [start, end], side='left')
 
-        return tradeDays
+        return [self._getTradeDayDoc(calendar, i) for i in range(start, end)]
 
     def getStockCodes(self, codes=None):
         # 不载入任何股票
@@ -761,19 +1372,18 @@ class DyStockMongoDbEngine(object):
         collection = self._client[self.sectorCodeDbMap[sectorCode]][date]
 
         # create index
-        try:
-            collection.index_information()
-        except Exception as ex: # collection or database not existing
-            collection.create_index([('code', pymongo.ASCENDING)], unique=True)
+        self._createIndex(collection, 'code')
 
         # update into DB
+        requests = [pymongo.UpdateOne({'code': code['code']}, {'$set': {'name': code['name']}}, upsert=True) for code in codes]
         try:
-            for code in codes:
-                flt = {'code': code['code']}
-                collection.update_one(flt, {'$set': {'name': code['name']}}, upsert=True)
-
+            inserted, modified, failed = self._bulkUpsert(collection, requests, sectorCode)
         except Exception as ex:
-            self._info.print("更新[{0}]股票代码数据[{1}]到MongoDB异常:{2}".format(DyStockCommon.sectors[sectorCode], date, str(ex) + ', ' + str(ex.details)), DyLogData.error)
+            self._info.print("更新[{0}]股票代码数据[{1}]到MongoDB异常:{2}".format(DyStockCommon.sectors[sectorCode], date, str(ex) + ', ' + str(getattr(ex, 'details', None))), DyLogData.error)
+            return False
+
+        if failed > 0:
+            self._info.print("更新[{0}]股票代码数据[{1}]到MongoDB: 插入{2}, 修改{3}, 失败{4}".format(DyStockCommon.sectors[sectorCode], date, inserted, modified, failed), DyLogData.error)
             return False
 
         return True
@@ -1,4 +1,6 @@
-﻿from time import sleep
+﻿from time import sleep, monotonic
+import threading
+import asyncio
 import pandas as pd
 import tushare as ts
 import numpy as np
@@ -10,6 +12,11 @@ except ImportError:
     from urllib3 import urlopen, Request
     pass
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 from pandas.compat import StringIO
 from tushare.stock import cons as ct
 
@@ -20,12 +27,56 @@ from .DyStockDataWind import *
 from ...Common.DyStockCommon import *
 
 
+class DyStockDataRateLimiter(object):
+    """
+        请求速率限制，线程安全
+        每个请求按固定间隔排队，调用@acquire的线程等待到轮到自己
+    """
+
+    def __init__(self, rate):
+        """ @rate: 每秒最多的请求数，0 - 不限制 """
+        self._interval = 1/rate if rate > 0 else 0
+        self._next = 0
+
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+            预约一个请求，不等待
+            @return: 需要等待的秒数，异步获取时由调用者自己等待
+        """
+        if self._interval == 0:
+            return 0
+
+        with self._lock:
+            now = monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self._interval
+
+        return max(wait, 0)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+
+
 class DyStockDataTicksGateway(object):
     """
         股票历史分笔数据网络接口
         分笔数据可以从新浪，腾讯，网易获取
         每个hand一个实例，这样可以防止数据互斥
     """
+    # 数据源的URL，测试时可以指向本地的模拟服务器
+    sinaTicksUrl = 'http://market.finance.sina.com.cn/downxls.php?date={0}&symbol={1}'
+    tencentTicksUrl = 'http://stock.gtimg.cn/data/index.php?appn=detail&action=download&c={0}&d={1}'
+    ticks163Url = 'http://quotes.money.163.com/cjmx/{0}/{1}/{2}.xls'
+
+    # 每个数据源每秒最多的请求数，所有hand共享。0 - 不限制
+    ticksDataSourceRateLimits = {'新浪': 10, '腾讯': 10, '网易': 5}
+
+    _ticksDataSourceRateLimiters = {} # {data source name: DyStockDataRateLimiter}
+    _ticksDataSourceRateLimitersLock = threading.Lock()
 
 
     def __init__(self, eventEngine, info, hand):
@@ -70,7 +121,7 @@ class DyStockDataTicksGateway(object):
         for _ in range(retry_count):
             sleep(pause)
             try:
-                url = 'http://quotes.money.163.com/cjmx/{0}/{1}/{2}.xls'.format(yyyy, yyyy+mm+dd, symbol)
+                url = DyStockDataTicksGateway.ticks163Url.format(yyyy, yyyy+mm+dd, symbol)
                 socket = urlopen(url)
                 xd = pd.ExcelFile(socket)
                 df = xd.parse(xd.sheet_names[0], names=['time', 'price', 'change', 'volume', 'amount', 'type'])
@@ -114,7 +165,7 @@ class DyStockDataTicksGateway(object):
         for _ in range(retry_count):
             sleep(pause)
             try:
-                re = Request('http://stock.gtimg.cn/data/index.php?appn=detail&action=download&c={0}&d={1}'.format(symbol, yyyy+mm+dd))
+                re = Request(DyStockDataTicksGateway.tencentTicksUrl.format(symbol, yyyy+mm+dd))
                 lines = urlopen(re, timeout=10).read()
                 lines = lines.decode('GBK') 
                 df = pd.read_table(StringIO(lines), names=['time', 'price', 'change', 'volume', 'amount', 'type'],
@@ -153,7 +204,7 @@ class DyStockDataTicksGateway(object):
         for _ in range(retry_count):
             sleep(pause)
             try:
-                re = Request('http://market.finance.sina.com.cn/downxls.php?date={}&symbol={}'.format(date, symbol))
+                re = Request(DyStockDataTicksGateway.sinaTicksUrl.format(date, symbol))
                 lines = urlopen(re, timeout=10).read()
                 lines = lines.decode('GBK') 
                 if len(lines) < 20:
@@ -167,20 +218,37 @@ class DyStockDataTicksGateway(object):
                 return df
         raise ex
 
-    def _getTicks(self, code, date):
+    def _getTicks(self, code, date, preferredSource=None):
         """
             get history ticks data from network
+            @preferredSource: 先从这个数据源获取，由ticks engine按每个数据源的窗口路由
             @returns: None - error happened, i.e. timer out or errors from server
                              If error happened, ticks engine will retry it.
                       DyStockHistTicksAckData.noData - no data for specified date
                       BSON format data - sucessful situation
+                      and name of the last data source tried
+                      and [data source failed or timer out]
         """
         switch = False
+        errorSources = []
+
+        # 优先的数据源排在最前面，不改变数据源切换的次序
+        indexes = list(range(len(self._ticksDataSource)))
+        if preferredSource in self._ticksDataSourceName:
+            i = self._ticksDataSourceName.index(preferredSource)
+            indexes = [i] + indexes[:i] + indexes[i + 1:]
+
+        for i in indexes:
+            func = self._ticksDataSource[i]
+            source = self._ticksDataSourceName[i]
 
-        for i, func in enumerate(self._ticksDataSource):
             # get ticks from data source
+            DyStockDataTicksGateway._getRateLimiter(source).acquire()
             data = self._getTicksByFunc(func, code, date)
 
+            if data is None or data == 'timer out':
+                errorSources.append(source)
+
             # 如果数据源应该有数据却没有数据或者发生错误，则换个数据源获取
             if data == DyStockHistTicksAckData.noData or data is None:
                 # fatal error from data source
@@ -205,11 +273,50 @@ class DyStockDataTicksGateway(object):
             self._info.print('Hand {}: 历史分笔数据源切换{}->{}'.format(self._hand, oldTicksDataSourceName, self._ticksDataSourceName), DyLogData.warning)
 
         # convert return value to retain same interface for ticks engine
-        return None if data == 'timer out' else data
+        return (None if data == 'timer out' else data), source, errorSources
+
+    def _getRateLimiter(source):
+        """ 数据源的速率限制，所有hand和异步接口共享 """
+        cls = DyStockDataTicksGateway
+
+        with cls._ticksDataSourceRateLimitersLock:
+            limiter = cls._ticksDataSourceRateLimiters.get(source)
+            if limiter is None:
+                limiter = DyStockDataRateLimiter(cls.ticksDataSourceRateLimits.get(source, 0))
+                cls._ticksDataSourceRateLimiters[source] = limiter
+
+        return limiter
+
+    def _ticksDfToColumns(df, date):
+        """
+            清洗数据源返回的分笔DF，并转换成列式数据
+            @df: 数据源返回的DF，列是['time', 'price', 'change', 'volume', 'amount', 'type']
+            @return: {column: array}，列跟DyStockMongoDbEngine.ticksColumns一致，datetime是datetime64[ns]
+                     None - 没有有效数据
+        """
+        df = df.drop(['change'], axis=1) # 第一笔的价格变动通常是NaN，不能参与下面的dropna
+
+        df = df.dropna() # sometimes Sina will give wrong data that price is NaN
+        df = df[df['volume'] > 0] # !!!drop 0 volume, added 2017/05/30, sometimes Sina contains tick with 0 volume.
+        df = df.drop_duplicates(['time']) # drop duplicates
+
+        # sometimes Sina will give wrong time format like some time for 002324.SZ at 2013-03-18 is '14.06'
+        # 一次转换所有的时间，错误的时间转成NaT后丢弃
+        datetimes = pd.to_datetime(date + ' ' + df['time'].astype(str), format='%Y-%m-%d %H:%M:%S', errors='coerce').values
+        valid = ~np.isnat(datetimes)
+        if not valid.any():
+            return None
+
+        return {'datetime': datetimes[valid],
+                'price': df['price'].values[valid],
+                'volume': df['volume'].values[valid],
+                'amount': df['amount'].values[valid],
+                'type': df['type'].values[valid]
+                }
 
     def _getTicksByFunc(self, func, code, date):
         """
-            @return: [{indicator: value}], i.e. MongoDB BSON format
+            @return: {column: array}, 列式的Tick数据，参照@_ticksDfToColumns
                      None - fatal error from server
                      DyStockHistTicksAckData.noData - no data for sepcified date
                      'timer out'
@@ -217,27 +324,7 @@ class DyStockDataTicksGateway(object):
         try:
             df = func(code[:-3], date=date)
 
-            del df['change']
-
-            df = df.dropna() # sometimes Sina will give wrong data that price is NaN
-            df = df[df['volume'] > 0] # !!!drop 0 volume, added 2017/05/30, sometimes Sina contains tick with 0 volume.
-            df = df.drop_duplicates(['time']) # drop duplicates
-
-            # sometimes Sina will give wrong time format like some time for 002324.SZ at 2013-03-18 is '14.06'
-            while True:
-                try:
-                    df['time']  =  pd.to_datetime(date + ' ' + df['time'], format='%Y-%m-%d %H:%M:%S')
-                except ValueError as ex:
-                    strEx = str(ex)
-                    errorTime = strEx[strEx.find(date) + len(date) + 1:strEx.rfind("'")]
-                    df = df[~(df['time'] == errorTime)]
-                    continue
-                break
-
-            df.rename(columns={'time': 'datetime'}, inplace=True)
-
-            df = df.T
-            data = [] if df.empty else list(df.to_dict().values())
+            data = DyStockDataTicksGateway._ticksDfToColumns(df, date)
 
         except Exception as ex:
             if '当天没有数据' in str(ex):
@@ -249,17 +336,17 @@ class DyStockDataTicksGateway(object):
                 else:
                     return None
 
-        return data if data else DyStockHistTicksAckData.noData
+        return DyStockHistTicksAckData.noData if data is None else data
 
     def _stockHistTicksReqHandler(self, event):
         code = event.data.code
         date = event.data.date
 
-        data = self._getTicks(code, date)
+        data, source, errorSources = self._getTicks(code, date, event.data.source)
 
         # put ack event
         event = DyEvent(DyEventType.stockHistTicksAck)
-        event.data = DyStockHistTicksAckData(code, date, data)
+        event.data = DyStockHistTicksAckData(code, date, data, source, errorSources)
 
         self._eventEngine.put(event)
 
@@ -284,6 +371,139 @@ class DyStockDataTicksGateway(object):
         self._ticksDataSourceErrorCount = [0]*len(self._ticksDataSource)
 
 
+class DyStockDataTicksAsyncGateway(object):
+    """
+        股票历史分笔数据异步网络接口，需要安装aiohttp
+        一个事件循环线程通过持久连接并发获取所有的请求，跟每个hand一个DyStockDataTicksGateway实例的方式二选一
+        数据源的URL，速率限制和数据清洗跟DyStockDataTicksGateway共用
+    """
+    aiohttpInstalled = aiohttp is not None
+
+    connectionLimit = 256 # 总的并发连接数
+    connectionLimitPerHost = 32 # 每个数据源主机的并发连接数
+    timeout = 10 # 秒
+
+
+    def __init__(self, eventEngine, info):
+        self._eventEngine = eventEngine
+        self._info = info
+
+        self._loop = None
+        self._session = None
+
+        self._setTicksDataSource(DyStockDataCommon.defaultHistTicksDataSource)
+
+        self._registerEvent()
+
+    def _startLoop(self):
+        """ 收到第一个请求时启动事件循环线程 """
+        if self._loop is not None:
+            return
+
+        self._loop = asyncio.new_event_loop()
+
+        thread = threading.Thread(target=self._loop.run_forever)
+        thread.daemon = True
+        thread.start()
+
+    def _getSession(self):
+        """ 在事件循环线程里创建，所有请求共用连接池 """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.connectionLimit, limit_per_host=self.connectionLimitPerHost)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        return self._session
+
+    def _getUrl(source, code, date):
+        symbol = DyStockDataTicksGateway._codeToTencentSymbol(code[:-3])
+
+        if source == '新浪':
+            return DyStockDataTicksGateway.sinaTicksUrl.format(date, symbol)
+
+        return DyStockDataTicksGateway.tencentTicksUrl.format(symbol, date.replace('-', ''))
+
+    async def _getTicksBySource(self, source, code, date):
+        """
+            @return: 跟DyStockDataTicksGateway._getTicksByFunc一致
+        """
+        await asyncio.sleep(DyStockDataTicksGateway._getRateLimiter(source).reserve())
+
+        try:
+            async with self._getSession().get(DyStockDataTicksAsyncGateway._getUrl(source, code, date)) as response:
+                response.raise_for_status()
+                lines = (await response.read()).decode('GBK')
+
+            if '当天没有数据' in lines:
+                return DyStockHistTicksAckData.noData
+
+            if len(lines) < 20:
+                raise Exception('无效的数据: {0}'.format(lines))
+
+            df = pd.read_table(StringIO(lines), names=['time', 'price', 'change', 'volume', 'amount', 'type'], skiprows=[0])
+
+            data = DyStockDataTicksGateway._ticksDfToColumns(df, date)
+
+        except asyncio.TimeoutError:
+            self._info.print("异步{0}获取[{1}, {2}]Tick数据超时".format(source, code, date), DyLogData.error)
+            return 'timer out'
+
+        except Exception as ex:
+            self._info.print("异步{0}获取[{1}, {2}]Tick数据异常: {3}".format(source, code, date, str(ex)), DyLogData.error)
+            return None
+
+        return DyStockHistTicksAckData.noData if data is None else data
+
+    async def _getTicks(self, code, date, preferredSource=None):
+        """
+            依次从数据源获取，直到超时或者有数据，然后发送Ack事件
+            @preferredSource: 先从这个数据源获取
+        """
+        data, source = None, None
+        errorSources = []
+
+        sources = self._ticksDataSourceName
+        if preferredSource in sources:
+            sources = [preferredSource] + [x for x in sources if x != preferredSource]
+
+        try:
+            for source in sources:
+                data = await self._getTicksBySource(source, code, date)
+
+                if data is None or data == 'timer out':
+                    errorSources.append(source)
+
+                if not (data == DyStockHistTicksAckData.noData or data is None):
+                    break
+
+        except Exception as ex:
+            self._info.print("异步获取[{0}, {1}]Tick数据异常: {2}".format(code, date, str(ex)), DyLogData.error)
+            data = None
+            if source not in errorSources:
+                errorSources.append(source)
+
+        # put ack event
+        event = DyEvent(DyEventType.stockHistTicksAck)
+        event.data = DyStockHistTicksAckData(code, date, None if data == 'timer out' else data, source, errorSources)
+
+        self._eventEngine.put(event)
+
+    def _stockHistTicksAsyncReqHandler(self, event):
+        self._startLoop()
+
+        asyncio.run_coroutine_threadsafe(self._getTicks(event.data.code, event.data.date, event.data.source), self._loop)
+
+    def _updateHistTicksDataSourceHandler(self, event):
+        self._setTicksDataSource(event.data)
+
+    def _setTicksDataSource(self, dataSource):
+        self._ticksDataSourceName = DyStockDataCommon.getHistTicksDataSources(dataSource)
+
+    def _registerEvent(self):
+        # 处理函数只是把请求交给事件循环，不会阻塞ticks engine的hand
+        self._eventEngine.register(DyEventType.stockHistTicksAsyncReq, self._stockHistTicksAsyncReqHandler, DyStockDataEventHandType.ticksEngine)
+        self._eventEngine.register(DyEventType.updateHistTicksDataSource, self._updateHistTicksDataSourceHandler, DyStockDataEventHandType.ticksEngine)
+
+
 class DyStockDataGateway(object):
     """
         股票数据网络接口
@@ -308,6 +528,10 @@ class DyStockDataGateway(object):
         # new DyStockDataTicksGateway instance for each ticks hand to avoid mutex
         self._ticksGateways = [DyStockDataTicksGateway(self._eventEngine, self._info, i) for i in range(DyStockDataEventHandType.stockHistTicksHandNbr)]
 
+        # 异步获取历史分笔数据，由ticks engine根据@DyStockDataCommon.histTicksAsyncFetch选择
+        if DyStockDataTicksAsyncGateway.aiohttpInstalled:
+            self._ticksAsyncGateway = DyStockDataTicksAsyncGateway(self._eventEngine, self._info)
+
     def _getTradeDaysFromTuShare(self, startDate, endDate):
         try:
             df = ts.trade_cal()
@@ -0,0 +1,116 @@
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from .DyStockDataGateway import *
+
+
+class DyStockDataTicksParserBenchmark(object):
+    """
+        历史分笔数据解析的性能测试
+        比较原来的逐个丢弃错误时间并转换成文档列表的解析，跟向量化解析成列式数据
+        可以用保存下来的新浪或者腾讯分笔数据文件(GBK编码，制表符分隔)，没有则生成模拟的数据
+    """
+    names = ['time', 'price', 'change', 'volume', 'amount', 'type']
+
+
+    def makePayload(tickNbr=4800, badTimeNbr=5, seed=0):
+        """
+            生成新浪/腾讯格式的一个交易日的分笔数据
+            @badTimeNbr: 错误格式的时间数目，比如'14.06'
+            @return: bytes, GBK编码
+        """
+        rng = np.random.RandomState(seed)
+
+        # 交易时间内的秒数，降序跟新浪一致
+        seconds = np.concatenate([np.arange(9*3600 + 30*60, 11*3600 + 30*60), np.arange(13*3600, 15*3600)])
+        seconds = np.sort(rng.choice(seconds, tickNbr, replace=False))[::-1]
+
+        times = ['{0:02d}:{1:02d}:{2:02d}'.format(x//3600, x%3600//60, x%60) for x in seconds]
+        for i in rng.choice(tickNbr, badTimeNbr, replace=False):
+            times[i] = times[i][:5].replace(':', '.')
+
+        prices = np.round(10 + np.cumsum(rng.randint(-1, 2, tickNbr))*0.01, 2)
+        volumes = rng.randint(1, 1000, tickNbr)
+        types = rng.choice(['买盘', '卖盘', '中性盘'], tickNbr)
+
+        lines = ['成交时间\t成交价\t价格变动\t成交量(手)\t成交额(元)\t性质']
+        # 当天第一笔(降序的最后一行)没有价格变动
+        lines += ['{0}\t{1:.2f}\t{2}\t{3}\t{4}\t{5}'.format(t, p, '' if i == tickNbr - 1 else '0.00', v, int(p*v*100), x) for i, (t, p, v, x) in enumerate(zip(times, prices, volumes, types))]
+
+        return '\n'.join(lines).encode('GBK')
+
+    def _readPayload(payload):
+        """ 跟DyStockDataTicksGateway里从新浪和腾讯获取数据的解析一致 """
+        return pd.read_table(StringIO(payload.decode('GBK')), names=DyStockDataTicksParserBenchmark.names, skiprows=[0])
+
+    def parseLegacy(df, date):
+        """ 原来的解析：每次循环丢弃一个错误的时间，然后转换成文档列表 """
+        df = df.copy()
+        del df['change']
+
+        df = df.dropna()
+        df = df[df['volume'] > 0]
+        df = df.drop_duplicates(['time'])
+
+        while True:
+            try:
+                df['time']  =  pd.to_datetime(date + ' ' + df['time'], format='%Y-%m-%d %H:%M:%S')
+            except ValueError as ex:
+                # 不同版本的pandas，错误信息里时间的引号不一样
+                match = re.search(date + ' ([^\'"]*)', str(ex))
+                if match is None or not (df['time'] == match.group(1)).any():
+                    raise
+
+                df = df[~(df['time'] == match.group(1))]
+                continue
+            break
+
+        df.rename(columns={'time': 'datetime'}, inplace=True)
+
+        df = df.T
+        return [] if df.empty else list(df.to_dict().values())
+
+    def parseVectorised(df, date):
+        return DyStockDataTicksGateway._ticksDfToColumns(df, date)
+
+    def _timeit(func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+
+        return (time.perf_counter() - start)/repeat, result
+
+    def run(fileNames=None, date='2017-01-03', repeat=10):
+        """
+            @fileNames: [保存下来的分笔数据文件], None - 模拟数据
+            @return: [{'name':, 'ticks':, 'legacy':, 'vectorised':, 'speedup':}], 时间单位是秒
+        """
+        if fileNames is None:
+            payloads = [('模拟{0}笔'.format(n), DyStockDataTicksParserBenchmark.makePayload(n)) for n in [1000, 4800]]
+        else:
+            payloads = []
+            for fileName in fileNames:
+                with open(fileName, 'rb') as f:
+                    payloads.append((fileName, f.read()))
+
+        results = []
+        for name, payload in payloads:
+            df = DyStockDataTicksParserBenchmark._readPayload(payload)
+
+            legacy, docs = DyStockDataTicksParserBenchmark._timeit(lambda: DyStockDataTicksParserBenchmark.parseLegacy(df, date), repeat)
+            vectorised, columns = DyStockDataTicksParserBenchmark._timeit(lambda: DyStockDataTicksParserBenchmark.parseVectorised(df, date), repeat)
+
+            ticks = 0 if columns is None else columns['datetime'].shape[0]
+            assert ticks == len(docs)
+
+            result = {'name': name, 'ticks': ticks, 'legacy': legacy, 'vectorised': vectorised,
+                      'speedup': legacy/vectorised if vectorised > 0 else float('inf')}
+            results.append(result)
+
+            print('{0}: {1}笔Tick, 原来的解析{2}ms, 向量化解析{3}ms, 加速{4:.1f}倍'.format(
+                name, ticks, round(legacy*1000, 3), round(vectorised*1000, 3), result['speedup']))
+
+        return results
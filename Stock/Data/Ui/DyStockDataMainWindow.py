@@ -104,6 +104,29 @@ class DyStockDataMainWindow(DyBasicMainWindow):
 
                 self._mainEngine.eventEngine.put(event)
 
+    def _histTicksMigrateAct(self):
+        if self._histTicksMigrateAction.text() == '停止':
+            self._mainEngine._info.print('停止迁移股票(基金)历史分笔数据到本地文件...', DyLogData.ind)
+
+            # change UI
+            self._stopRunningMutexAction()
+
+            event = DyEvent(DyEventType.stopMigrateStockHistTicksReq)
+            self._mainEngine.eventEngine.put(event)
+
+        else: # 开始迁移
+            data = {}
+            codeLabelText = '股票(基金)代码(空代表MongoDB里所有代码), e.g. 600016,510300,002213,...'
+            if DyCodeDateDlg(codeLabelText, data, self).exec_():
+                # change UI
+                self._startRunningMutexAction(self._histTicksMigrateAction)
+
+                event = DyEvent(DyEventType.migrateStockHistTicks)
+                event.data = data
+                event.data['codes'] = DyStockCommon.getDyStockCodes(event.data['codes'])
+
+                self._mainEngine.eventEngine.put(event)
+
     def _manualUpdateSectorCodeTableAct(self):
         data = {'codes': list(DyStockCommon.sectors)}
         if DyCodeDateDlg('板块代码', data, self).exec_():
@@ -270,6 +293,11 @@ class DyStockDataMainWindow(DyBasicMainWindow):
         self._histTicksVerifyAction.triggered.connect(self._histTicksVerifyAct)
         self._addMutexAction(self._histTicksVerifyAction)
 
+        # 迁移完成后，在MongoDB配置里选择分笔数据使用本地文件
+        self._histTicksMigrateAction = QAction('迁移到本地文件...', self)
+        self._histTicksMigrateAction.triggered.connect(self._histTicksMigrateAct)
+        self._addMutexAction(self._histTicksMigrateAction)
+
         self._strategyDataPrepareAction = QAction('生成实盘策略准备数据...', self)
         self._strategyDataPrepareAction.triggered.connect(self._strategyDataPrepare)
         self._addMutexAction(self._strategyDataPrepareAction)
@@ -299,6 +327,11 @@ class DyStockDataMainWindow(DyBasicMainWindow):
         self._enableLogDetailsAction = QAction('打开日志细节', self)
         self._enableLogDetailsAction.triggered.connect(self._enableLogDetailsAct)
         self._enableLogDetailsAction.setCheckable(True)
+
+        self._histTicksAsyncFetchAction = QAction('异步获取历史分笔数据', self)
+        self._histTicksAsyncFetchAction.triggered.connect(self._histTicksAsyncFetchAct)
+        self._histTicksAsyncFetchAction.setCheckable(True)
+        self._histTicksAsyncFetchAction.setChecked(DyStockDataCommon.histTicksAsyncFetch)
         
         # 测试
         testAction = QAction('测试', self)
@@ -311,6 +344,7 @@ class DyStockDataMainWindow(DyBasicMainWindow):
         histTicksMenu = menuBar.addMenu('历史分笔')
         histTicksMenu.addAction(self._histTicksMannualUpdateAction)
         histTicksMenu.addAction(self._histTicksVerifyAction)
+        histTicksMenu.addAction(self._histTicksMigrateAction)
 
         # 添加菜单
         histDaysMenu = menuBar.addMenu('历史日线')
@@ -327,6 +361,7 @@ class DyStockDataMainWindow(DyBasicMainWindow):
         # 添加菜单
         settingMenu = menuBar.addMenu('设置')
         settingMenu.addAction(self._enableLogDetailsAction)
+        settingMenu.addAction(self._histTicksAsyncFetchAction)
 
         # 添加菜单
         #testMenu = menuBar.addMenu('测试')
@@ -381,6 +416,9 @@ class DyStockDataMainWindow(DyBasicMainWindow):
     def _enableLogDetailsAct(self):
         DyStockDataCommon.logDetailsEnabled = self._enableLogDetailsAction.isChecked()
 
+    def _histTicksAsyncFetchAct(self):
+        DyStockDataCommon.histTicksAsyncFetch = self._histTicksAsyncFetchAction.isChecked()
+
     def _histTicksDataSourceMenuAct(self):
         self._histTicksDataSourceMenu.popup(QCursor.pos())
 
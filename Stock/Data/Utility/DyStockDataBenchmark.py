@@ -0,0 +1,84 @@
+import time
+
+import pandas as pd
+
+from DyCommon.DyCommon import *
+from ..DyStockDataCommon import *
+from ..Engine.DyStockMongoDbEngine import *
+
+
+class DyStockDataBenchmark(object):
+    """
+        股票数据读取的性能测试，需要本地MongoDB里有对应的数据
+        结果以每秒行数(rows/s)打印
+    """
+
+    def _print(name, rows, seconds):
+        rate = rows/seconds if seconds > 0 else float('inf')
+        print('{0}: {1}行, 耗时{2}ms, {3}行/秒'.format(name, rows, round(seconds*1000, 3), int(rate)))
+
+        return rate
+
+    def _legacyDays(mongoDbEngine, code, startDate, endDate, indicators):
+        """ 改进前的方式：取回整个文档，list(cursor)后由pandas丢弃不需要的列 """
+        cursor = mongoDbEngine._findOneCodeDays(code, startDate, endDate)
+
+        columns = indicators + ['datetime']
+        if 'adjfactor' not in columns:
+            columns.append('adjfactor')
+
+        df = pd.DataFrame(list(cursor), columns=columns)
+        df = df.dropna(axis=1, how='all')
+        df = df.set_index('datetime')
+
+        return df
+
+    def days(code='600000.SH', years=20, indicators=DyStockDataCommon.dayIndicators, repeat=3):
+        """
+            载入个股@years年全部指标的日线数据
+            @return: {name: rows/s}
+        """
+        mongoDbEngine = DyStockMongoDbEngine(DyDummyInfo())
+
+        endDate = datetime.now().strftime("%Y-%m-%d")
+        startDate = DyTime.getDateStr(endDate, -365*years)
+
+        funcs = [('list(cursor)', lambda: DyStockDataBenchmark._legacyDays(mongoDbEngine, code, startDate, endDate, list(indicators))),
+                 ('projection+columnar', lambda: mongoDbEngine.getOneCodeDays(code, startDate, endDate, list(indicators)))
+                 ]
+
+        rates = {}
+        for name, func in funcs:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                df = func()
+                seconds = time.perf_counter() - start
+
+                best = seconds if best is None else min(best, seconds)
+
+            rows = 0 if df is None else df.shape[0]
+            rates[name] = DyStockDataBenchmark._print('{0}[{1}, {2}]日线 {3}'.format(code, startDate, endDate, name), rows, best)
+
+        return rates
+
+    def ticks(code='600000.SH', startDate=None, endDate=None, repeat=3):
+        """
+            载入个股一段日期的Tick数据
+            @return: rows/s
+        """
+        mongoDbEngine = DyStockMongoDbEngine(DyDummyInfo())
+
+        endDate = endDate or datetime.now().strftime("%Y-%m-%d")
+        startDate = startDate or DyTime.getDateStr(endDate, -30)
+
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = mongoDbEngine.getTicks(code, startDate, endDate)
+            seconds = time.perf_counter() - start
+
+            best = seconds if best is None else min(best, seconds)
+
+        rows = 0 if df is None else df.shape[0]
+        return DyStockDataBenchmark._print('{0}[{1}, {2}]Ticks'.format(code, startDate, endDate), rows, best)
@@ -0,0 +1,73 @@
+from DyCommon.DyCommon import *
+from ..Engine.DyStockMongoDbEngine import *
+from ..Engine.DyStockDataTicksArchive import DyStockDataTicksArchive
+
+
+class DyStockDataTicksMigration(object):
+    """
+        把MongoDB里的分笔数据迁移到本地列式存储(@DyStockDataTicksArchive)
+        界面上通过'历史分笔->迁移到本地文件...'迁移，迁移完成后，在MongoDB配置里选择分笔数据使用本地文件
+    """
+
+    def migrateCode(mongoDbEngine, archive, code, startDate=None, endDate=None, overwrite=False):
+        """
+            逐日流式迁移一只股票的分笔数据，避免整只股票的数据全部载入内存
+            @return: 迁移的交易日数, None - 数据库异常
+        """
+        cursor = mongoDbEngine.findTicksDb(code, startDate, endDate)
+        if cursor is None:
+            return None
+
+        count = 0
+        curDate, docs = None, []
+        for doc in cursor:
+            date = doc['datetime'].strftime('%Y-%m-%d')
+            if date != curDate:
+                if docs and (overwrite or not archive.isExisting(code, curDate)):
+                    archive.insert(code, curDate, docs)
+                    count += 1
+
+                curDate, docs = date, []
+
+            docs.append(doc)
+
+        if docs and (overwrite or not archive.isExisting(code, curDate)):
+            archive.insert(code, curDate, docs)
+            count += 1
+
+        return count
+
+    def migrate(codes=None, startDate=None, endDate=None, overwrite=False, info=None):
+        """
+            在当前线程里迁移，用于脚本
+            @codes: None - MongoDB分笔数据库里的所有股票
+            @startDate, @endDate: None - 不限制
+            @overwrite: 本地已经存在的交易日是否覆盖
+            @return: {code: 迁移的交易日数}
+        """
+        info = info or DyDummyInfo()
+        mongoDbEngine = DyStockMongoDbEngine(info)
+        archive = DyStockDataTicksArchive(mongoDbEngine.getTicksDbName())
+
+        if codes is None:
+            codes = mongoDbEngine.getTicksDbCodes()
+            if codes is None:
+                return {}
+
+        progress = DyProgress(info)
+        progress.init(len(codes))
+
+        counts = {}
+        for code in codes:
+            try:
+                count = DyStockDataTicksMigration.migrateCode(mongoDbEngine, archive, code, startDate, endDate, overwrite)
+                if count is not None:
+                    counts[code] = count
+            except Exception as ex:
+                info.print("迁移{0}的Tick数据异常: {1}".format(code, str(ex)), DyLogData.error)
+
+            progress.update()
+
+        info.print("迁移Tick数据完成: {0}只股票, {1}个交易日".format(len(counts), sum(counts.values())), DyLogData.ind)
+
+        return counts
@@ -30,7 +30,7 @@ class DyStockSelectMainEngine(object):
         return self._info
 
     def exit(self):
-        pass
+        self._regressionEngine.exit()
 
     def _initDataViewer(self):
         errorInfo = DyErrorInfo(self._eventEngine)
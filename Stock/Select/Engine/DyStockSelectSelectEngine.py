@@ -1,7 +1,11 @@
+import os
+import multiprocessing
+
 from ...Data.Engine.DyStockDataEngine import *
 from EventEngine.DyEvent import *
 from ..DyStockSelectCommon import *
 from DyCommon.DyCommon import *
+from .DyStockSelectStockDaysProcess import *
 
 
 class DyStockSelectSelectEngine(object):
@@ -12,6 +16,8 @@ class DyStockSelectSelectEngine(object):
         若日线选股和Tick选股同时激活，首先先执行日线选股，然后再根据日线选股的结果载入对应的Tick数据，进行Tick选股。
         可以认为Tick选股是对日线选股的进一步细化。
     """
+    parallelProcessNbr = None # 策略@parallelStockDays为True时，并行计算个股日线数据的进程数。None - CPU核数，0 - 在引擎线程里依次计算
+    parallelChunkSize = 50 # 每个并行任务的股票数
 
 
     def __init__(self, eventEngine, info, registerEvent=True):
@@ -40,12 +46,14 @@ class DyStockSelectSelectEngine(object):
         self._ticksEngine = self._errorDataEngine.ticksEngine
 
     def stop(self):
+        """ 停止正在运行的选股，并行计算的进程池随之终止 """
         self._isStopped = True
 
     def _init(self):
         self._isStopped = False
 
         self._strategy = None
+        self._paramters = None
 
         self._codes = None # [code]
 
@@ -67,6 +75,28 @@ class DyStockSelectSelectEngine(object):
         self._result = None
         self._resultForTrade = None
 
+    def _getLoadDates(startDate, endDate):
+        """
+            把策略返回的载入数据日期范围转换成[startDate, baseDate, n]序列
+            @return: startDate, baseDate, n
+        """
+        # 相对日期载入数据
+        if isinstance(endDate, int):
+            if endDate < 0:
+                baseDate = startDate
+                startDate = endDate
+                n = 0
+            else:
+                baseDate = startDate
+                startDate = 0
+                n = endDate
+
+        else: # 绝对日期载入数据
+            baseDate = endDate
+            n = 0
+
+        return startDate, baseDate, n
+
     def _onLoadDays(self):
         # 获取策略需要载入数据的日期范围
         startDate, endDate = self._strategy.onDaysLoad()
@@ -80,25 +110,12 @@ class DyStockSelectSelectEngine(object):
         self._startDay = startDate
         self._endDay = endDate
 
-        # 相对日期载入数据, 得到[startDate, baseDate, n]序列
-        if isinstance(endDate, int):
-
-            # 策略需要补全缺失的日线数据并且是相对载入
-            if self._onDaysLoadDates is not None:
-                self._expectedDaysSize = abs(endDate) + 1
-
-            if endDate < 0:
-                baseDate = startDate
-                startDate = endDate
-                n = 0
-            else:
-                baseDate = startDate
-                startDate = 0
-                n = endDate
+        # 策略需要补全缺失的日线数据并且是相对载入
+        if isinstance(endDate, int) and self._onDaysLoadDates is not None:
+            self._expectedDaysSize = abs(endDate) + 1
 
-        else: # 绝对日期载入数据
-            baseDate = endDate
-            n = 0
+        # 相对日期载入数据, 得到[startDate, baseDate, n]序列
+        startDate, baseDate, n = DyStockSelectSelectEngine._getLoadDates(startDate, endDate)
 
         # 调整载入数据日期
         dates = self._strategy.onPostDaysLoad(startDate, baseDate, n)
@@ -134,19 +151,7 @@ class DyStockSelectSelectEngine(object):
         self._endTicksDay = endDate
 
         # 相对日期载入数据, 得到[startDate, baseDate, n]序列
-        if isinstance(endDate, int):
-            if endDate < 0:
-                baseDate = startDate
-                startDate = endDate
-                n = 0
-            else:
-                baseDate = startDate
-                startDate = 0
-                n = endDate
-
-        else: # 绝对日期载入数据
-            baseDate = endDate
-            n = 0
+        startDate, baseDate, n = DyStockSelectSelectEngine._getLoadDates(startDate, endDate)
 
         if not self._isDays:
             # 调整载入数据日期
@@ -220,12 +225,22 @@ class DyStockSelectSelectEngine(object):
             self._progress.update()
 
         # stock loop
+        if self._strategy.parallelStockDays:
+            if not self._runStockDaysRows():
+                self._info.print("日线数据运行被停止", DyLogData.warning)
+                return
+
+            self._strategy.onDaysDoneForEngine()
+
+            self._info.print("日线数据运行完成")
+            return
+
         for code in self._daysEngine.stockCodes:
-            df = self._daysEngine.getDataFrame(code, self._startDay, self._endDay)
+            if self._isStopped:
+                self._info.print("日线数据运行被停止", DyLogData.warning)
+                return
 
-            # 策略需要补全数据
-            if self._expectedDaysSize is not None:
-                df = self._autoFillDays(code, df)
+            df = self._getStockDays(code)
 
             if df is not None or self._strategy.fullyPushDays:
                 try:
@@ -238,8 +253,101 @@ class DyStockSelectSelectEngine(object):
 
             self._progress.update()
 
+        self._strategy.onDaysDoneForEngine()
+
         self._info.print("日线数据运行完成")
 
+    def _getStockDays(self, code):
+        df = self._daysEngine.getDataFrame(code, self._startDay, self._endDay)
+
+        # 策略需要补全数据
+        if self._expectedDaysSize is not None:
+            df = self._autoFillDays(code, df)
+
+        return df
+
+    def _createPool(self):
+        """ @return: 进程池, None - 不并行 """
+        processNbr = os.cpu_count() if self.parallelProcessNbr is None else self.parallelProcessNbr
+        if not processNbr or processNbr <= 1:
+            return None
+
+        return multiprocessing.get_context('spawn').Pool(processNbr)
+
+    def _runStockDaysRows(self):
+        """
+            策略的@onStockDaysRows没有副作用，股票分块后由进程池并行计算
+            结果行按股票代码表的次序合并，所以跟依次计算的结果一致
+            进程池只在本次运行期间存在，运行结束或者停止时终止
+        """
+        pool = self._createPool()
+        if pool is None:
+            return self._runStockDaysRowsByPool(None)
+
+        with pool:
+            return self._runStockDaysRowsByPool(pool)
+
+    def _runStockDaysRowsByPool(self, pool):
+        """
+            @pool: None - 在引擎线程里依次计算
+            @return: bool, False - 被停止
+        """
+        if pool is not None:
+            state = self._strategy.getParallelState()
+
+        results = [] # [(AsyncResult or (rows, errors), stock number)]
+        def run(items):
+            if pool is None:
+                results.append((dyStockSelectStockDaysRows(self._strategy, items), len(items)))
+            else:
+                results.append((pool.apply_async(dyStockSelectStockDaysProcess, (self._strategy.__class__, self._paramters, state, items)), len(items)))
+
+        items = []
+        for code in self._daysEngine.stockCodes:
+            if self._isStopped:
+                return False
+
+            df = self._getStockDays(code)
+
+            if df is not None or self._strategy.fullyPushDays:
+                items.append((code, df))
+
+                if len(items) == self.parallelChunkSize:
+                    run(items)
+                    items = []
+            else:
+                self._progress.update()
+
+        if items:
+            run(items)
+
+        # merge
+        rows = []
+        for result, size in results:
+            if pool is not None:
+                # 等待时也要响应停止
+                while not result.ready():
+                    if self._isStopped:
+                        return False
+
+                    result.wait(1)
+
+                result = result.get()
+
+            rows_, errors = result
+            rows.extend(rows_)
+
+            if DyStockSelectCommon.enableSelectEngineException:
+                for code, ex in errors:
+                    self._info.print('{0}[{1}]: onStockDays异常:{2}'.format(code, self._daysEngine.stockAllCodes[code], ex), DyLogData.error)
+
+            for _ in range(size):
+                self._progress.update()
+
+        self._strategy.onStockDaysMerge(rows)
+
+        return True
+
     def _runTicksLoop(self):
         if not self._isTicks:
             return
@@ -288,6 +396,9 @@ class DyStockSelectSelectEngine(object):
         # run loop
         self._runLoop()
 
+        if self._isStopped:
+            return False
+
         # done for strategy
         self._strategy.onDone()
 
@@ -312,6 +423,45 @@ class DyStockSelectSelectEngine(object):
     def setTestedStocks(self, codes=None):
         self._testedStocks = codes
 
+    def getDaysLoadDates(strategyCls, paramters, baseDates, info):
+        """
+            策略在各个基准日期需要载入日线数据的日期
+            @baseDates: [基准日期]
+            @return: [dates], codes - 策略指定的股票代码，None则是全部
+                     None - 策略不载入日线数据
+        """
+        datesList = []
+        for baseDate in baseDates:
+            paramters = dict(paramters)
+            paramters['基准日期'] = baseDate
+
+            strategy = strategyCls(paramters, info)
+
+            startDate, endDate = strategy.onDaysLoad()
+            if startDate is None:
+                startDate, endDate = strategy.onTicksLoad()
+                if startDate is None:
+                    return None
+
+            datesList.append(strategy.onPostDaysLoad(*DyStockSelectSelectEngine._getLoadDates(startDate, endDate)))
+
+        return datesList, strategy.onCodes()
+
+    def preloadDays(self, strategyCls, paramters, baseDates):
+        """
+            选股回归时，预先载入所有基准日期需要的日线数据。之后每个基准日期运行策略时，日线数据引擎只设置窗口，不再从数据库载入。
+            策略载入的日期范围随基准日期平移，所以只需要第一个和最后一个基准日期的日期范围。
+            @baseDates: [基准日期]，升序
+            @return: bool, False - 没有预载入，运行策略时跟原来一样载入
+        """
+        ret = DyStockSelectSelectEngine.getDaysLoadDates(strategyCls, paramters, [baseDates[0], baseDates[-1]], self._info)
+        if ret is None:
+            return False
+
+        datesList, codes = ret
+
+        return self._daysEngine.preload(datesList, codes=self._testedStocks if codes is None else codes)
+
     def runStrategy(self, strategyCls, paramters):
         self._info.print("开始准备运行选股策略: {0}".format(strategyCls.chName), DyLogData.ind)
         self._info.initProgress()
@@ -321,6 +471,7 @@ class DyStockSelectSelectEngine(object):
 
         # create strategy instance
         self._strategy = strategyCls(paramters, self._info)
+        self._paramters = paramters.copy()
 
         # run
         if self._run():
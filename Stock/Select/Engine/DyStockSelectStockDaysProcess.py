@@ -0,0 +1,33 @@
+from DyCommon.DyCommon import *
+
+
+def dyStockSelectStockDaysRows(strategy, items):
+    """
+        依次调用策略的@onStockDaysRows
+        @items: [(code, df)]
+        @return: [row], [(code, exception)]
+    """
+    rows, errors = [], []
+    for code, df in items:
+        try:
+            rows_ = strategy.onStockDaysRows(code, df)
+        except AssertionError:
+            raise
+        except Exception as ex:
+            errors.append((code, repr(ex)))
+            continue
+
+        if rows_:
+            rows.extend(rows_)
+
+    return rows, errors
+
+def dyStockSelectStockDaysProcess(strategyCls, paramters, state, items):
+    """
+        进程池里并行计算一块股票的日线数据
+        策略实例由参数和@state重新生成
+    """
+    strategy = strategyCls(paramters, DyDummyInfo())
+    strategy.setParallelState(state)
+
+    return dyStockSelectStockDaysRows(strategy, items)
@@ -1,12 +1,19 @@
+import os
+
 from .DyStockSelectRegressionEngineProxy import *
 from ....Data.Engine.Common.DyStockDataCommonEngine import *
 from ....Data.Engine.DyStockMongoDbEngine import *
+from ....Data.Engine.DyStockDataDaysShared import DyStockDataDaysShared
 from DyCommon.DyCommon import *
 
 
 class DyStockSelectRegressionEngine(object):
 
-    periodNbr = 4 # 一个周期一个进程
+    periodNbr = 4 # 回归结果分成几个周期显示
+    workerNbr = 4 # 并行回归的进程数, None - CPU核数。每个进程各自预载入并前复权日线数据，所以内存随进程数增长
+    taskDayNbr = 5 # 每个任务的交易日数，也就是进程之间偷取任务的最小单位。进程处理的连续任务只预载入一次日线数据
+    sharedDays = True # 父进程载入一次日线数据，所有周期的子进程共享
+    joinTimeout = 10 # 回归完成后等待子进程退出的秒数
     
     def __init__(self, eventEngine, info):
         self._eventEngine = eventEngine
@@ -16,15 +23,51 @@ class DyStockSelectRegressionEngine(object):
 
         self._proxy = DyStockSelectRegressionEngineProxy(self._eventEngine)
         self._testedStocks = None
+        self._daysShared = None # 共享日线数据的路径
+        self._isStopped = False
 
         self._registerEvent()
 
     def _stockSelectTestedCodesHandler(self, event):
         self._testedStocks = event.data
 
+    def _removeSharedDays(self):
+        if not DyStockDataDaysShared.remove(self._daysShared):
+            self._info.print('删除共享日线数据失败, 请手动删除: {0}'.format(self._daysShared), DyLogData.warning)
+
+        self._daysShared = None
+
+    def _createSharedDays(self, tradeDays, strategyCls, parameters):
+        """
+            载入整个回归周期需要的日线数据，所有子进程共享
+            @return: 共享日线数据的路径, None - 子进程各自载入
+        """
+        ret = DyStockSelectSelectEngine.getDaysLoadDates(strategyCls, parameters, [tradeDays[0], tradeDays[-1]], self._info)
+        if ret is None:
+            return None
+
+        datesList, codes = ret
+        codes = self._testedStocks if codes is None else codes
+
+        # 跟子进程一样，把策略的载入日期转换成绝对日期
+        mongoDbEngine = DyStockMongoDbEngine(self._info)
+        commonEngine = DyStockDataCommonEngine(mongoDbEngine, None, self._info)
+
+        startDays, endDays = [], []
+        for dates in datesList:
+            if not commonEngine.load(dates, codes):
+                return None
+
+            startDays.append(commonEngine.tOldestDay())
+            endDays.append(commonEngine.tLatestDay())
+
+        return DyStockDataDaysShared.create(mongoDbEngine, commonEngine.stockAllCodesFunds, min(startDays), max(endDays), self._info)
+
     def _regression(self, startDate, endDate, strategyCls, parameters):
 
         self._progress.reset()
+        self._removeSharedDays()
+        self._isStopped = False
 
         # load code table and trade days table
         commonEngine = DyStockDataCommonEngine(DyStockMongoDbEngine(self._info), None, self._info)
@@ -42,9 +85,20 @@ class DyStockSelectRegressionEngine(object):
         stepSize = (len(tradeDays) + self.periodNbr - 1)//self.periodNbr
         if stepSize == 0: return False
 
-        # start processes
+        if self.sharedDays and not self._proxy.threadMode:
+            self._daysShared = self._createSharedDays(tradeDays, strategyCls, parameters)
+
+        # 每个周期再分成小的任务，按交易日排序，由进程动态获取
+        tasks = []
         for i in range(0, len(tradeDays), stepSize):
-            self._proxy.startRegression(tradeDays[i:i + stepSize], strategy, self._testedStocks)
+            periodDays = tradeDays[i:i + stepSize]
+            period = [periodDays[0], periodDays[-1]]
+
+            for j in range(0, len(periodDays), self.taskDayNbr):
+                tasks.append((period, periodDays[j:j + self.taskDayNbr]))
+
+        # start processes
+        self._proxy.startRegression(tasks, strategy, self._testedStocks, self._daysShared, self.workerNbr or os.cpu_count() or 1)
 
         return True
 
@@ -57,17 +111,43 @@ class DyStockSelectRegressionEngine(object):
 
         # regression
         if not self._regression(startDate, endDate, strategyCls, parameters):
+            self._removeSharedDays()
+
             self._eventEngine.put(DyEvent(DyEventType.fail))
     
     def _stockSelectStrategyRegressionAckHandler(self, event):
+        # 停止后还在队列里的Ack
+        if self._isStopped:
+            return
+
         self._progress.update()
 
         if self._progress.totalReqCount == 0:
+            # 子进程取到结束标志后退出，然后才能删除共享日线数据
+            self._proxy.joinRegression(self.joinTimeout)
+            self._removeSharedDays()
+
             self._eventEngine.put(DyEvent(DyEventType.finish))
 
+    def _stopStockSelectStrategyRegressionReqHandler(self, event):
+        self._isStopped = True
+
+        self._proxy.stopRegression()
+        self._removeSharedDays()
+
+        self._eventEngine.put(DyEvent(DyEventType.stopAck))
+
+    def exit(self):
+        """ 程序退出时终止回归进程，并删除共享日线数据 """
+        self._isStopped = True
+
+        self._proxy.stopRegression()
+        self._removeSharedDays()
+
     def _registerEvent(self):
         self._eventEngine.register(DyEventType.stockSelectStrategyRegressionReq, self._stockSelectStrategyRegressionReqHandler, DyStockSelectEventHandType.engine)
         self._eventEngine.register(DyEventType.stockSelectStrategyRegressionAck, self._stockSelectStrategyRegressionAckHandler, DyStockSelectEventHandType.engine)
+        self._eventEngine.register(DyEventType.stopStockSelectStrategyRegressionReq, self._stopStockSelectStrategyRegressionReqHandler, DyStockSelectEventHandType.engine)
         self._eventEngine.register(DyEventType.stockSelectTestedCodes, self._stockSelectTestedCodesHandler, DyStockSelectEventHandType.engine)
 
 
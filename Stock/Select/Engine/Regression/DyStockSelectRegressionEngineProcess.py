@@ -1,40 +1,118 @@
-import queue
-
 from DyCommon.DyCommon import *
 from EventEngine.DyEvent import *
 from EventEngine.DyEventEngine import *
 from ..DyStockSelectSelectEngine import *
+from ....Data.Engine.DyStockMongoDbEngine import DyStockMongoDbEngine
+from ....Data.Engine.DyStockDataDaysShared import DyStockDataDaysShared
 from ....Common.DyStockCommon import DyStockCommon
 
 
-def dyStockSelectRegressionEngineProcess(outQueue, inQueue, tradeDays, strategy, codes, histDaysDataSource):
+class DyStockSelectRegressionTasks(object):
+    """
+        进程间共享的回归任务分配
+        任务按交易日排序后分成每个进程一段连续的区间，进程依次处理自己区间的任务，所以处理的交易日是连续的，只需要预载入一次日线数据。
+        自己的区间处理完后，从剩余任务最多的区间偷取后一半，继续连续地处理，所以慢的区间不会让其他进程空等。
+    """
+
+    def __init__(self, ctx, tasks, workerNbr):
+        """
+            @tasks: [(period, [trade day])]，@period是交易日所属的显示周期[start day, end day]
+        """
+        self._tasks = tasks
+
+        # 每个进程的区间[start, end)，start是下一个任务
+        self._ranges = ctx.Array('i', 2*workerNbr)
+        for i in range(workerNbr):
+            self._ranges[2*i] = len(tasks)*i//workerNbr
+            self._ranges[2*i + 1] = len(tasks)*(i + 1)//workerNbr
+
+    def __getitem__(self, i):
+        return self._tasks[i]
+
+    def get(self, worker):
+        """
+            @return: 任务位置, 进程当前区间的结束位置
+                     None - 没有任务了
+        """
+        ranges = self._ranges
+
+        with ranges.get_lock():
+            start, end = ranges[2*worker], ranges[2*worker + 1]
+
+            # 偷取剩余任务最多的区间的后一半
+            if start == end:
+                victim = max(range(len(ranges)//2), key=lambda i: ranges[2*i + 1] - ranges[2*i])
+
+                start, end = ranges[2*victim], ranges[2*victim + 1]
+                if start == end:
+                    return None
+
+                start += (end - start)//2
+                ranges[2*victim + 1] = start
+
+            ranges[2*worker] = start + 1
+            ranges[2*worker + 1] = end
+
+        return start, end
+
+
+def dyStockSelectRegressionEngineProcess(outQueue, tasks, worker, strategy, codes, histDaysDataSource, daysShared=None):
+    """
+        回归进程，从@tasks获取任务直到没有任务
+        @tasks: DyStockSelectRegressionTasks
+        @worker: 进程序号
+    """
     strategyCls = strategy['class']
     parameters = strategy['param']
 
     DyStockCommon.defaultHistDaysDataSource = histDaysDataSource
 
+    # 父进程载入的共享日线数据
+    if daysShared is not None:
+        DyStockMongoDbEngine.daysShared = DyStockDataDaysShared.attach(daysShared)
+
     dummyEventEngine = DyDummyEventEngine()
     queueInfo = DyQueueInfo(outQueue)
 
     selectEngine = DyStockSelectSelectEngine(dummyEventEngine, queueInfo, False)
     selectEngine.setTestedStocks(codes)
+    selectEngine.parallelProcessNbr = 0 # 回归已经按交易日并行
+
+    prevTask, preloadedEnd = None, None
+    while True:
+        ret = tasks.get(worker)
+        if ret is None:
+            break
 
-    for day in tradeDays:
-        try:
-            event = inQueue.get_nowait()
-        except queue.Empty:
-            pass
+        task, end = ret
+        period, tradeDays = tasks[task]
 
-        parameters['基准日期'] = day
+        # 一次载入连续任务的所有交易日需要的日线数据，之后每个交易日只是平移窗口
+        # 跟上一个任务连续，并且已经预载入的，不再载入
+        if prevTask is None or task != prevTask + 1 or preloadedEnd is None or task >= preloadedEnd:
+            startDay, endDay = tradeDays[0], tasks[end - 1][1][-1]
+
+            if selectEngine.preloadDays(strategyCls, parameters, [startDay, endDay]):
+                preloadedEnd = end
+            else:
+                preloadedEnd = None
+                queueInfo.print('预载入日线数据失败:{0}, [{1}, {2}], 每个交易日分别载入'.format(strategyCls.chName, startDay, endDay), DyLogData.warning)
+
+        prevTask = task
+
+        for day in tradeDays:
+            parameters['基准日期'] = day
+
+            if selectEngine.runStrategy(strategyCls, parameters):
+                result = selectEngine.result
+            else:
+                queueInfo.print('回归选股策略失败:{0}, 周期[{1}, {2}], 基准日期{3}'.format(strategyCls.chName, period[0], period[-1], day), DyLogData.error)
+                result = None # 失败的交易日也要Ack，这样父进程才知道回归结束
 
-        if selectEngine.runStrategy(strategyCls, parameters):
             event = DyEvent(DyEventType.stockSelectStrategyRegressionAck)
             event.data['class'] = strategyCls
-            event.data['period'] = [tradeDays[0], tradeDays[-1]]
+            event.data['period'] = period
             event.data['day'] = day
-            event.data['result'] = selectEngine.result
+            event.data['result'] = result
 
             outQueue.put(event)
-        else:
-            queueInfo.print('回归选股策略失败:{0}, 周期[{1}, {2}], 基准日期{3}'.format(strategyCls.chName, tradeDays[0], tradeDays[-1], day), DyLogData.error)
-
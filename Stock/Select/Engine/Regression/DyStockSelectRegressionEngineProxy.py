@@ -18,7 +18,6 @@ class DyStockSelectRegressionEngineProxy(threading.Thread):
         self._queue = self._ctx.Queue() # queue to receive event from child processes
 
         self._processes = []
-        self._childQueues = []
 
         self.start()
 
@@ -28,18 +27,47 @@ class DyStockSelectRegressionEngineProxy(threading.Thread):
 
             self._eventEngine.put(event)
 
-    def startRegression(self, tradeDays, strategy, codes = None):
+    def startRegression(self, tasks, strategy, codes = None, daysShared=None, workerNbr=1):
         """
+            启动@workerNbr个进程，每个进程处理一段连续的任务，处理完后从其他进程剩余的任务里偷取
+            @tasks: [(period, [trade day])]
             @strategy: {'class':strategyCls, 'param': strategy paramters}
+            @daysShared: 父进程共享日线数据的路径
         """
-        _childQueue = self._ctx.Queue()
-        self._childQueues.append(_childQueue)
+        # 已经结束的进程
+        self._processes = [p for p in self._processes if p.is_alive()]
 
         if self.threadMode:
-            p = threading.Thread(target=dyStockSelectRegressionEngineProcess, args=(self._queue, _childQueue, tradeDays, strategy, codes, DyStockCommon.defaultHistDaysDataSource))
-        else:
-            p = self._ctx.Process(target=dyStockSelectRegressionEngineProcess, args=(self._queue, _childQueue, tradeDays, strategy, codes, DyStockCommon.defaultHistDaysDataSource))
+            workerNbr = 1
 
-        p.start()
+        workerNbr = max(1, min(workerNbr, len(tasks)))
 
-        self._processes.append(p)
+        tasks = DyStockSelectRegressionTasks(self._ctx, tasks, workerNbr)
+
+        for worker in range(workerNbr):
+            if self.threadMode:
+                p = threading.Thread(target=dyStockSelectRegressionEngineProcess, args=(self._queue, tasks, worker, strategy, codes, DyStockCommon.defaultHistDaysDataSource))
+            else:
+                p = self._ctx.Process(target=dyStockSelectRegressionEngineProcess, args=(self._queue, tasks, worker, strategy, codes, DyStockCommon.defaultHistDaysDataSource, daysShared))
+
+            p.start()
+
+            self._processes.append(p)
+
+    def joinRegression(self, timeout=None):
+        """ 等待回归进程结束，之后父进程才能删除子进程映射的共享日线数据 """
+        for p in self._processes:
+            p.join(timeout)
+
+        self._processes = [p for p in self._processes if p.is_alive()]
+
+    def stopRegression(self):
+        """ 终止所有回归进程。线程模式只用于调试，线程不能被终止。 """
+        for p in self._processes:
+            if isinstance(p, threading.Thread):
+                continue
+
+            if p.is_alive():
+                p.terminate()
+
+        self.joinRegression()
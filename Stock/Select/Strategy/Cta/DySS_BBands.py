@@ -32,6 +32,8 @@ class DySS_BBands(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._forwardNDays + 1
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2)
+
         self._stockAllCodes = dataEngine.daysEngine.stockAllCodes
         
         self._startDay = dataEngine.daysEngine.tDaysOffset(self._baseDate, -self._forwardNDays + 1)
@@ -60,10 +62,7 @@ class DySS_BBands(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], stdMeanRatio, closeRatio, lowRatio]
-        self._result.append(pair)
-        self._result.sort(key=operator.itemgetter(2))
-
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
 
     def _bbands(self, df):
         try:
@@ -31,6 +31,8 @@ class DySS_OverSold(DyStockSelectStrategyTemplate):
         return self._baseDate, -4
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2)
+
         self._daysEngine = dataEngine.daysEngine
 
         self._stockAllCodes = self._daysEngine.stockAllCodes
@@ -49,9 +51,7 @@ class DySS_OverSold(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], close/ma5, low/ma5]
-        self._result.append(pair)
-        self._result.sort(key = operator.itemgetter(2))
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
 
         # 设置实盘结果
         if self._forTrade:
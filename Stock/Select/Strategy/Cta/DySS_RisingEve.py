@@ -31,6 +31,8 @@ class DySS_RisingEve(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._forwardNTDays + 1 - 4
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2, reverse=True)
+
         self._daysEngine = dataEngine.daysEngine
 
         self._stockAllCodes = self._daysEngine.stockAllCodes
@@ -94,6 +96,4 @@ class DySS_RisingEve(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], (stockSlope - indexSlope)*100]
-        self._result.append(pair)
-        self._result.sort(key = operator.itemgetter(2), reverse = True)
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
@@ -29,6 +29,8 @@ class DySS_Stagflation(DyStockSelectStrategyTemplate):
         return self._baseDate, -max(self._forwardNTDays, 60) + 1
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2)
+
         self._daysEngine = dataEngine.daysEngine
 
         self._stockAllCodes = self._daysEngine.stockAllCodes
@@ -56,6 +58,4 @@ class DySS_Stagflation(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], closeLowRatio, maxDropRatio, closeM60Ration]
-        self._result.append(pair)
-        self._result.sort(key=operator.itemgetter(2))
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+
+
+class DyStockSelectTopN(object):
+    """
+        有界的前N选股结果，基于堆，每加入一行是O(log N)
+        跟每次加入后排序整个结果再截取前N行的结果一致：相等的排序值，先加入的行在前面
+    """
+
+    def __init__(self, n, key, reverse=False):
+        """
+            @n: 保留的行数
+            @key: 排序的列
+            @reverse: True - 降序，保留最大的N行
+        """
+        self._n = n
+        self._key = key
+        self._reverse = reverse
+
+        self._heap = [] # 堆顶是最差的行, [(priority, -seq, row)]
+        self._seq = itertools.count()
+
+    def _getPriority(self, row):
+        return row[self._key] if self._reverse else -row[self._key]
+
+    def push(self, row):
+        if self._n <= 0:
+            return
+
+        item = (self._getPriority(row), -next(self._seq), row)
+
+        if len(self._heap) < self._n:
+            heapq.heappush(self._heap, item)
+
+        # 排序值相等时，先加入的行更好，所以只有排序值更好才替换
+        elif item[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def rows(self):
+        """ @return: [row], 排好序的 """
+        return [row for _, _, row in sorted(self._heap, key=lambda x: (-x[0], -x[1]))]
+
+
+def _compacted(method):
+    """ list的方法调用前先删除@DyStockSelectResult的墓碑行 """
+    def wrapper(self, *args, **kwargs):
+        self._compact()
+
+        for arg in args: # 比如两个选股结果比较
+            if isinstance(arg, DyStockSelectResult):
+                arg._compact()
+
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class DyStockSelectResult(list):
+    """
+        选股结果，跟list一样使用
+        另外维护股票代码(行的第一列)到行位置的索引，所以按代码获取和删除是O(1)的字典查询
+        删除的行先替换成墓碑，读取结果时再一次性删除所有墓碑，所以连续删除多行也只移动一次
+        切片返回的是list，不再有索引
+    """
+    _removedRow = object() # 墓碑
+
+
+    def __init__(self, rows=()):
+        super().__init__(rows)
+
+        self._index = None # {code: row position}, 重复的代码对应第一行。None - 需要重新生成
+        self._duplicated = False
+        self._removedCount = 0 # 墓碑的数量
+
+    def __reduce__(self):
+        """ pickle时只保存行，比如回归子进程推送选股结果，索引在使用时重新生成 """
+        return (self.__class__, (list(self),))
+
+    def _compact(self):
+        """ 删除所有墓碑，行的位置改变，所以索引需要重新生成 """
+        if self._removedCount == 0:
+            return
+
+        super().__setitem__(slice(None), [row for row in super().__iter__() if row is not self._removedRow])
+
+        self._removedCount = 0
+        self._index = None
+
+    def _getIndex(self):
+        if self._index is None:
+            self._compact()
+
+            self._index = {}
+            self._duplicated = False
+
+            for pos, row in enumerate(super().__iter__()):
+                if row[0] in self._index:
+                    self._duplicated = True
+                else:
+                    self._index[row[0]] = pos
+
+        return self._index
+
+    def _invalidate(self):
+        self._index = None
+
+    def get(self, code):
+        pos = self._getIndex().get(code)
+
+        return None if pos is None else super().__getitem__(pos)
+
+    def append(self, row):
+        if self._index is not None:
+            if row[0] in self._index:
+                self._duplicated = True
+            else:
+                self._index[row[0]] = super().__len__()
+
+        super().append(row)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
+
+    def remove(self, row):
+        # 没有重复的代码，直接替换成墓碑并删除索引
+        if self._index is not None and not self._duplicated:
+            pos = self._index.get(row[0])
+            if pos is not None and super().__getitem__(pos) is row:
+                super().__setitem__(pos, self._removedRow)
+                del self._index[row[0]]
+                self._removedCount += 1
+                return
+
+        self._compact()
+
+        super().remove(row)
+        self._invalidate()
+
+    def insert(self, i, row):
+        self._compact()
+
+        super().insert(i, row)
+        self._invalidate()
+
+    def pop(self, i=-1):
+        self._compact()
+
+        row = super().pop(i)
+        self._invalidate()
+
+        return row
+
+    def clear(self):
+        super().clear()
+
+        self._removedCount = 0
+        self._invalidate()
+
+    def __setitem__(self, i, value):
+        self._compact()
+
+        super().__setitem__(i, value)
+        self._invalidate()
+
+    def __delitem__(self, i):
+        self._compact()
+
+        super().__delitem__(i)
+        self._invalidate()
+
+    def sort(self, *args, **kwargs):
+        self._compact()
+
+        super().sort(*args, **kwargs)
+        self._invalidate()
+
+    def reverse(self):
+        self._compact()
+
+        super().reverse()
+        self._invalidate()
+
+    def __imul__(self, n):
+        self._compact()
+
+        super().__imul__(n)
+        self._invalidate()
+
+        return self
+
+    # 读取结果的方法先删除墓碑
+    __iter__ = _compacted(list.__iter__)
+    __reversed__ = _compacted(list.__reversed__)
+    __len__ = _compacted(list.__len__)
+    __getitem__ = _compacted(list.__getitem__)
+    __contains__ = _compacted(list.__contains__)
+    __repr__ = _compacted(list.__repr__)
+    __eq__ = _compacted(list.__eq__)
+    __ne__ = _compacted(list.__ne__)
+    __lt__ = _compacted(list.__lt__)
+    __le__ = _compacted(list.__le__)
+    __gt__ = _compacted(list.__gt__)
+    __ge__ = _compacted(list.__ge__)
+    __add__ = _compacted(list.__add__)
+    __mul__ = _compacted(list.__mul__)
+    __rmul__ = _compacted(list.__rmul__)
+    index = _compacted(list.index)
+    count = _compacted(list.count)
+    copy = _compacted(list.copy)
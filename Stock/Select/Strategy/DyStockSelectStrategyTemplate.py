@@ -5,6 +5,8 @@ import json
 import numpy as np
 from collections import OrderedDict
 
+from .DyStockSelectResult import *
+
 
 class DyStockSelectStrategyTemplate(object):
     """ 所有选股策略的父类。
@@ -31,6 +33,10 @@ class DyStockSelectStrategyTemplate(object):
 
     continuousTicks = False # Ticks数据是不是以连续模式推入策略，非连续模式为{date: ticksDF of date}
 
+    # 并行计算个股日线数据。策略实现没有副作用的@onStockDaysRows来代替@onStockDays，引擎把股票分发到进程池计算，
+    # 然后通过@onStockDaysMerge合并所有股票的结果行。子进程里的策略实例由参数和@getParallelState重新生成。
+    parallelStockDays = False
+
     #----- 基类私有变量, 几日是跟@__nDays相对应 -----
     __baseColNames = ['当日价格', '当日涨幅(%)', '当日指数涨幅(%)', '1日涨幅(%)', '1日指数涨幅(%)', '流通市值(亿)']
     __nDays = 1
@@ -39,7 +45,8 @@ class DyStockSelectStrategyTemplate(object):
     def __init__(self, param, info):
         self._info = info
 
-        self._result = [] # 选股结果，由子类赋值
+        self._result = DyStockSelectResult() # 选股结果，由子类赋值
+        self.__resultTopN = None # DyStockSelectTopN, 由子类通过@setResultTopN设置
 
         # 实盘相关数据
         self._forTrade = True if 'forTrade' in param else False # 实盘选股，由策略处理实盘选股的区别。非回测时，默认生成JSON
@@ -64,8 +71,14 @@ class DyStockSelectStrategyTemplate(object):
 
         return [startDate, baseDate, max(self.__nDays, n)]
 
+    def onDaysDoneForEngine(self):
+        """ 日线数据推送完毕，由引擎调用 """
+        self.__flushResultTopN()
+
     def onDoneForEngine(self, dataEngine, errorDataEngine):
         """ 返回策略的选股结果，由引擎调用 """
+        self.__flushResultTopN()
+
         self._result.insert(0, self.colNames.copy())
 
         self.__adjust(dataEngine.daysEngine, errorDataEngine.daysEngine)
@@ -126,6 +139,32 @@ class DyStockSelectStrategyTemplate(object):
         """ 个股日线数据 """
         pass
 
+    def getParallelState(self):
+        """
+            并行计算个股日线数据时，子进程里的策略实例需要的状态，onInit之后由引擎调用
+            @return: {attribute name: value}, 必须可以pickle
+        """
+        return {}
+
+    def setParallelState(self, state):
+        """ 子进程里由引擎调用，设置@getParallelState返回的状态 """
+        self.__dict__.update(state)
+
+    def onStockDaysRows(self, code, df):
+        """
+            并行模式下的个股日线数据，在子进程里被调用，所以不能修改策略实例的状态
+            @return: [row], None - 没有选中
+        """
+        return None
+
+    def onStockDaysMerge(self, rows):
+        """
+            并行模式下，所有股票的@onStockDaysRows执行完后，合并结果行。@rows的次序跟股票代码表一致。
+            默认通过@addToResult加入，所以@setResultTopN也适用于并行模式
+        """
+        for row in rows:
+            self.addToResult(row)
+
     # Tick级别
     def onStockTicks(self, code, dfs):
         """ 个股分笔数据
@@ -141,7 +180,30 @@ class DyStockSelectStrategyTemplate(object):
         pass
 
     #---------- 子类调用 ----------
+    def setResultTopN(self, n, key, reverse=False):
+        """
+            选股结果只保留按@key排序后的前@n行，代替每加入一行都排序整个结果再截取前N行
+            之后通过@addToResult加入的行先保存在堆里，日线数据推送完毕后排好序放入@self._result
+            @key: 排序的列
+            @reverse: True - 降序
+        """
+        self.__resultTopN = DyStockSelectTopN(n, key, reverse)
+
+    def addToResult(self, row):
+        """ 加入一行选股结果 """
+        if self.__resultTopN is None:
+            self._result.append(row)
+        else:
+            self.__resultTopN.push(row)
+
     def removeFromResult(self, code):
+        if isinstance(self._result, DyStockSelectResult):
+            group = self._result.get(code)
+            if group is not None:
+                self._result.remove(group)
+
+            return
+
         pos = None
         for i, group in enumerate(self._result):
             if group[0] == code:
@@ -155,6 +217,9 @@ class DyStockSelectStrategyTemplate(object):
         """
             从@self._result得到指定code的一行
         """
+        if isinstance(self._result, DyStockSelectResult):
+            return self._result.get(code)
+
         for group in self._result:
             if group[0] == code:
                 return group
@@ -162,6 +227,11 @@ class DyStockSelectStrategyTemplate(object):
         return None
 
     #---------- 私有方法 ----------
+    def __flushResultTopN(self):
+        if self.__resultTopN is not None:
+            self._result.extend(self.__resultTopN.rows())
+            self.__resultTopN = None
+
     def __adjust(self, daysEngine, errorDaysEngine):
         for i, stock in enumerate(self._result):
             if i == 0: # header
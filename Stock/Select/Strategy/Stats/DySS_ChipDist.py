@@ -52,6 +52,8 @@ class DySS_ChipDist(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._shortNTDays + 1
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2, reverse=True)
+
         self._daysEngine = dataEngine.daysEngine
         self._ticksEngine = errorDataEngine.ticksEngine
 
@@ -83,9 +85,7 @@ class DySS_ChipDist(DyStockSelectStrategyTemplate):
                downUpRatio,
                downMean20Ratio
                ]
-        self._result.append(row)
-        self._result.sort(key=operator.itemgetter(2), reverse=True)
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(row)
 
     def onStockTicks(self, code, dfs):
         close, high = self._priceData.get(code)
@@ -47,6 +47,8 @@ class DySS_Correlation(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._forwardNTDays
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2, reverse=True)
+
         self._daysEngine = dataEngine.daysEngine
 
         self._stockAllCodes = self._daysEngine.stockAllCodes
@@ -119,6 +121,4 @@ class DySS_Correlation(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], key]
-        self._result.append(pair)
-        self._result.sort(key=operator.itemgetter(2), reverse=True)
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
@@ -10,6 +10,8 @@ class DySS_Pairs(DyStockSelectStrategyTemplate):
 
     colNames = ['代码', '名称', 'p值(‰)']
 
+    parallelStockDays = True # 每只股票的ADF检验相互独立
+
     param = OrderedDict\
                 ([
                     ('标的', '贵州茅台'),
@@ -45,6 +47,8 @@ class DySS_Pairs(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._forwardNTDays + 1
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2)
+
         self._daysEngine = dataEngine.daysEngine
         self._stockAllCodes = self._daysEngine.stockAllCodes
         
@@ -54,6 +58,13 @@ class DySS_Pairs(DyStockSelectStrategyTemplate):
         self._targetCloses = self._targetDf['close']
         self._targetDates = {x.strftime("%Y-%m-%d") for x in list(self._targetDf.index)}
 
+    def getParallelState(self):
+        return {'_stockAllCodes': self._stockAllCodes,
+                '_targetCode': self._targetCode,
+                '_targetCloses': self._targetCloses,
+                '_targetDates': self._targetDates
+                }
+
     def onIndexDays(self, code, df):
         pass
 
@@ -101,14 +112,10 @@ class DySS_Pairs(DyStockSelectStrategyTemplate):
 
         return pvalue
 
-    def onStockDays(self, code, df):
+    def onStockDaysRows(self, code, df):
         pvalue = self._spread(code, df)
         if pvalue is None:
-            return
+            return None
 
-        # 设置结果
-        row = [code, self._stockAllCodes[code], pvalue*1000]
-        self._result.append(row)
-        self._result.sort(key=operator.itemgetter(2))
-        self._result = self._result[:self._selectStockNbr]
+        return [[code, self._stockAllCodes[code], pvalue*1000]]
 
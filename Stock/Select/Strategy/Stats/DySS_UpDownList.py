@@ -36,6 +36,8 @@ class DySS_UpDownList(DyStockSelectStrategyTemplate):
         return self._baseDate, -self._forwardNTDays
 
     def onInit(self, dataEngine, errorDataEngine):
+        self.setResultTopN(self._selectStockNbr, 2, reverse=self._upDown)
+
         self._daysEngine = dataEngine.daysEngine
 
         self._stockAllCodes = self._daysEngine.stockAllCodes
@@ -57,6 +59,4 @@ class DySS_UpDownList(DyStockSelectStrategyTemplate):
 
         # 设置结果
         pair = [code, self._stockAllCodes[code], pct, efficiencyRatio]
-        self._result.append(pair)
-        self._result.sort(key=operator.itemgetter(2), reverse=self._upDown)
-        self._result = self._result[:self._selectStockNbr]
+        self.addToResult(pair)
@@ -11,6 +11,8 @@ class DyStockSelectStrategyRegressionPeriodResultWidget(DyStockTableWidget):
 
         self._paramWidget = paramWidget
 
+        self._lastDate = None # 最后添加的基准日期
+
     def _initHeaderMenu(self):
         super()._initHeaderMenu()
 
@@ -33,7 +35,25 @@ class DyStockSelectStrategyRegressionPeriodResultWidget(DyStockTableWidget):
                 row.insert(0, date)
                 row.insert(0, '')
 
-        self.fastAppendRows(rows, DyStockSelectStrategyTemplate.getAutoColName())
+        if self._lastDate is None or date >= self._lastDate:
+            self.fastAppendRows(rows, DyStockSelectStrategyTemplate.getAutoColName())
+
+            self._lastDate = date
+            return
+
+        if not rows:
+            return
+
+        # 回归进程之间偷取任务，同一周期的交易日会乱序到达，所以按基准日期插入后重建table
+        allRows = self.getAll()
+
+        pos = len(allRows)
+        while pos > 0 and allRows[pos - 1][1] > date:
+            pos -= 1
+
+        allRows[pos:pos] = rows
+
+        self.fastAppendRows(allRows, DyStockSelectStrategyTemplate.getAutoColName(), True)
 
     def getAutoColName(self):
         return DyStockSelectStrategyTemplate.getAutoColName()
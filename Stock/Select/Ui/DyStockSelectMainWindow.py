@@ -1,3 +1,5 @@
+import os
+
 from PyQt5.QtWidgets import QDockWidget
 from PyQt5.QtGui import QFont
 
@@ -258,9 +260,9 @@ class DyStockSelectMainWindow(DyBasicMainWindow):
         self._mainEngine.eventEngine.put(event)
 
     def _setProcessNbr(self):
-        data = {'nbr':DyStockSelectRegressionEngine.periodNbr}
+        data = {'nbr':DyStockSelectRegressionEngine.workerNbr or os.cpu_count()}
         if DyProcessNbrDlg(data, self).exec_():
-            DyStockSelectRegressionEngine.periodNbr = data['nbr']
+            DyStockSelectRegressionEngine.workerNbr = data['nbr']
 
             self._mainEngine._info.print('回归进程数设为{0}'.format(data['nbr']), DyLogData.ind)
 
@@ -316,6 +318,15 @@ class DyStockSelectMainWindow(DyBasicMainWindow):
         self._mainEngine.eventEngine.put(event)
 
     def _stockRegression(self):
+        if self._stockRegressionAction.text() == '停止':
+            self._mainEngine._info.print('停止选股策略回归...', DyLogData.ind)
+
+            # change UI
+            self._stopRunningMutexAction()
+
+            self._mainEngine.eventEngine.put(DyEvent(DyEventType.stopStockSelectStrategyRegressionReq))
+            return
+
         strategyCls, param = self._widgetStrategy.getStrategy()
         if strategyCls is None: return
 